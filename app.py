@@ -290,4 +290,7 @@ class ProfessionalMediaEditor:
             
     def on_closing(self):
         """Cleanup before closing"""
+        for frame in self.frames.values():
+            if hasattr(frame, "shutdown"):
+                frame.shutdown()
         self.root.destroy()
\ No newline at end of file
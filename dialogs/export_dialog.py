@@ -0,0 +1,132 @@
+import os
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+
+from pixonic.export import EXPORT_SETS, plan_outputs
+
+class ExportDialog(tk.Toplevel):
+    """Pick export sets and watch them encode in the background
+
+    The dialog is not modal: editing carries on while the queue works,
+    and the progress bar is refreshed by polling the job with after().
+    source_path is never written to, and existing files are only
+    replaced after asking.
+    """
+    def __init__(self, parent, controller, queue, source, stem, metadata=None, directory=None,
+                 source_path=None):
+        super().__init__(parent)
+        self.controller = controller
+        self.queue = queue
+        self.source = source
+        self.stem = stem
+        self.metadata = metadata
+        self.protect = (source_path,) if source_path else ()
+        self.job = None
+
+        self.title("Export")
+        self.geometry("420x360")
+        self.resizable(False, False)
+
+        theme = self.controller.themes[self.controller.current_theme]
+        self.configure(background=theme['background'])
+
+        ttk.Label(self, text="Export Image", style='Title.TLabel').pack(pady=10)
+
+        sets_frame = ttk.Frame(self)
+        sets_frame.pack(fill=tk.X, padx=20)
+        self.set_vars = {}
+        for name, presets in EXPORT_SETS.items():
+            var = tk.BooleanVar(value=name == "Web")
+            self.set_vars[name] = var
+            formats = sorted({preset.format for preset in presets})
+            ttk.Checkbutton(sets_frame, text=f"{name} ({len(presets)} files: {', '.join(formats)})",
+                           variable=var).pack(anchor=tk.W, pady=2)
+
+        dir_frame = ttk.Frame(self)
+        dir_frame.pack(fill=tk.X, padx=20, pady=10)
+        ttk.Label(dir_frame, text="Folder:").pack(side=tk.LEFT)
+        self.dir_entry = ttk.Entry(dir_frame)
+        self.dir_entry.insert(0, directory or os.path.expanduser("~"))
+        self.dir_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        ttk.Button(dir_frame, text="Browse", style='Tool.TButton',
+                  command=self.choose_directory).pack(side=tk.LEFT)
+
+        self.progress = ttk.Progressbar(self, mode='determinate')
+        self.progress.pack(fill=tk.X, padx=20, pady=5)
+        self.status_var = tk.StringVar(value="Choose what to export")
+        ttk.Label(self, textvariable=self.status_var, wraplength=380).pack(fill=tk.X, padx=20)
+
+        btn_frame = ttk.Frame(self)
+        btn_frame.pack(fill=tk.X, padx=20, pady=10, side=tk.BOTTOM)
+
+        self.export_button = ttk.Button(btn_frame, text="Export", style='Primary.TButton',
+                                        command=self.start_export)
+        self.export_button.pack(side=tk.RIGHT, padx=5)
+        self.cancel_button = ttk.Button(btn_frame, text="Close", style='Secondary.TButton',
+                                        command=self.cancel)
+        self.cancel_button.pack(side=tk.RIGHT, padx=5)
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+
+    def choose_directory(self):
+        """Pick the output folder"""
+        directory = filedialog.askdirectory(parent=self, initialdir=self.dir_entry.get())
+        if directory:
+            self.dir_entry.delete(0, tk.END)
+            self.dir_entry.insert(0, directory)
+
+    def start_export(self):
+        """Queue every preset of the ticked sets"""
+        presets = [preset for name, var in self.set_vars.items() if var.get()
+                   for preset in EXPORT_SETS[name]]
+        if not presets:
+            self.status_var.set("Tick at least one export set")
+            return
+        directory = self.dir_entry.get()
+        planned = plan_outputs(presets, directory, self.stem, self.protect, overwrite=True)
+        existing = [path for path in planned if os.path.exists(path)]
+        overwrite = False
+        if existing:
+            overwrite = messagebox.askyesnocancel(
+                "Files Exist",
+                f"{len(existing)} of the files already exist, e.g. {os.path.basename(existing[0])}.\n"
+                "Replace them? Choose No to save numbered copies instead.",
+                parent=self)
+            if overwrite is None:
+                return
+        self.job = self.queue.submit(self.source, presets, directory, self.stem,
+                                     self.metadata, self.protect, overwrite)
+        self.progress.configure(maximum=self.job.total, value=0)
+        self.export_button.state(['disabled'])
+        self.cancel_button.configure(text="Cancel")
+        self.poll()
+
+    def poll(self):
+        """Show the job's progress until it finishes"""
+        if not self.winfo_exists() or self.job is None:
+            return
+        job = self.job
+        # total drops once presets the image already fits are merged
+        self.progress.configure(maximum=job.total, value=job.done)
+        if not job.finished.is_set():
+            self.status_var.set(f"Exported {len(job.outputs)} of {job.total} files...")
+            self.after(100, self.poll)
+            return
+        if job.cancelled.is_set():
+            status = f"Cancelled after {len(job.outputs)} files"
+        else:
+            status = f"Exported {len(job.outputs)} files to {job.directory}"
+        if job.failures:
+            name, error = job.failures[0]
+            status += f"; {len(job.failures)} failed ({name}: {error})"
+        self.status_var.set(status)
+        self.job = None
+        self.export_button.state(['!disabled'])
+        self.cancel_button.configure(text="Close")
+
+    def cancel(self):
+        """Cancel a running export, or close the dialog"""
+        if self.job is not None:
+            self.job.cancel()
+            self.status_var.set("Cancelling...")
+        else:
+            self.destroy()
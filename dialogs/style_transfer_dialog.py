@@ -1,6 +1,8 @@
 import tkinter as tk
 from tkinter import ttk
 
+from pixonic.color import STYLE_PRESETS
+
 class StyleTransferDialog(tk.Toplevel):
     def __init__(self, parent, controller):
         super().__init__(parent)
@@ -8,7 +10,7 @@ class StyleTransferDialog(tk.Toplevel):
         self.selected_style = None
         
         self.title("Select Style")
-        self.geometry("400x300")
+        self.geometry("400x360")
         self.resizable(False, False)
         
         theme = self.controller.themes[self.controller.current_theme]
@@ -17,11 +19,16 @@ class StyleTransferDialog(tk.Toplevel):
         ttk.Label(self, text="Select Artistic Style", style='Title.TLabel').pack(pady=10)
         
         styles = ["Van Gogh", "Picasso", "Watercolor", "Ukiyo-e", "Abstract"]
+        styles += [style for style in STYLE_PRESETS if style not in styles]
         self.style_var = tk.StringVar()
         
-        for style in styles:
-            ttk.Radiobutton(self, text=style, variable=self.style_var, 
-                           value=style).pack(anchor=tk.W, padx=20, pady=5)
+        # Two columns so the colour presets fit
+        style_frame = ttk.Frame(self)
+        style_frame.pack(fill=tk.X, padx=20)
+        rows = (len(styles) + 1) // 2
+        for i, style in enumerate(styles):
+            ttk.Radiobutton(style_frame, text=style, variable=self.style_var, 
+                           value=style).grid(row=i % rows, column=i // rows, sticky=tk.W, padx=(0, 30), pady=5)
         
         btn_frame = ttk.Frame(self)
         btn_frame.pack(fill=tk.X, padx=20, pady=10)
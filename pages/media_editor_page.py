@@ -1,7 +1,7 @@
 import os
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk, ImageFilter, ImageEnhance, ImageOps, ImageChops
+from tkinter import ttk, filedialog, messagebox, colorchooser, simpledialog
+from PIL import ImageTk
 import numpy as np
 import pyaudio
 import librosa
@@ -9,7 +9,29 @@ from scipy.io import wavfile
 from scipy import signal
 from pydub import AudioSegment
 from pydub.utils import which
+from dialogs.export_dialog import ExportDialog
 from dialogs.style_transfer_dialog import StyleTransferDialog
+from pixonic.adjustments import AdjustmentEngine
+from pixonic.audio import as_float32, quantize
+from pixonic.detail import is_neutral_detail
+from pixonic.display import DisplayCache
+from pixonic.export import ExportQueue, read_metadata, render_state
+from pixonic.filmstrip import Filmstrip
+from pixonic.loader import USER_MAX_PIXELS, ImageLoader, open_preview
+from pixonic.playback import PlaybackEngine, PyAudioDevice
+from pixonic.history import History, StateDelta, BufferDelta, SampleDelta, MaskDelta
+from pixonic.masks import LocalCompositor
+from pixonic.preview import PreviewSession
+from pixonic.reverb import IMPULSES, cached_impulse, convolve_reverb, impulse_response
+from pixonic.scheduler import RenderScheduler
+from pixonic.store import ImageStore
+from pixonic.tiles import save_image
+from pixonic.viewport import Viewport
+from pixonic.waveform import PeakPyramid, waveform_polygon
+from pixonic.vignette import SHAPES as VIGNETTE_SHAPES
+
+# Height of the folder thumbnail strip
+STRIP_HEIGHT = 96
 
 AudioSegment.converter = which("ffmpeg")
 
@@ -23,20 +45,74 @@ class MediaEditorPage(ttk.Frame):
         self.original_image = None
         self.tk_image = None
         self.crop_mode = False
-        self.crop_start = None
+        self.crop_start_x = None
+        self.crop_start_y = None
         self.crop_rect = None
+        self.session = None
+        self.image_path = None
+        self.viewport = Viewport()
+        self.tile_items = {}
+        self.pan_last = None
+        self.display_cache = DisplayCache()
+        # Large decoded images live in memory-mapped scratch files
+        self.image_store = ImageStore()
+        # Files the user opens may exceed Pillow's default pixel limit
+        self.image_loader = ImageLoader(self, self.full_image_loaded, self.full_image_failed,
+                                        opener=lambda path: self.image_store.open(path, USER_MAX_PIXELS))
+        # Folder browsing, with neighbours decoded ahead of time
+        self.filmstrip = None
+        self.strip_photos = {}
+        self.strip_pending = {}
+        self.strip_polling = False
+        # Exports encode on their own pool while editing continues
+        self.export_queue = ExportQueue()
+        
+        # Slider adjustments render on a worker thread
+        self.adjustment_engine = AdjustmentEngine()
+        self.render_scheduler = RenderScheduler(self, self.render_adjustments,
+                                                self.show_adjusted_frame,
+                                                on_error=self.show_adjustment_error)
+        # Zoomed-in views draw from a full-resolution render made on a worker
+        self.full_render_scheduler = RenderScheduler(self, self.render_full, self.show_full_render,
+                                                     on_error=self.show_full_render_error)
+        self.full_render_job = None
         
         # Audio editing attributes
         self.audio_file = None
         self.audio_data = None
         self.sample_rate = None
+        # Audio is edited as float32 in -1..1 and quantized back to the
+        # file's sample format only when saved
+        self.audio_format = None
         self.original_audio = None
-        self.is_playing = False
+        self.waveform_peaks = None
         self.p = pyaudio.PyAudio()
-        self.stream = None
+        # Callback playback of the current buffer; the cursor polls its position
+        self.playback = None
+        self.playback_polling = False
+        # Impulse responses loaded from WAV files, by file name
+        self.custom_impulses = {}
+        
+        # Undo/redo
+        self.image_history = History()
+        self.audio_history = History()
+        self.slider_state = None
+        self.syncing_controls = False
+        
+        # Local adjustments: the layer being edited and the mask drag in progress
+        self.active_layer = None
+        self.mask_last = None
         
         self.create_widgets()
         
+        root = self.controller.root
+        root.bind("<Control-z>", lambda e: self.undo() if self.winfo_ismapped() else None)
+        root.bind("<Control-y>", lambda e: self.redo() if self.winfo_ismapped() else None)
+        root.bind("<Control-0>", lambda e: self.zoom_fit() if self.winfo_ismapped() else None)
+        root.bind("<Control-1>", lambda e: self.zoom_actual() if self.winfo_ismapped() else None)
+        root.bind("<Prior>", lambda e: self.step_folder(-1) if self.winfo_ismapped() else None)
+        root.bind("<Next>", lambda e: self.step_folder(1) if self.winfo_ismapped() else None)
+        
     def create_widgets(self):
         """Create combined media editor widgets"""
         # Header
@@ -49,6 +125,10 @@ class MediaEditorPage(ttk.Frame):
         btn_frame = ttk.Frame(header_frame, style='TFrame')
         btn_frame.pack(side=tk.RIGHT)
         
+        ttk.Button(btn_frame, text="Undo", style='Tool.TButton',
+                  command=self.undo).pack(side=tk.LEFT, padx=2)
+        ttk.Button(btn_frame, text="Redo", style='Tool.TButton',
+                  command=self.redo).pack(side=tk.LEFT, padx=2)
         ttk.Button(btn_frame, text="Back to Dashboard", style='Secondary.TButton',
                   command=lambda: self.controller.show_frame("DashboardPage")).pack(side=tk.LEFT, padx=5)
         
@@ -74,10 +154,21 @@ class MediaEditorPage(ttk.Frame):
         self.image_canvas = tk.Canvas(self.media_frame, 
                                     bg=self.controller.themes[self.controller.current_theme]['background'])
         self.image_canvas.pack(fill=tk.BOTH, expand=True)
+        self.bind_pan()
+        self.image_canvas.bind("<MouseWheel>", self.zoom_wheel)
+        self.image_canvas.bind("<Button-4>", self.zoom_wheel)
+        self.image_canvas.bind("<Button-5>", self.zoom_wheel)
+        self.image_canvas.bind("<Configure>", lambda e: self.display_image())
+        
+        # Thumbnails of the open folder, shown once a folder is opened
+        self.strip_canvas = tk.Canvas(self.media_frame, height=STRIP_HEIGHT, highlightthickness=0,
+                                      bg=self.controller.themes[self.controller.current_theme]['background'])
+        self.strip_canvas.bind("<Configure>", lambda e: self.draw_filmstrip())
         
         # Audio waveform canvas
         self.audio_canvas = tk.Canvas(self.media_frame, 
                                      bg=self.controller.themes[self.controller.current_theme]['background'])
+        self.audio_canvas.bind("<Button-1>", self.seek_audio)
         
         # Control panel
         self.control_frame = ttk.Frame(main_frame, width=350, style='TFrame')
@@ -105,8 +196,20 @@ class MediaEditorPage(ttk.Frame):
         
         ttk.Button(file_tab, text="Open Image", style='Primary.TButton',
                   command=self.open_image).pack(fill=tk.X, pady=5)
+        ttk.Button(file_tab, text="Open Folder", style='Primary.TButton',
+                  command=self.open_folder).pack(fill=tk.X, pady=5)
+        folder_frame = ttk.Frame(file_tab)
+        folder_frame.pack(fill=tk.X, pady=5)
+        ttk.Button(folder_frame, text="Previous", style='Tool.TButton',
+                  command=lambda: self.step_folder(-1)).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
+        ttk.Button(folder_frame, text="Next", style='Tool.TButton',
+                  command=lambda: self.step_folder(1)).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=2)
         ttk.Button(file_tab, text="Save Image", style='Success.TButton',
                   command=self.save_image).pack(fill=tk.X, pady=5)
+        ttk.Button(file_tab, text="Export...", style='Success.TButton',
+                  command=self.export_image).pack(fill=tk.X, pady=5)
+        ttk.Button(file_tab, text="Render Full Resolution", style='Secondary.TButton',
+                  command=self.render_image).pack(fill=tk.X, pady=5)
         ttk.Button(file_tab, text="Reset Image", style='Danger.TButton',
                   command=self.reset_image).pack(fill=tk.X, pady=5)
         
@@ -120,7 +223,11 @@ class MediaEditorPage(ttk.Frame):
         self.brightness_slider.set(100)
         self.brightness_slider.pack(fill=tk.X, pady=5)
         
-        
+        # Contrast
+        ttk.Label(basic_tab, text="Contrast", style='Subheader.TLabel').pack(anchor=tk.W, pady=(10, 0))
+        self.contrast_slider = ttk.Scale(basic_tab, from_=0, to=200, command=self.apply_adjustments)
+        self.contrast_slider.set(100)
+        self.contrast_slider.pack(fill=tk.X, pady=5)
         
         # Saturation
         ttk.Label(basic_tab, text="Saturation", style='Subheader.TLabel').pack(anchor=tk.W, pady=(10, 0))
@@ -178,10 +285,103 @@ class MediaEditorPage(ttk.Frame):
         self.vignette_slider.set(0)
         self.vignette_slider.pack(fill=tk.X, pady=5)
         
+        ttk.Label(advanced_tab, text="Vignette Shape:").pack(anchor=tk.W, pady=(10, 0))
+        self.vignette_shape_var = tk.StringVar(value="classic")
+        shape_menu = ttk.Combobox(advanced_tab, textvariable=self.vignette_shape_var,
+                                  values=VIGNETTE_SHAPES, state="readonly")
+        shape_menu.bind("<<ComboboxSelected>>", self.change_vignette_shape)
+        shape_menu.pack(fill=tk.X, pady=5)
+        
+        # Detail: radii are full-resolution pixels, previewed on the proxy
+        ttk.Label(advanced_tab, text="Blur Radius (px):").pack(anchor=tk.W, pady=(10, 0))
+        self.blur_slider = ttk.Scale(advanced_tab, from_=0, to=100, command=self.apply_detail)
+        self.blur_slider.set(0)
+        self.blur_slider.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(advanced_tab, text="Sharpen:").pack(anchor=tk.W, pady=(10, 0))
+        self.sharpen_slider = ttk.Scale(advanced_tab, from_=0, to=300, command=self.apply_detail)
+        self.sharpen_slider.set(0)
+        self.sharpen_slider.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(advanced_tab, text="Clarity:").pack(anchor=tk.W, pady=(10, 0))
+        self.clarity_slider = ttk.Scale(advanced_tab, from_=-100, to=100, command=self.apply_detail)
+        self.clarity_slider.set(0)
+        self.clarity_slider.pack(fill=tk.X, pady=5)
+        
+        # Record one undo step per slider drag
+        for slider in (self.brightness_slider, self.contrast_slider, self.saturation_slider,
+                       self.vibrance_slider, self.red_slider, self.green_slider,
+                       self.blue_slider, self.vignette_slider, self.blur_slider,
+                       self.sharpen_slider, self.clarity_slider):
+            slider.bind("<ButtonPress-1>", self.begin_slider_change, add="+")
+            slider.bind("<ButtonRelease-1>", self.end_slider_change, add="+")
+        
+        # Local adjustments tab
+        local_tab = ttk.Frame(self.image_notebook, style='TFrame')
+        self.image_notebook.add(local_tab, text="Local")
+        
+        ttk.Label(local_tab, text="Mask Layer:", style='Subheader.TLabel').pack(anchor=tk.W, pady=(10, 0))
+        self.layer_var = tk.StringVar()
+        self.layer_menu = ttk.Combobox(local_tab, textvariable=self.layer_var, state="readonly")
+        self.layer_menu.bind("<<ComboboxSelected>>", self.select_local_layer)
+        self.layer_menu.pack(fill=tk.X, pady=5)
+        
+        layer_buttons = ttk.Frame(local_tab)
+        layer_buttons.pack(fill=tk.X)
+        for text, command in (("New Brush", lambda: self.new_local_layer("Brush")),
+                              ("New Gradient", lambda: self.new_local_layer("Gradient")),
+                              ("Delete", self.delete_local_layer)):
+            ttk.Button(layer_buttons, text=text, style='Tool.TButton',
+                      command=command).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=1)
+        
+        ttk.Label(local_tab, text="Mask Tool:", style='Subheader.TLabel').pack(anchor=tk.W, pady=(10, 0))
+        self.mask_tool_var = tk.StringVar(value="off")
+        tool_frame = ttk.Frame(local_tab)
+        tool_frame.pack(fill=tk.X)
+        for text, tool in (("Pan", "off"), ("Paint", "paint"), ("Erase", "erase"), ("Gradient", "gradient")):
+            ttk.Radiobutton(tool_frame, text=text, variable=self.mask_tool_var, value=tool,
+                           command=self.set_mask_tool).pack(side=tk.LEFT, padx=2)
+        
+        ttk.Label(local_tab, text="Brush Size (px):").pack(anchor=tk.W, pady=(10, 0))
+        self.brush_size_slider = ttk.Scale(local_tab, from_=5, to=500)
+        self.brush_size_slider.set(100)
+        self.brush_size_slider.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(local_tab, text="Brush Hardness:").pack(anchor=tk.W, pady=(10, 0))
+        self.brush_hardness_slider = ttk.Scale(local_tab, from_=0, to=100)
+        self.brush_hardness_slider.set(50)
+        self.brush_hardness_slider.pack(fill=tk.X, pady=5)
+        
+        # The active layer's adjustments, inside its mask only
+        self.local_sliders = {}
+        for key, text in (("brightness", "Local Brightness:"), ("contrast", "Local Contrast:"),
+                          ("saturation", "Local Saturation:")):
+            ttk.Label(local_tab, text=text).pack(anchor=tk.W, pady=(10, 0))
+            slider = ttk.Scale(local_tab, from_=0, to=200, command=self.apply_local_adjustments)
+            slider.set(100)
+            slider.pack(fill=tk.X, pady=5)
+            slider.bind("<ButtonPress-1>", self.begin_slider_change, add="+")
+            slider.bind("<ButtonRelease-1>", self.end_slider_change, add="+")
+            self.local_sliders[key] = slider
+        
         # Tools tab
         tools_tab = ttk.Frame(self.image_notebook, style='TFrame')
         self.image_notebook.add(tools_tab, text="Tools")
         
+        # View
+        view_frame = ttk.LabelFrame(tools_tab, text="View", padding=10)
+        view_frame.pack(fill=tk.X, pady=5)
+        
+        zoom_buttons = ttk.Frame(view_frame)
+        zoom_buttons.pack(fill=tk.X)
+        for text, command in (("Zoom In", lambda: self.zoom_image(1.25)),
+                              ("Zoom Out", lambda: self.zoom_image(0.8)),
+                              ("Fit", self.zoom_fit), ("1:1", self.zoom_actual)):
+            ttk.Button(zoom_buttons, text=text, width=8,
+                      command=command).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=1)
+        self.zoom_var = tk.StringVar(value="Fit")
+        ttk.Label(view_frame, textvariable=self.zoom_var).pack(anchor=tk.W, pady=(5, 0))
+        
         # Transform tools
         transform_frame = ttk.LabelFrame(tools_tab, text="Transform", padding=10)
         transform_frame.pack(fill=tk.X, pady=5)
@@ -233,8 +433,30 @@ class MediaEditorPage(ttk.Frame):
                   command=self.ai_remove_background).pack(fill=tk.X, pady=5)
         ttk.Button(ai_tab, text="AI Style Transfer", style='Primary.TButton',
                   command=self.ai_style_transfer).pack(fill=tk.X, pady=5)
+        ttk.Button(ai_tab, text="Apply Colour LUT (.cube)", style='Primary.TButton',
+                  command=self.apply_color_lut).pack(fill=tk.X, pady=5)
         ttk.Button(ai_tab, text="AI Super Resolution", style='Primary.TButton',
                   command=self.ai_super_resolution).pack(fill=tk.X, pady=5)
+        
+        # Background removal settings
+        bg_frame = ttk.LabelFrame(ai_tab, text="Background Removal", padding=10)
+        bg_frame.pack(fill=tk.X, pady=5)
+        
+        self.key_color = (255, 255, 255)
+        self.key_color_button = ttk.Button(bg_frame, text="Key Colour: #ffffff",
+                                           command=self.choose_key_color)
+        self.key_color_button.pack(fill=tk.X, pady=2)
+        
+        ttk.Label(bg_frame, text="Tolerance:").pack(anchor=tk.W, pady=(5, 0))
+        self.tolerance_slider = ttk.Scale(bg_frame, from_=1, to=255)
+        self.tolerance_slider.set(55)
+        self.tolerance_slider.pack(fill=tk.X, pady=2)
+        
+        self.key_method_var = tk.StringVar(value="threshold")
+        ttk.Radiobutton(bg_frame, text="Per-channel threshold", variable=self.key_method_var,
+                        value="threshold").pack(anchor=tk.W)
+        ttk.Radiobutton(bg_frame, text="Colour distance", variable=self.key_method_var,
+                        value="distance").pack(anchor=tk.W)
     
     def create_audio_controls(self):
         """Create audio editing controls"""
@@ -295,6 +517,21 @@ class MediaEditorPage(ttk.Frame):
         
         ttk.Button(advanced_tab, text="Echo", style='Primary.TButton',
                   command=self.add_echo).pack(fill=tk.X, pady=5)
+        
+        # Convolution reverb: a synthetic space or a loaded impulse response
+        ttk.Label(advanced_tab, text="Reverb Space:").pack(anchor=tk.W, pady=(10, 0))
+        self.impulse_var = tk.StringVar(value="Hall")
+        self.impulse_menu = ttk.Combobox(advanced_tab, textvariable=self.impulse_var,
+                                         values=list(IMPULSES), state="readonly")
+        self.impulse_menu.pack(fill=tk.X, pady=5)
+        ttk.Button(advanced_tab, text="Load Impulse...", style='Secondary.TButton',
+                  command=self.load_impulse).pack(fill=tk.X, pady=5)
+        
+        ttk.Label(advanced_tab, text="Wet/Dry (%):").pack(anchor=tk.W, pady=(10, 0))
+        self.wet_slider = ttk.Scale(advanced_tab, from_=0, to=100)
+        self.wet_slider.set(30)
+        self.wet_slider.pack(fill=tk.X, pady=5)
+        
         ttk.Button(advanced_tab, text="Reverb", style='Primary.TButton',
                   command=self.add_reverb).pack(fill=tk.X, pady=5)
         
@@ -317,15 +554,123 @@ class MediaEditorPage(ttk.Frame):
             self.title_label.config(text="Image Editor")
             self.audio_canvas.pack_forget()
             self.image_canvas.pack(fill=tk.BOTH, expand=True)
+            if self.filmstrip:
+                self.strip_canvas.pack(side=tk.BOTTOM, fill=tk.X, pady=(5, 0), before=self.image_canvas)
             self.audio_notebook.pack_forget()
             self.image_notebook.pack(fill=tk.BOTH, expand=True)
         else:
             self.title_label.config(text="Audio Editor")
             self.image_canvas.pack_forget()
+            self.strip_canvas.pack_forget()
             self.audio_canvas.pack(fill=tk.BOTH, expand=True)
             self.image_notebook.pack_forget()
             self.audio_notebook.pack(fill=tk.BOTH, expand=True)
     
+    # Undo/redo
+    def undo(self):
+        """Undo the last edit in the current mode"""
+        self.step_history("undo")
+    
+    def redo(self):
+        """Redo the last undone edit in the current mode"""
+        self.step_history("redo")
+    
+    def step_history(self, direction):
+        """Move one step through the image or audio history"""
+        if self.mode_var.get() == "image":
+            history = self.image_history
+            if not self.session or not getattr(history, f"can_{direction}"):
+                return
+            # Make sure the session holds the adjustments shown on the sliders
+            self.session.set_adjustments(self.get_adjustments())
+            getattr(history, direction)(self.session)
+            self.sync_image_controls()
+            # Mask deltas change pixels of a mask in place
+            self.current_image = self.session.update_local()
+            self.display_image()
+            self.update_resolution_entries()
+        else:
+            history = self.audio_history
+            if self.audio_data is None or not getattr(history, f"can_{direction}"):
+                return
+            delta = getattr(history, f"{direction}_stack")[-1]
+            self.audio_data = getattr(history, direction)(self.audio_data)
+            if isinstance(delta, SampleDelta) and self.waveform_peaks is not None:
+                # Swapped in place: refresh only the peaks over those samples
+                self.waveform_peaks.update(delta.start, delta.end)
+            self.display_waveform()
+        self.status_var.set(f"{direction.capitalize()} done")
+    
+    def record_image_change(self, state):
+        """Push the session state from before an edit onto the image history"""
+        if state != self.session.snapshot():
+            self.image_history.push(StateDelta(state))
+    
+    def record_audio_change(self, start=None, end=None):
+        """Remember the audio before an edit; a range means the edit is in place"""
+        if start is None:
+            # The edit builds a new array, so the old one is kept without copying
+            self.audio_history.push(BufferDelta(self.audio_data))
+        else:
+            self.audio_history.push(SampleDelta(self.audio_data, start, end))
+    
+    def begin_slider_change(self, event=None):
+        """Remember the state before a slider drag"""
+        if self.session:
+            self.session.set_adjustments(self.get_adjustments())
+            self.slider_state = self.session.snapshot()
+    
+    def end_slider_change(self, event=None):
+        """Record a slider drag as one undo step"""
+        if self.session and self.slider_state is not None:
+            nodes, adjustments, local = self.slider_state
+            if (dict(adjustments) != self.get_adjustments() or nodes != self.session.graph.snapshot()
+                    or local != self.session.local.snapshot()):
+                self.image_history.push(StateDelta(self.slider_state))
+            self.slider_state = None
+            if not self.viewport.is_fit:
+                # Zoomed in: redraw from full resolution now the drag is over
+                self.display_image()
+    
+    def change_vignette_shape(self, event=None):
+        """Switch the vignette shape as one undo step"""
+        if not self.session:
+            return
+        # The combobox has already changed its variable, only the session
+        # still holds the previous shape
+        previous = self.session.adjustments["vignette_shape"]
+        if previous == self.vignette_shape_var.get():
+            return
+        self.session.set_adjustments(dict(self.get_adjustments(), vignette_shape=previous))
+        self.image_history.push(StateDelta(self.session.snapshot()))
+        self.apply_adjustments()
+    
+    def sync_image_controls(self):
+        """Show the session's adjustments and filter on the controls"""
+        params = self.session.adjustments
+        self.brightness_slider.set(params["brightness"] * 100)
+        self.contrast_slider.set(params["contrast"] * 100)
+        self.saturation_slider.set(params["saturation"] * 100)
+        self.vibrance_slider.set(params["vibrance"] * 100)
+        self.red_slider.set(params["red"] * 100)
+        self.green_slider.set(params["green"] * 100)
+        self.blue_slider.set(params["blue"] * 100)
+        self.vignette_slider.set(params["vignette"])
+        self.vignette_shape_var.set(params["vignette_shape"])
+        node = self.session.graph.find("filter")
+        self.filter_var.set(node.params["name"] if node else "None")
+        node = self.session.graph.find("detail")
+        detail = node.params if node else {}
+        # Setting a slider runs its command; don't record these as edits
+        self.syncing_controls = True
+        try:
+            self.blur_slider.set(detail.get("blur", 0))
+            self.sharpen_slider.set(detail.get("sharpen", 0))
+            self.clarity_slider.set(detail.get("clarity", 0))
+        finally:
+            self.syncing_controls = False
+        self.sync_local_controls()
+    
     # Image editing methods
     def open_image(self):
         """Open image file"""
@@ -334,19 +679,136 @@ class MediaEditorPage(ttk.Frame):
         )
         if file_path:
             try:
-                self.original_image = Image.open(file_path)
-                self.current_image = self.original_image.copy()
-                self.display_image()
-                self.status_var.set(f"Opened: {os.path.basename(file_path)}")
-                
-                # Update resolution entries
-                self.width_entry.delete(0, tk.END)
-                self.width_entry.insert(0, str(self.current_image.width))
-                self.height_entry.delete(0, tk.END)
-                self.height_entry.insert(0, str(self.current_image.height))
+                # Show a reduced draft decode now, decode the full image in the background
+                preview, full_size = open_preview(file_path, self.canvas_size(), USER_MAX_PIXELS)
+                self.start_session(file_path, preview, full_size)
             except Exception as e:
                 messagebox.showerror("Error", f"Could not open image: {e}")
     
+    def start_session(self, file_path, preview, full_size):
+        """Start editing file_path from its preview"""
+        if file_path != self.image_path:
+            # Release the previous image's scratch files before decoding this one
+            self.image_store.clear()
+        self.original_image = None
+        self.image_path = file_path
+        self.session = PreviewSession(preview, self.canvas_size(), full_size,
+                                      store=self.image_store)
+        self.image_loader.load(file_path)
+        self.image_history.clear()
+        self.sync_local_controls()
+        self.current_image = self.session.preview
+        self.display_image()
+        self.status_var.set(f"Opened: {os.path.basename(file_path)} (loading full resolution...)")
+        
+        # Update resolution entries
+        self.update_resolution_entries()
+    
+    def shutdown(self):
+        """Stop background work and remove scratch files when the app closes"""
+        self.close_playback()
+        self.export_queue.close()
+        self.render_scheduler.close()
+        self.full_render_scheduler.close()
+        if self.filmstrip:
+            self.filmstrip.close()
+        self.image_store.clear()
+        self.p.terminate()
+    
+    def open_folder(self):
+        """Browse the images of a folder"""
+        folder = filedialog.askdirectory()
+        if folder:
+            try:
+                filmstrip = Filmstrip.from_folder(folder, bound=self.canvas_size(),
+                                                  max_pixels=USER_MAX_PIXELS)
+            except OSError as e:
+                messagebox.showerror("Error", f"Could not open folder: {e}")
+                return
+            if not filmstrip:
+                filmstrip.close()
+                messagebox.showinfo("Open Folder", "No images found in this folder")
+                return
+            if self.filmstrip:
+                self.filmstrip.close()
+            self.filmstrip = filmstrip
+            self.strip_photos.clear()
+            self.strip_pending.clear()
+            self.switch_mode()
+            self.show_folder_image(0)
+    
+    def step_folder(self, step):
+        """Show the previous or next image of the open folder"""
+        if self.filmstrip and self.mode_var.get() == "image":
+            index = self.filmstrip.index + step
+            if 0 <= index < len(self.filmstrip):
+                self.show_folder_image(index)
+    
+    def show_folder_image(self, index):
+        """Open the folder image at index, usually from the prefetch cache"""
+        self.filmstrip.set_bound(self.canvas_size())
+        try:
+            path, preview, full_size = self.filmstrip.go(index)
+            self.start_session(path, preview, full_size)
+            self.status_var.set(f"{index + 1}/{len(self.filmstrip)}: {os.path.basename(path)}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open image: {e}")
+        self.draw_filmstrip()
+    
+    def draw_filmstrip(self):
+        """Draw the thumbnails around the current folder image"""
+        canvas = self.strip_canvas
+        canvas.delete("all")
+        if not self.filmstrip:
+            return
+        cell = STRIP_HEIGHT
+        count = max(1, canvas.winfo_width() // cell)
+        first = max(0, min(self.filmstrip.index - count // 2, len(self.filmstrip) - count))
+        shown = range(first, min(len(self.filmstrip), first + count))
+        # Keep only the thumbnails near the current image
+        for index in list(self.strip_photos):
+            if index not in shown:
+                del self.strip_photos[index]
+        for slot, index in enumerate(shown):
+            x = slot * cell + cell // 2
+            tag = f"thumb{index}"
+            if index == self.filmstrip.index:
+                canvas.create_rectangle(x - cell // 2 + 1, 1, x + cell // 2 - 1, cell - 1,
+                                        outline="#4a90e2", width=2)
+            photo = self.strip_photos.get(index)
+            if photo is not None:
+                canvas.create_image(x, cell // 2, image=photo, tags=tag)
+            else:
+                canvas.create_rectangle(x - cell // 2 + 4, 4, x + cell // 2 - 4, cell - 4,
+                                        outline="gray", tags=tag)
+                if index not in self.strip_photos and index not in self.strip_pending:
+                    self.strip_pending[index] = self.filmstrip.thumbnail(index)
+            canvas.tag_bind(tag, "<Button-1>", lambda e, i=index: self.show_folder_image(i))
+        if self.strip_pending and not self.strip_polling:
+            self.strip_polling = True
+            self.after(50, self.poll_thumbnails, self.filmstrip)
+    
+    def poll_thumbnails(self, filmstrip):
+        """Turn finished thumbnail decodes into PhotoImages"""
+        self.strip_polling = False
+        if filmstrip is not self.filmstrip:
+            return
+        ready = [index for index, future in self.strip_pending.items() if future.done()]
+        for index in ready:
+            future = self.strip_pending.pop(index)
+            try:
+                thumb = future.result().copy()
+                thumb.thumbnail((STRIP_HEIGHT - 8, STRIP_HEIGHT - 8))
+                self.strip_photos[index] = ImageTk.PhotoImage(thumb)
+            except Exception:
+                # Leave a placeholder rather than retrying an unreadable file
+                self.strip_photos[index] = None
+        if ready:
+            self.draw_filmstrip()
+        elif self.strip_pending:
+            self.strip_polling = True
+            self.after(50, self.poll_thumbnails, filmstrip)
+    
     def save_image(self):
         """Save image file"""
         if self.current_image:
@@ -356,15 +818,69 @@ class MediaEditorPage(ttk.Frame):
             )
             if file_path:
                 try:
-                    self.current_image.save(file_path)
+                    # Replay the edits on the full-resolution source
+                    self.image_loader.result()
+                    save_image(self.session.render(), file_path)
                     self.status_var.set(f"Saved: {os.path.basename(file_path)}")
                 except Exception as e:
                     messagebox.showerror("Error", f"Could not save image: {e}")
     
+    def export_image(self):
+        """Export the edited image with export presets in the background"""
+        if not self.current_image:
+            messagebox.showerror("Error", "No image to export")
+            return
+        session = self.session
+        state = session.snapshot()
+        if session.cached_render() is not None:
+            # The render changes as local edits are made, composite a frozen copy
+            base, local = session.render_base, session.local.copy()
+            matrix = session.source_matrix(base.size)
+            source = lambda: LocalCompositor(local, cell=256).apply(base, matrix)
+        elif session.is_preview_source:
+            # Render once the background decode has finished, off the Tk thread
+            decode = self.image_loader.future
+            local = session.local.copy()
+            source = lambda: render_state(decode.result(), state, self.image_store, local)
+        else:
+            image, local = session.source, session.local.copy()
+            source = lambda: render_state(image, state, self.image_store, local)
+        try:
+            metadata = read_metadata(self.image_path, USER_MAX_PIXELS)
+        except Exception:
+            # Metadata is optional (a decompression bomb error is not an
+            # OSError), the export goes ahead without it
+            metadata = None
+        stem = os.path.splitext(os.path.basename(self.image_path))[0]
+        ExportDialog(self, self.controller, self.export_queue, source, stem, metadata,
+                     directory=os.path.dirname(self.image_path), source_path=self.image_path)
+    
+    def full_image_loaded(self, image):
+        """Swap the fully decoded image in for the draft preview"""
+        self.original_image = image
+        self.session.set_source(image)
+        self.status_var.set(f"Full resolution loaded: {image.width}x{image.height}")
+    
+    def full_image_failed(self, error):
+        """Report a failed background decode"""
+        messagebox.showerror("Error", f"Could not decode image: {error}")
+    
+    def render_image(self):
+        """Render the edits at full resolution"""
+        if self.current_image:
+            try:
+                self.image_loader.result()
+                rendered = self.session.render()
+                self.status_var.set(f"Rendered {rendered.width}x{rendered.height}")
+            except Exception as e:
+                messagebox.showerror("Error", f"Could not render image: {e}")
+    
     def reset_image(self):
         """Reset image to original"""
-        if self.original_image:
-            self.current_image = self.original_image.copy()
+        if self.session:
+            state = self.session.snapshot()
+            self.current_image = self.session.reset()
+            self.record_image_change(state)
             self.display_image()
             self.brightness_slider.set(100)
             self.contrast_slider.set(100)
@@ -374,161 +890,403 @@ class MediaEditorPage(ttk.Frame):
             self.green_slider.set(100)
             self.blue_slider.set(100)
             self.vignette_slider.set(0)
+            self.vignette_shape_var.set("classic")
             self.filter_var.set("None")
+            self.blur_slider.set(0)
+            self.sharpen_slider.set(0)
+            self.clarity_slider.set(0)
+            self.sync_local_controls()
             
             # Update resolution entries
-            self.width_entry.delete(0, tk.END)
-            self.width_entry.insert(0, str(self.current_image.width))
-            self.height_entry.delete(0, tk.END)
-            self.height_entry.insert(0, str(self.current_image.height))
+            self.update_resolution_entries()
             
             self.status_var.set("Image reset to original")
     
+    def canvas_size(self):
+        """Current image canvas size"""
+        canvas_width = self.image_canvas.winfo_width()
+        canvas_height = self.image_canvas.winfo_height()
+        
+        if canvas_width <= 1 or canvas_height <= 1:  # If canvas not yet sized
+            canvas_width = 800
+            canvas_height = 600
+        return canvas_width, canvas_height
+    
+    def update_resolution_entries(self):
+        """Show the full-resolution size in the resolution entries"""
+        width, height = self.session.size
+        self.width_entry.delete(0, tk.END)
+        self.width_entry.insert(0, str(width))
+        self.height_entry.delete(0, tk.END)
+        self.height_entry.insert(0, str(height))
+    
     def display_image(self):
         """Display image on canvas"""
         if self.current_image:
-            # Calculate ratio to fit in canvas
-            canvas_width = self.image_canvas.winfo_width()
-            canvas_height = self.image_canvas.winfo_height()
+            canvas_width, canvas_height = self.canvas_size()
             
-            if canvas_width <= 1 or canvas_height <= 1:  # If canvas not yet sized
-                canvas_width = 800
-                canvas_height = 600
+            # Rebuild the proxy if the canvas has been resized
+            self.current_image = self.session.set_bound((canvas_width, canvas_height))
+            self.viewport.set_view((canvas_width, canvas_height))
+            self.viewport.set_image_size(self.session.size)
+            self.update_zoom_label()
             
-            img_ratio = self.current_image.width / self.current_image.height
-            canvas_ratio = canvas_width / canvas_height
+            if not self.viewport.is_fit:
+                self.display_tiles()
+                return
+            if self.tile_items:
+                self.image_canvas.delete("tile")
+                self.tile_items = {}
             
-            if img_ratio > canvas_ratio:
-                new_width = canvas_width
-                new_height = int(canvas_width / img_ratio)
-            else:
-                new_height = canvas_height
-                new_width = int(canvas_height * img_ratio)
+            # Fit the whole image in the canvas
+            _, _, new_width, new_height = self.viewport.image_box()
             
-            # Resize for display
-            display_image = self.current_image.resize((new_width, new_height), Image.LANCZOS)
-            self.tk_image = ImageTk.PhotoImage(display_image)
+            # Resize for display, skipped if neither image nor size changed
+            if not self.display_cache.update(self.current_image, (new_width, new_height),
+                                             self.session.version):
+                if self.image_canvas.find_withtag("image"):
+                    return
             
-            # Clear canvas and display image
-            self.image_canvas.delete("all")
-            self.image_canvas.create_image(canvas_width//2, canvas_height//2, image=self.tk_image, anchor=tk.CENTER)
+            # Reuse the canvas item, the PhotoImage is updated in place when possible
+            if self.tk_image is not self.display_cache.photo or not self.image_canvas.find_withtag("image"):
+                self.tk_image = self.display_cache.photo
+                self.image_canvas.delete("image")
+                self.image_canvas.create_image(canvas_width//2, canvas_height//2, image=self.tk_image,
+                                               anchor=tk.CENTER, tags="image")
+                self.image_canvas.tag_lower("image")
+            else:
+                self.image_canvas.coords("image", canvas_width//2, canvas_height//2)
             
             # If in crop mode, show crop rectangle
-            if self.crop_mode and self.crop_rect:
+            if self.crop_mode and self.crop_rect and not self.image_canvas.find_withtag("crop_rect"):
                 self.image_canvas.create_rectangle(self.crop_rect, outline='red', width=2, tags="crop_rect")
     
+    def display_tiles(self):
+        """Draw the zoomed-in image as tiles, rendering only those on screen"""
+        image = self.current_image
+        resolution = image.width / self.session.size[0]
+        # Past the proxy's resolution draw from the full-resolution render,
+        # except while a slider is being dragged or the image is still loading.
+        # Until the render is ready the proxy is drawn and a worker makes it.
+        if (self.viewport.scale > resolution and self.slider_state is None
+                and not self.session.is_preview_source):
+            rendered = self.session.cached_render()
+            if rendered is None:
+                self.request_full_render()
+            else:
+                image = rendered
+        
+        self.image_canvas.delete("image")
+        version = self.session.version
+        if image is not self.viewport.image or version != self.viewport.version:
+            # New pixels: every tile has to be drawn again
+            self.image_canvas.delete("tile")
+            self.tile_items = {}
+        visible = {}
+        for key, (x, y), tile in self.viewport.visible_tiles(image, version):
+            entry = self.tile_items.pop(key, None)
+            if entry is None:
+                photo = ImageTk.PhotoImage(tile)
+                item = self.image_canvas.create_image(x, y, image=photo, anchor=tk.NW, tags="tile")
+                entry = (photo, item)
+            else:
+                self.image_canvas.coords(entry[1], x, y)
+            visible[key] = entry
+        # Tiles that left the screen
+        for _, item in self.tile_items.values():
+            self.image_canvas.delete(item)
+        self.tile_items = visible
+        self.image_canvas.tag_lower("tile")
+    
+    def request_full_render(self):
+        """Render the operations and adjustments at full resolution on the worker"""
+        job = (self.session.source, self.session.render_state())
+        pending = self.full_render_job
+        if pending is None or pending[0] is not job[0] or pending[1] != job[1]:
+            self.full_render_job = job
+            self.full_render_scheduler.submit(job)
+    
+    def render_full(self, job, cancelled):
+        """Render a full-resolution base on the worker thread"""
+        source, state = job
+        if cancelled():
+            return None
+        return job, render_state(source, state, self.image_store)
+    
+    def show_full_render(self, result):
+        """Install a finished full-resolution render and redraw from it"""
+        job, image = result
+        if job is self.full_render_job:
+            self.full_render_job = None
+        if self.session and self.session.set_render_base(*job, image):
+            self.display_image()
+    
+    def show_full_render_error(self, error):
+        """Report a failed full-resolution render"""
+        self.full_render_job = None
+        messagebox.showerror("Error", f"Could not render image: {error}")
+    
+    def update_zoom_label(self):
+        """Show the current zoom level"""
+        percent = round(self.viewport.scale * 100)
+        self.zoom_var.set(f"Fit ({percent}%)" if self.viewport.is_fit else f"{percent}%")
+    
+    def zoom_image(self, factor, anchor=None):
+        """Zoom by factor around a canvas point, the centre by default"""
+        if self.current_image:
+            self.viewport.zoom_by(factor, anchor)
+            self.display_image()
+    
+    def zoom_fit(self):
+        """Fit the whole image in the canvas"""
+        if self.current_image:
+            self.viewport.fit()
+            self.display_image()
+    
+    def zoom_actual(self):
+        """Show one image pixel per screen pixel"""
+        if self.current_image:
+            self.viewport.actual_pixels()
+            self.display_image()
+    
+    def zoom_wheel(self, event):
+        """Zoom around the mouse pointer"""
+        up = event.num == 4 or getattr(event, "delta", 0) > 0
+        self.zoom_image(1.25 if up else 0.8, (event.x, event.y))
+    
+    def bind_pan(self):
+        """Drag with the left button to pan"""
+        self.image_canvas.bind("<Button-1>", self.pan_start)
+        self.image_canvas.bind("<B1-Motion>", self.pan_move)
+        self.image_canvas.bind("<ButtonRelease-1>", lambda e: setattr(self, "pan_last", None))
+    
+    def pan_start(self, event):
+        """Start panning"""
+        self.pan_last = (event.x, event.y)
+    
+    def pan_move(self, event):
+        """Pan by the mouse movement since the last event"""
+        if self.current_image and self.pan_last and not self.viewport.is_fit:
+            self.viewport.pan(event.x - self.pan_last[0], event.y - self.pan_last[1])
+            self.display_image()
+        self.pan_last = (event.x, event.y)
+    
+    def get_adjustments(self):
+        """Read the adjustment sliders into engine parameters"""
+        return {
+            "brightness": self.brightness_slider.get() / 100,
+            "contrast": self.contrast_slider.get() / 100,
+            "saturation": self.saturation_slider.get() / 100,
+            "vibrance": self.vibrance_slider.get() / 100,
+            "red": self.red_slider.get() / 100,
+            "green": self.green_slider.get() / 100,
+            "blue": self.blue_slider.get() / 100,
+            "vignette": self.vignette_slider.get(),
+            "vignette_shape": self.vignette_shape_var.get(),
+        }
+    
     def apply_adjustments(self, event=None):
         """Apply image adjustments"""
         if self.current_image:
-            try:
-                # Start with original image
-                img = self.original_image.copy()
-                
-                # Apply brightness
-                brightness = self.brightness_slider.get() / 100
-                enhancer = ImageEnhance.Brightness(img)
-                img = enhancer.enhance(brightness)
-                
-                # Apply contrast
-                contrast = self.contrast_slider.get() / 100
-                enhancer = ImageEnhance.Contrast(img)
-                img = enhancer.enhance(contrast)
-                
-                # Apply saturation
-                saturation = self.saturation_slider.get() / 100
-                enhancer = ImageEnhance.Color(img)
-                img = enhancer.enhance(saturation)
-                
-                # Apply vibrance (more complex - boost muted colors)
-                vibrance = self.vibrance_slider.get() / 100
-                if vibrance != 1.0:
-                    img = self.apply_vibrance(img, vibrance)
-                
-                # Apply color tints
-                red = self.red_slider.get() / 100
-                green = self.green_slider.get() / 100
-                blue = self.blue_slider.get() / 100
-                if red != 1.0 or green != 1.0 or blue != 1.0:
-                    img = self.apply_tint(img, red, green, blue)
-                
-                # Apply vignette
-                vignette = self.vignette_slider.get()
-                if vignette > 0:
-                    img = self.apply_vignette(img, vignette)
-                
-                # Update current image and display
-                self.current_image = img
-                self.display_image()
-                
-            except Exception as e:
-                messagebox.showerror("Error", f"Could not apply adjustments: {e}")
-    
-    def apply_vibrance(self, img, amount):
-        """Enhance muted colors more than already saturated ones"""
-        # Convert to HSV color space
-        hsv = img.convert('HSV')
-        h, s, v = hsv.split()
-        
-        # Enhance saturation based on current saturation
-        s = s.point(lambda x: int(x * (1 + (amount - 1) * (1 - x / 255))))
-        
-        # Convert back to RGB
-        enhanced_hsv = Image.merge('HSV', (h, s, v))
-        return enhanced_hsv.convert('RGB')
-    
-    def apply_tint(self, img, red, green, blue):
-        """Apply color tint to image"""
-        # Split into RGB channels
-        r, g, b = img.split()
-        
-        # Adjust each channel
-        r = r.point(lambda x: x * red)
-        g = g.point(lambda x: x * green)
-        b = b.point(lambda x: x * blue)
-        
-        # Merge back
-        return Image.merge('RGB', (r, g, b))
-    
-    def apply_vignette(self, img, amount):
-        """Apply vignette effect to image"""
-        # Create mask
-        width, height = img.size
-        x = np.linspace(-1, 1, width)
-        y = np.linspace(-1, 1, height)
-        X, Y = np.meshgrid(x, y)
-        mask = 1 - np.sqrt(X**2 + Y**2) * (amount / 100)
-        mask = np.clip(mask, 0, 1)
-        
-        # Convert to PIL image
-        mask_img = Image.fromarray((mask * 255).astype(np.uint8))
-        
-        # Apply mask to each channel
-        r, g, b = img.split()
-        r = ImageChops.multiply(r, mask_img)
-        g = ImageChops.multiply(g, mask_img)
-        b = ImageChops.multiply(b, mask_img)
-        
-        return Image.merge('RGB', (r, g, b))
+            # Bursts of slider events collapse into the latest parameters
+            self.render_scheduler.submit((self.session.base, self.get_adjustments()))
+    
+    def get_detail(self):
+        """Read the detail sliders into detail operation parameters"""
+        return {
+            "blur": round(self.blur_slider.get(), 1),
+            "sharpen": int(self.sharpen_slider.get()),
+            "clarity": int(self.clarity_slider.get()),
+        }
+    
+    def apply_detail(self, event=None):
+        """Blur, sharpen and clarity on the proxy as the sliders move"""
+        if not self.current_image or self.syncing_controls:
+            return
+        params = self.get_detail()
+        node = self.session.graph.find("detail")
+        if node is None and is_neutral_detail(params):
+            return
+        if node is not None and all(node.params.get(k) == v for k, v in params.items()):
+            return
+        try:
+            # A single detail node, updated in place while dragging
+            self.current_image = self.session.set_operation("detail", **params)
+            self.display_image()
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not apply detail: {e}")
+    
+    # Local adjustments
+    def sync_local_controls(self):
+        """Show the session's local layers and the active layer's sliders"""
+        layers = self.session.local.layers if self.session else []
+        if self.active_layer not in layers:
+            self.active_layer = layers[-1] if layers else None
+        self.layer_menu.configure(values=[layer.name for layer in layers])
+        self.layer_var.set(self.active_layer.name if self.active_layer else "")
+        params = self.active_layer.params if self.active_layer else {}
+        self.syncing_controls = True
+        try:
+            for key, slider in self.local_sliders.items():
+                slider.set(params.get(key, 1.0) * 100)
+        finally:
+            self.syncing_controls = False
+    
+    def new_local_layer(self, kind):
+        """Add an empty mask layer and start painting or drawing it"""
+        if not self.current_image:
+            return
+        state = self.session.snapshot()
+        local = self.session.local
+        count = sum(layer.name.startswith(kind) for layer in local.known.values()) + 1
+        # Masks cover the source, the operations carry them along
+        self.active_layer = local.add(f"{kind} {count}", self.session.source_size)
+        self.record_image_change(state)
+        self.sync_local_controls()
+        self.mask_tool_var.set("gradient" if kind == "Gradient" else "paint")
+        self.set_mask_tool()
+    
+    def delete_local_layer(self):
+        """Remove the active mask layer"""
+        if self.active_layer is None:
+            return
+        state = self.session.snapshot()
+        self.session.local.remove(self.active_layer)
+        self.active_layer = None
+        self.record_image_change(state)
+        self.show_local_changes()
+        self.sync_local_controls()
+    
+    def select_local_layer(self, event=None):
+        """Make the layer chosen in the menu the active one"""
+        index = self.layer_menu.current()
+        if self.session and 0 <= index < len(self.session.local.layers):
+            self.active_layer = self.session.local.layers[index]
+            self.sync_local_controls()
+    
+    def apply_local_adjustments(self, event=None):
+        """Change the active layer's adjustments"""
+        if self.active_layer is None or self.syncing_controls:
+            return
+        for key, slider in self.local_sliders.items():
+            self.active_layer.params[key] = round(slider.get()) / 100
+        self.show_local_changes()
+    
+    def show_local_changes(self):
+        """Recomposite the parts of the preview whose masks or layers changed"""
+        self.current_image = self.session.update_local()
+        self.display_image()
+    
+    def set_mask_tool(self):
+        """Route left-button drags to the mask tool, or back to panning"""
+        if self.mask_tool_var.get() == "off":
+            self.bind_pan()
+            return
+        if self.crop_mode:
+            self.cancel_crop()
+        self.image_canvas.bind("<Button-1>", self.mask_press)
+        self.image_canvas.bind("<B1-Motion>", self.mask_drag)
+        self.image_canvas.bind("<ButtonRelease-1>", self.mask_release)
+    
+    def mask_point(self, event):
+        """Mask pixel coordinates under the mouse"""
+        x, y = self.viewport.canvas_to_image(event.x, event.y)
+        mask = self.active_layer.mask
+        u, v, _ = self.session.source_matrix() @ (x, y, 1)
+        return (u * mask.size[0], v * mask.size[1])
+    
+    def paint_mask(self, points):
+        """Paint or erase along points with the brush settings"""
+        mask = self.active_layer.mask
+        # Brush size is in image pixels; the mask may be rotated or scaled from them
+        m = self.session.source_matrix()[:2, :2] * np.array(mask.size)[:, None]
+        radius = self.brush_size_slider.get() / 2 * np.sqrt(abs(np.linalg.det(m)))
+        mask.stroke(points, radius, self.brush_hardness_slider.get() / 100,
+                    erase=self.mask_tool_var.get() == "erase")
+    
+    def mask_press(self, event):
+        """Start a brush stroke or gradient on the active layer"""
+        if not self.current_image or self.active_layer is None:
+            self.status_var.set("Add a mask layer on the Local tab first")
+            return
+        point = self.mask_point(event)
+        self.mask_last = point
+        self.active_layer.mask.begin()
+        if self.mask_tool_var.get() != "gradient":
+            self.paint_mask([point])
+            self.show_local_changes()
+    
+    def mask_drag(self, event):
+        """Continue the stroke, or move the end of the gradient"""
+        if self.mask_last is None:
+            return
+        point = self.mask_point(event)
+        if self.mask_tool_var.get() == "gradient":
+            self.active_layer.mask.gradient(self.mask_last, point)
+        else:
+            self.paint_mask([self.mask_last, point])
+            self.mask_last = point
+        self.show_local_changes()
+    
+    def mask_release(self, event):
+        """Record the stroke or gradient as one undo step"""
+        if self.mask_last is None:
+            return
+        self.mask_last = None
+        mask = self.active_layer.mask
+        tiles = mask.end()
+        if tiles:
+            self.image_history.push(MaskDelta(mask, tiles))
+    
+    def render_adjustments(self, job, cancelled):
+        """Render adjustments on the worker thread"""
+        base, params = job
+        # Colour stages run as one fused LUT pass over the edited proxy
+        frame = self.adjustment_engine.render(params, base, cancelled)
+        if frame is None:
+            return None
+        return base, params, frame
+    
+    def show_adjusted_frame(self, result):
+        """Show a frame finished by the render worker"""
+        base, params, frame = result
+        if not self.session:
+            return
+        if not self.session.accept_preview(params, base, frame):
+            # An edit replaced the proxy while rendering, render again on top of it
+            self.apply_adjustments()
+            return
+        # The session lays the local layers over the frame
+        self.current_image = self.session.preview
+        self.display_image()
+        if self.render_scheduler.idle:
+            self.status_var.set(f"Preview: {self.render_scheduler.summary()}")
+    
+    def show_adjustment_error(self, error):
+        """Report a failed adjustment render"""
+        messagebox.showerror("Error", f"Could not apply adjustments: {error}")
+    
+    def apply_operation(self, op, **params):
+        """Record an operation in the session and show the new preview"""
+        state = self.session.snapshot()
+        self.current_image = self.session.apply(op, **params)
+        self.record_image_change(state)
+        self.display_image()
+        self.update_resolution_entries()
     
     def apply_filters(self):
         """Apply selected filter"""
         if self.current_image:
             try:
-                img = self.current_image.copy()
-                selected_filter = self.filter_var.get()
-                
-                if selected_filter == "Blur":
-                    img = img.filter(ImageFilter.BLUR)
-                elif selected_filter == "Sharpen":
-                    img = img.filter(ImageFilter.SHARPEN)
-                elif selected_filter == "Emboss":
-                    img = img.filter(ImageFilter.EMBOSS)
-                elif selected_filter == "Contour":
-                    img = img.filter(ImageFilter.CONTOUR)
-                elif selected_filter == "Black & White":
-                    img = img.convert('L').convert('RGB')
-                
-                self.current_image = img
+                # A single filter node: changing the filter recomputes only from there
+                name = self.filter_var.get()
+                state = self.session.snapshot()
+                if name == "None":
+                    # No filter is no node, the undo entry is only made if one is removed
+                    self.current_image = self.session.remove_operation("filter")
+                else:
+                    self.current_image = self.session.set_operation("filter", name=name)
+                self.record_image_change(state)
                 self.display_image()
             except Exception as e:
                 messagebox.showerror("Error", f"Could not apply filter: {e}")
@@ -536,28 +1294,18 @@ class MediaEditorPage(ttk.Frame):
     def rotate_image(self, degrees):
         """Rotate image by specified degrees"""
         if self.current_image:
-            self.current_image = self.current_image.rotate(degrees, expand=True)
-            self.display_image()
-            
-            # Update resolution entries
-            self.width_entry.delete(0, tk.END)
-            self.width_entry.insert(0, str(self.current_image.width))
-            self.height_entry.delete(0, tk.END)
-            self.height_entry.insert(0, str(self.current_image.height))
+            self.apply_operation("rotate", degrees=degrees)
     
     def flip_image(self, direction):
         """Flip image horizontally or vertically"""
         if self.current_image:
-            if direction == "horizontal":
-                self.current_image = self.current_image.transpose(Image.FLIP_LEFT_RIGHT)
-            else:
-                self.current_image = self.current_image.transpose(Image.FLIP_TOP_BOTTOM)
-            self.display_image()
+            self.apply_operation("flip", direction=direction)
     
     def start_crop(self):
         """Start crop mode"""
         if self.current_image:
             self.crop_mode = True
+            self.mask_tool_var.set("off")
             self.crop_button.config(state=tk.NORMAL)
             self.image_canvas.bind("<Button-1>", self.crop_start)
             self.image_canvas.bind("<B1-Motion>", self.crop_move)
@@ -577,7 +1325,7 @@ class MediaEditorPage(ttk.Frame):
     
     def crop_move(self, event):
         """Update crop selection"""
-        if self.crop_start_x and self.crop_start_y:
+        if self.crop_start_x is not None and self.crop_start_y is not None:
             self.crop_rect = (self.crop_start_x, self.crop_start_y, event.x, event.y)
             self.image_canvas.delete("crop_rect")
             self.image_canvas.create_rectangle(self.crop_rect, outline='red', width=2, tags="crop_rect")
@@ -586,42 +1334,23 @@ class MediaEditorPage(ttk.Frame):
         """Apply crop to image"""
         if self.current_image and self.crop_rect:
             try:
-                # Get canvas dimensions
-                canvas_width = self.image_canvas.winfo_width()
-                canvas_height = self.image_canvas.winfo_height()
-                
-                # Calculate ratio between canvas and actual image
-                img_width, img_height = self.current_image.size
-                x_ratio = img_width / canvas_width
-                y_ratio = img_height / canvas_height
-                
-                # Convert canvas coordinates to image coordinates
-                x1 = int(self.crop_rect[0] * x_ratio)
-                y1 = int(self.crop_rect[1] * y_ratio)
-                x2 = int(self.crop_rect[2] * x_ratio)
-                y2 = int(self.crop_rect[3] * y_ratio)
-                
-                # Ensure coordinates are within image bounds
-                x1 = max(0, min(x1, img_width))
-                x2 = max(0, min(x2, img_width))
-                y1 = max(0, min(y1, img_height))
-                y2 = max(0, min(y2, img_height))
-                
-                # Ensure proper order (x1 < x2, y1 < y2)
-                if x1 > x2:
-                    x1, x2 = x2, x1
-                if y1 > y2:
-                    y1, y2 = y2, y1
+                # Map canvas coordinates through the viewport's zoom and pan
+                width, height = self.session.size
+                x1, y1 = self.viewport.canvas_to_image(*self.crop_rect[:2])
+                x2, y2 = self.viewport.canvas_to_image(*self.crop_rect[2:])
+                box = (x1 / width, y1 / height, x2 / width, y2 / height)
+                box = tuple(max(0.0, min(v, 1.0)) for v in box)
                 
                 # Crop the image
-                self.current_image = self.current_image.crop((x1, y1, x2, y2))
+                state = self.session.snapshot()
+                self.session.apply("crop", box=box)
+                self.record_image_change(state)
+                self.current_image = self.session.preview
                 
                 # Reset crop mode
                 self.crop_mode = False
                 self.crop_button.config(state=tk.DISABLED)
-                self.image_canvas.unbind("<Button-1>")
-                self.image_canvas.unbind("<B1-Motion>")
-                self.image_canvas.unbind("<ButtonRelease-1>")
+                self.bind_pan()
                 self.image_canvas.delete("crop_rect")
                 self.crop_rect = None
                 self.crop_start_x = None
@@ -629,10 +1358,7 @@ class MediaEditorPage(ttk.Frame):
                 
                 # Update display and resolution entries
                 self.display_image()
-                self.width_entry.delete(0, tk.END)
-                self.width_entry.insert(0, str(self.current_image.width))
-                self.height_entry.delete(0, tk.END)
-                self.height_entry.insert(0, str(self.current_image.height))
+                self.update_resolution_entries()
                 
                 self.status_var.set("Image cropped")
             except Exception as e:
@@ -646,9 +1372,7 @@ class MediaEditorPage(ttk.Frame):
         """Cancel crop operation"""
         self.crop_mode = False
         self.crop_button.config(state=tk.DISABLED)
-        self.image_canvas.unbind("<Button-1>")
-        self.image_canvas.unbind("<B1-Motion>")
-        self.image_canvas.unbind("<ButtonRelease-1>")
+        self.bind_pan()
         self.image_canvas.delete("crop_rect")
         self.crop_rect = None
         self.crop_start_x = None
@@ -666,8 +1390,7 @@ class MediaEditorPage(ttk.Frame):
                     messagebox.showerror("Error", "Width and height must be positive numbers")
                     return
                 
-                self.current_image = self.current_image.resize((width, height), Image.LANCZOS)
-                self.display_image()
+                self.apply_operation("resize", width=width, height=height)
                 self.status_var.set(f"Image resized to {width}x{height}")
             except ValueError:
                 messagebox.showerror("Error", "Please enter valid numbers for width and height")
@@ -685,12 +1408,7 @@ class MediaEditorPage(ttk.Frame):
             messagebox.showinfo("AI Enhancement", "Applying AI enhancement...")
             
             # Simulate enhancement with sharpening and color boost
-            enhanced = self.current_image.filter(ImageFilter.SHARPEN)
-            enhancer = ImageEnhance.Color(enhanced)
-            enhanced = enhancer.enhance(1.2)
-            
-            self.current_image = enhanced
-            self.display_image()
+            self.apply_operation("enhance")
             self.status_var.set("Applied AI enhancement")
             
         except Exception as e:
@@ -706,27 +1424,23 @@ class MediaEditorPage(ttk.Frame):
             # In a real app, this would call an actual AI service API
             messagebox.showinfo("Background Removal", "Applying AI background removal...")
             
-            # Convert to RGBA if not already
-            if self.current_image.mode != 'RGBA':
-                self.current_image = self.current_image.convert('RGBA')
-            
-            # Create a mask where darker pixels become transparent
-            datas = self.current_image.getdata()
-            new_data = []
-            for item in datas:
-                # Change pixels with high brightness to transparent
-                if item[0] > 200 and item[1] > 200 and item[2] > 200:
-                    new_data.append((255, 255, 255, 0))
-                else:
-                    new_data.append(item)
-            
-            self.current_image.putdata(new_data)
-            self.display_image()
+            # Make pixels close to the key colour transparent
+            self.apply_operation("remove_background", key_color=self.key_color,
+                                 tolerance=int(self.tolerance_slider.get()),
+                                 method=self.key_method_var.get())
             self.status_var.set("Applied AI background removal")
             
         except Exception as e:
             messagebox.showerror("Error", f"Background removal failed: {e}")
     
+    def choose_key_color(self):
+        """Pick the colour treated as background"""
+        rgb, hex_color = colorchooser.askcolor(color='#%02x%02x%02x' % self.key_color,
+                                               title="Background Key Colour")
+        if rgb:
+            self.key_color = tuple(int(c) for c in rgb)
+            self.key_color_button.config(text=f"Key Colour: {hex_color}")
+    
     def ai_style_transfer(self):
         """Apply artistic style to image using AI"""
         if not self.current_image:
@@ -743,50 +1457,47 @@ class MediaEditorPage(ttk.Frame):
                 
                 # In a real app, this would call an actual AI service API
                 # Here we simulate style transfer with color adjustments
-                if dialog.selected_style == "Van Gogh":
-                    # Apply yellow/blue color shift
-                    r, g, b = self.current_image.split()
-                    r = r.point(lambda x: x * 1.1)
-                    g = g.point(lambda x: x * 0.9)
-                    b = b.point(lambda x: x * 1.2)
-                    styled = Image.merge("RGB", (r, g, b))
-                elif dialog.selected_style == "Picasso":
-                    # Apply cubist-like effect (simplified)
-                    styled = self.current_image.filter(ImageFilter.CONTOUR)
-                else:  # Default to watercolor
-                    styled = self.current_image.filter(ImageFilter.SMOOTH_MORE)
-                
-                self.current_image = styled
-                self.display_image()
+                self.apply_operation("style", name=dialog.selected_style)
                 self.status_var.set(f"Applied {dialog.selected_style} style")
                 
         except Exception as e:
             messagebox.showerror("Error", f"Style transfer failed: {e}")
     
+    def apply_color_lut(self):
+        """Apply a 3D colour LUT loaded from a .cube file"""
+        if not self.current_image:
+            messagebox.showerror("Error", "No image to process")
+            return
+        
+        file_path = filedialog.askopenfilename(filetypes=[("Cube LUT", "*.cube")])
+        if file_path:
+            try:
+                self.apply_operation("lut", path=file_path)
+                self.status_var.set(f"Applied LUT: {os.path.basename(file_path)}")
+            except Exception as e:
+                messagebox.showerror("Error", f"Could not apply LUT: {e}")
+    
     def ai_super_resolution(self):
         """Use AI to increase image resolution"""
         if not self.current_image:
             messagebox.showerror("Error", "No image to enhance")
             return
         
+        factor = simpledialog.askinteger("Super Resolution", "Upscale factor (2-4):",
+                                         parent=self, initialvalue=2, minvalue=2, maxvalue=4)
+        if not factor:
+            return
+        
         try:
             # In a real app, this would call an actual AI service API
             messagebox.showinfo("Super Resolution", "Applying AI super resolution...")
             
-            # Simulate super resolution by upscaling with LANCZOS
-            width, height = self.current_image.size
-            upscaled = self.current_image.resize((width*2, height*2), Image.LANCZOS)
-            
-            self.current_image = upscaled
-            self.display_image()
-            
-            # Update resolution entries
-            self.width_entry.delete(0, tk.END)
-            self.width_entry.insert(0, str(self.current_image.width))
-            self.height_entry.delete(0, tk.END)
-            self.height_entry.insert(0, str(self.current_image.height))
+            # Simulate super resolution by upscaling with LANCZOS; large
+            # results are built in memory-mapped bands within the store's limit
+            self.apply_operation("super_resolution", factor=factor,
+                                 max_bytes=self.image_store.max_bytes)
             
-            self.status_var.set("Applied AI super resolution")
+            self.status_var.set(f"Applied AI super resolution ({factor}x)")
             
         except Exception as e:
             messagebox.showerror("Error", f"Super resolution failed: {e}")
@@ -802,17 +1513,22 @@ class MediaEditorPage(ttk.Frame):
                 # Read audio file
                 if file_path.lower().endswith('.mp3'):
                     audio = AudioSegment.from_mp3(file_path)
-                    self.audio_data = np.array(audio.get_array_of_samples())
+                    samples = np.array(audio.get_array_of_samples()).reshape(-1, audio.channels)
                     self.sample_rate = audio.frame_rate
                 else:
-                    self.sample_rate, self.audio_data = wavfile.read(file_path)
+                    self.sample_rate, samples = wavfile.read(file_path)
+                
+                self.audio_format = samples.dtype
+                self.audio_data = as_float32(samples)
                 
                 # Convert stereo to mono if needed
                 if len(self.audio_data.shape) > 1:
-                    self.audio_data = np.mean(self.audio_data, axis=1)
+                    self.audio_data = self.audio_data.mean(axis=1, dtype=np.float32)
                 
                 # Store original for reset
                 self.original_audio = self.audio_data.copy()
+                self.close_playback()
+                self.audio_history.clear()
                 self.audio_file = file_path
                 
                 # Display waveform
@@ -831,17 +1547,20 @@ class MediaEditorPage(ttk.Frame):
             )
             if file_path:
                 try:
+                    # The one quantization of the edit chain, with TPDF dither
                     if file_path.lower().endswith('.mp3'):
                         # Convert numpy array to AudioSegment
+                        samples = quantize(self.audio_data, np.int16)
                         audio_segment = AudioSegment(
-                            self.audio_data.tobytes(), 
+                            samples.tobytes(), 
                             frame_rate=self.sample_rate,
-                            sample_width=self.audio_data.dtype.itemsize, 
+                            sample_width=samples.dtype.itemsize, 
                             channels=1
                         )
                         audio_segment.export(file_path, format="mp3")
                     else:
-                        wavfile.write(file_path, self.sample_rate, self.audio_data)
+                        samples = quantize(self.audio_data, self.audio_format)
+                        wavfile.write(file_path, self.sample_rate, samples)
                     
                     self.status_var.set(f"Saved: {os.path.basename(file_path)}")
                 except Exception as e:
@@ -850,6 +1569,7 @@ class MediaEditorPage(ttk.Frame):
     def reset_audio(self):
         """Reset audio to original"""
         if self.original_audio is not None:
+            self.record_audio_change()
             self.audio_data = self.original_audio.copy()
             self.display_waveform()
             self.status_var.set("Audio reset to original")
@@ -867,107 +1587,125 @@ class MediaEditorPage(ttk.Frame):
                 width = 800
                 height = 200
             
-            # Downsample for display
-            step = max(1, len(self.audio_data) // width)
-            samples = self.audio_data[::step]
+            # Peaks are indexed once per buffer; in-place edits update them
+            if self.waveform_peaks is None or self.waveform_peaks.samples is not self.audio_data:
+                self.waveform_peaks = PeakPyramid(self.audio_data)
             
-            # Normalize to canvas height
-            max_val = np.max(np.abs(samples))
-            if max_val > 0:
-                samples = samples / max_val * (height / 2 - 10)
+            # Min/max of every pixel column, drawn as a single polygon
+            coords = waveform_polygon(self.waveform_peaks, width, height)
+            self.audio_canvas.create_polygon(coords, fill="blue", outline="blue", tags="waveform")
             
-            # Draw waveform
-            mid_y = height // 2
-            for i in range(1, len(samples)):
-                x1 = (i-1) * (width / len(samples))
-                y1 = mid_y - samples[i-1]
-                x2 = i * (width / len(samples))
-                y2 = mid_y - samples[i]
-                self.audio_canvas.create_line(x1, y1, x2, y2, fill="blue")
+            # Edits that build a new array are picked up where playback is
+            if self.playback and self.playback.samples is not self.audio_data:
+                self.bind_playback()
+            self.update_playback_position()
     
     def toggle_playback(self):
         """Toggle audio playback"""
         if self.audio_data is None:
             return
             
-        if self.is_playing:
-            self.stop_playback()
+        if self.playback and self.playback.playing:
+            self.playback.pause()
+            self.play_button.config(text="Play")
         else:
             self.start_playback()
     
+    def bind_playback(self):
+        """Point playback at the current buffer, keeping its position and state"""
+        position, playing = 0, False
+        if self.playback:
+            position, playing = self.playback.position, self.playback.playing
+            self.playback.close()
+        channels = 1 if self.audio_data.ndim == 1 else self.audio_data.shape[1]
+        device = PyAudioDevice(self.p, self.sample_rate, channels)
+        self.playback = PlaybackEngine(self.audio_data, self.sample_rate, device)
+        self.set_volume(self.volume_slider.get())
+        self.set_speed(self.speed_slider.get())
+        self.playback.seek(position)
+        if playing:
+            self.playback.play()
+    
+    def close_playback(self):
+        """Stop and release the playback stream"""
+        if self.playback:
+            self.playback.close()
+            self.playback = None
+            self.play_button.config(text="Play")
+    
     def start_playback(self):
         """Start audio playback"""
-        if self.audio_data is not None and not self.is_playing:
-            self.is_playing = True
-            self.play_button.config(text="Pause")
-            
-            # Open stream
-            self.stream = self.p.open(
-                format=pyaudio.paInt16,
-                channels=1,
-                rate=self.sample_rate,
-                output=True
-            )
-            
-            # Play audio in chunks
-            chunk_size = 1024
-            self.playback_pos = 0
-            self.play_audio_chunk(chunk_size)
-    
-    def play_audio_chunk(self, chunk_size):
-        """Play a chunk of audio data"""
-        if self.is_playing and self.playback_pos < len(self.audio_data):
-            chunk = self.audio_data[self.playback_pos:self.playback_pos + chunk_size]
-            self.stream.write(chunk.tobytes())
-            self.playback_pos += chunk_size
-            
-            # Update playback position on waveform
-            self.update_playback_position()
-            
-            # Schedule next chunk
-            self.after(10, lambda: self.play_audio_chunk(chunk_size))
-        else:
+        if self.audio_data is None:
+            return
+        if not self.playback or self.playback.samples is not self.audio_data:
+            self.bind_playback()
+        self.playback.play()
+        self.play_button.config(text="Pause")
+        if not self.playback_polling:
+            self.playback_polling = True
+            self.poll_playback()
+    
+    def poll_playback(self):
+        """Move the cursor to the sample being heard while playing"""
+        self.update_playback_position()
+        if self.playback and self.playback.playing and not self.playback.finished:
+            self.after(30, self.poll_playback)
+            return
+        self.playback_polling = False
+        if self.playback and self.playback.finished:
             self.stop_playback()
     
+    def seek_audio(self, event):
+        """Move playback to the clicked point of the waveform"""
+        if self.audio_data is None:
+            return
+        width = max(1, self.audio_canvas.winfo_width())
+        if not self.playback or self.playback.samples is not self.audio_data:
+            self.bind_playback()
+        self.playback.seek(event.x / width * len(self.audio_data))
+        self.update_playback_position()
+    
     def update_playback_position(self):
         """Update playback position indicator on waveform"""
-        if self.audio_data is not None:
-            self.audio_canvas.delete("position")
-            
+        if self.audio_data is not None and len(self.audio_data):
             width = self.audio_canvas.winfo_width()
             if width <= 1:
                 width = 800
-                
-            pos_x = (self.playback_pos / len(self.audio_data)) * width
-            self.audio_canvas.create_line(pos_x, 0, pos_x, self.audio_canvas.winfo_height(), 
-                                  fill="red", tags="position", width=2)
+            
+            position = self.playback.position if self.playback else 0
+            pos_x = (position / len(self.audio_data)) * width
+            height = self.audio_canvas.winfo_height()
+            # Move the existing cursor rather than recreating it every poll
+            if self.audio_canvas.find_withtag("position"):
+                self.audio_canvas.coords("position", pos_x, 0, pos_x, height)
+            else:
+                self.audio_canvas.create_line(pos_x, 0, pos_x, height,
+                                      fill="red", tags="position", width=2)
     
     def stop_playback(self):
         """Stop audio playback"""
-        if self.is_playing:
-            self.is_playing = False
+        if self.playback:
+            self.playback.stop()
             self.play_button.config(text="Play")
-            
-            if self.stream:
-                self.stream.stop_stream()
-                self.stream.close()
+            self.update_playback_position()
     
     def set_volume(self, value):
-        """Set playback volume"""
-        # This would adjust the volume of the audio data before playback
-        pass
+        """Set playback volume; applied while playing, audio_data is untouched"""
+        if self.playback:
+            self.playback.set_volume(float(value) / 100)
     
     def set_speed(self, value):
-        """Set playback speed"""
-        # This would adjust the playback speed
-        pass
+        """Set playback speed; time-stretched while playing, pitch is kept"""
+        if self.playback:
+            self.playback.set_speed(float(value) / 100)
     
     def normalize_audio(self):
         """Normalize audio to maximum volume"""
         if self.audio_data is not None:
             max_val = np.max(np.abs(self.audio_data))
             if max_val > 0:
-                self.audio_data = (self.audio_data / max_val) * 32767  # For 16-bit audio
+                self.record_audio_change()
+                self.audio_data = self.audio_data * np.float32(1 / max_val)
                 self.display_waveform()
                 self.status_var.set("Audio normalized")
     
@@ -979,12 +1717,16 @@ class MediaEditorPage(ttk.Frame):
             
             if fade_type == "in":
                 # Fade in
-                fade = np.linspace(0, 1, fade_samples)
+                fade = np.linspace(0, 1, fade_samples, dtype=np.float32)
+                self.record_audio_change(0, fade_samples)
                 self.audio_data[:fade_samples] = self.audio_data[:fade_samples] * fade
+                self.waveform_peaks.update(0, fade_samples)
             else:
                 # Fade out
-                fade = np.linspace(1, 0, fade_samples)
+                fade = np.linspace(1, 0, fade_samples, dtype=np.float32)
+                self.record_audio_change(length - fade_samples, length)
                 self.audio_data[-fade_samples:] = self.audio_data[-fade_samples:] * fade
+                self.waveform_peaks.update(length - fade_samples, length)
             
             self.display_waveform()
             self.status_var.set(f"Applied {fade_type} fade")
@@ -992,7 +1734,9 @@ class MediaEditorPage(ttk.Frame):
     def reverse_audio(self):
         """Reverse audio"""
         if self.audio_data is not None:
-            self.audio_data = np.flip(self.audio_data)
+            self.record_audio_change()
+            # Copy so later in-place edits cannot reach the undo buffer
+            self.audio_data = np.flip(self.audio_data).copy()
             self.display_waveform()
             self.status_var.set("Audio reversed")
     
@@ -1003,12 +1747,13 @@ class MediaEditorPage(ttk.Frame):
                 echo_delay = int(0.2 * self.sample_rate)  # 200ms delay
                 echo = np.zeros_like(self.audio_data)
                 echo[echo_delay:] = self.audio_data[:-echo_delay] * 0.5
-                self.audio_data = (self.audio_data + echo).astype(np.int16)
+                self.record_audio_change()
+                self.audio_data = self.audio_data + echo
                 
-                # Ensure we don't clip
+                # Ensure we don't clip; the sum is a new array, so scale in place
                 max_val = np.max(np.abs(self.audio_data))
-                if max_val > 32767:
-                    self.audio_data = (self.audio_data / max_val) * 32767
+                if max_val > 1:
+                    self.audio_data /= max_val
                 
                 self.display_waveform()
                 self.status_var.set("Added echo effect")
@@ -1019,26 +1764,41 @@ class MediaEditorPage(ttk.Frame):
         """Add reverb effect to audio"""
         if self.audio_data is not None:
             try:
-                # Simple reverb simulation with multiple echoes
-                reverb = np.zeros_like(self.audio_data)
-                delays = [int(d * self.sample_rate) for d in [0.02, 0.04, 0.08, 0.16]]
-                gains = [0.7, 0.5, 0.3, 0.1]
-                
-                for delay, gain in zip(delays, gains):
-                    reverb[delay:] += self.audio_data[:-delay] * gain
+                name = self.impulse_var.get()
+                if name in self.custom_impulses:
+                    impulse = cached_impulse(self.custom_impulses[name], self.sample_rate)
+                else:
+                    impulse = impulse_response(name, self.sample_rate)
                 
-                self.audio_data = (self.audio_data + reverb).astype(np.int16)
+                # Partitioned FFT convolution, mixed with the dry signal
+                reverb = convolve_reverb(self.audio_data, impulse, self.wet_slider.get() / 100)
+                self.record_audio_change()
+                self.audio_data = reverb
                 
                 # Ensure we don't clip
                 max_val = np.max(np.abs(self.audio_data))
-                if max_val > 32767:
-                    self.audio_data = (self.audio_data / max_val) * 32767
+                if max_val > 1:
+                    self.audio_data /= max_val
                 
                 self.display_waveform()
-                self.status_var.set("Added reverb effect")
+                self.status_var.set(f"Added {name} reverb")
             except Exception as e:
                 messagebox.showerror("Error", f"Could not add reverb: {e}")
     
+    def load_impulse(self):
+        """Add an impulse response from a WAV file to the reverb spaces"""
+        file_path = filedialog.askopenfilename(filetypes=[("WAV Impulse Responses", "*.wav")])
+        if file_path:
+            try:
+                cached_impulse(file_path, self.sample_rate or 44100)
+            except Exception as e:
+                messagebox.showerror("Error", f"Could not load impulse response: {e}")
+                return
+            name = os.path.basename(file_path)
+            self.custom_impulses[name] = file_path
+            self.impulse_menu.config(values=list(IMPULSES) + list(self.custom_impulses))
+            self.impulse_var.set(name)
+    
     def ai_enhance_audio(self):
         """Use AI to enhance audio quality"""
         if self.audio_data is None:
@@ -1050,14 +1810,15 @@ class MediaEditorPage(ttk.Frame):
             messagebox.showinfo("AI Enhancement", "Applying AI audio enhancement...")
             
             # Simulate enhancement with some processing
-            enhanced = librosa.effects.preemphasis(self.audio_data.astype(np.float32))
+            enhanced = librosa.effects.preemphasis(self.audio_data)
             
             # Normalize
             max_val = np.max(np.abs(enhanced))
             if max_val > 0:
-                enhanced = (enhanced / max_val) * 32767
+                enhanced /= max_val
             
-            self.audio_data = enhanced.astype(np.int16)
+            self.record_audio_change()
+            self.audio_data = enhanced.astype(np.float32, copy=False)
             self.display_waveform()
             self.status_var.set("Applied AI audio enhancement")
             
@@ -1078,7 +1839,8 @@ class MediaEditorPage(ttk.Frame):
             b, a = signal.butter(5, 0.1, 'highpass')
             filtered = signal.filtfilt(b, a, self.audio_data)
             
-            self.audio_data = filtered.astype(np.int16)
+            self.record_audio_change()
+            self.audio_data = filtered.astype(np.float32)
             self.display_waveform()
             self.status_var.set("Applied AI noise reduction")
             
@@ -1099,7 +1861,8 @@ class MediaEditorPage(ttk.Frame):
             b, a = signal.butter(5, [300/(self.sample_rate/2), 3000/(self.sample_rate/2)], 'bandpass')
             filtered = signal.filtfilt(b, a, self.audio_data)
             
-            self.audio_data = filtered.astype(np.int16)
+            self.record_audio_change()
+            self.audio_data = filtered.astype(np.float32)
             self.display_waveform()
             self.status_var.set("Applied AI voice enhancement")
             
@@ -0,0 +1,77 @@
+# Image and audio processing engines used by the editor pages
+from .adjustments import AdjustmentEngine, DEFAULT_ADJUSTMENTS
+from .audio import as_float32, quantize
+from .background import remove_background
+from .batch import run_batch
+from .color import ColorMatrix, STYLE_PRESETS, apply_color, load_cube, save_cube
+from .detail import apply_detail
+from .display import DisplayCache
+from .export import EXPORT_SETS, ExportPreset, ExportQueue
+from .filmstrip import Filmstrip, ThumbnailCache
+from .graph import EditGraph
+from .loader import ImageLoader, open_preview, open_full
+from .history import History, StateDelta, BufferDelta, SampleDelta, MaskDelta
+from .masks import LocalAdjustments, LocalCompositor, TileMask
+from .operations import OPERATIONS, apply_operation
+from .parallel import parallel_filter
+from .playback import NullDevice, PlaybackEngine, PyAudioDevice, RingBuffer, TimeStretch
+from .preview import PreviewSession
+from .reverb import IMPULSES, convolve_reverb, impulse_response, load_impulse
+from .scheduler import RenderScheduler
+from .store import ImageStore
+from .vignette import VignetteCache, apply_vignette
+from .viewport import Viewport
+from .waveform import PeakPyramid, waveform_polygon
+
+__all__ = [
+    'AdjustmentEngine',
+    'DEFAULT_ADJUSTMENTS',
+    'as_float32',
+    'quantize',
+    'remove_background',
+    'run_batch',
+    'ColorMatrix',
+    'STYLE_PRESETS',
+    'apply_color',
+    'load_cube',
+    'save_cube',
+    'apply_detail',
+    'DisplayCache',
+    'EXPORT_SETS',
+    'ExportPreset',
+    'ExportQueue',
+    'Filmstrip',
+    'ThumbnailCache',
+    'EditGraph',
+    'ImageLoader',
+    'open_preview',
+    'open_full',
+    'History',
+    'StateDelta',
+    'BufferDelta',
+    'SampleDelta',
+    'MaskDelta',
+    'LocalAdjustments',
+    'LocalCompositor',
+    'TileMask',
+    'OPERATIONS',
+    'apply_operation',
+    'parallel_filter',
+    'NullDevice',
+    'PlaybackEngine',
+    'PyAudioDevice',
+    'RingBuffer',
+    'TimeStretch',
+    'PreviewSession',
+    'IMPULSES',
+    'convolve_reverb',
+    'impulse_response',
+    'load_impulse',
+    'RenderScheduler',
+    'ImageStore',
+    'VignetteCache',
+    'apply_vignette',
+    'Viewport',
+    'PeakPyramid',
+    'waveform_polygon'
+]
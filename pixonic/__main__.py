@@ -0,0 +1,19 @@
+import argparse
+import sys
+
+from . import batch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m pixonic",
+                                     description="Headless PIXONIC image processing")
+    commands = parser.add_subparsers(dest="command", required=True)
+    batch.add_arguments(commands.add_parser("batch", help="process many images with one recipe"))
+    args = parser.parse_args(argv)
+    if args.command == "batch":
+        return batch.main(args)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
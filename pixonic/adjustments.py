@@ -0,0 +1,156 @@
+import numpy as np
+from PIL import ImageFilter
+
+from .vignette import apply_vignette
+
+# Neutral values for every adjustment slider (sliders are stored as factors)
+DEFAULT_ADJUSTMENTS = {
+    "brightness": 1.0,
+    "contrast": 1.0,
+    "saturation": 1.0,
+    "vibrance": 1.0,
+    "red": 1.0,
+    "green": 1.0,
+    "blue": 1.0,
+    "vignette": 0.0,
+    "vignette_shape": "classic",
+}
+
+def is_neutral(params):
+    """True if params leave every pixel unchanged"""
+    return all(params.get(key, value) == value
+               for key, value in DEFAULT_ADJUSTMENTS.items() if key != "vignette_shape")
+
+
+# ITU-R 601-2 luma weights, the same ones Pillow uses for convert('L')
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def brightness_contrast_curve(brightness, contrast, mean):
+    """Build the 256-entry brightness/contrast curve shared by all channels"""
+    x = np.arange(256, dtype=np.float32)
+    x = np.clip(x * brightness, 0, 255)
+    x = np.clip(mean + (x - mean) * contrast, 0, 255)
+    return x
+
+
+def apply_saturation(rgb, amount):
+    """Mix float RGB values with their luma (ImageEnhance.Color)"""
+    luma = (rgb @ LUMA)[..., None]
+    return np.clip(luma + (rgb - luma) * amount, 0, 255)
+
+
+def apply_vibrance(rgb, amount):
+    """Boost muted colours more than saturated ones on float RGB values"""
+    # Work in HSV terms: keep hue and value, remap the saturation
+    value = rgb.max(axis=-1, keepdims=True)
+    low = rgb.min(axis=-1, keepdims=True)
+    sat = np.divide(value - low, value, out=np.zeros_like(value), where=value > 0) * 255
+    new_sat = np.clip(sat * (1 + (amount - 1) * (1 - sat / 255)), 0, 255)
+    ratio = np.divide(new_sat, sat, out=np.ones_like(sat), where=sat > 0)
+    return np.clip(value - (value - rgb) * ratio, 0, 255)
+
+
+class AdjustmentEngine:
+    """Fused colour adjustment pipeline for one source image
+
+    Brightness, contrast and the channel tints are folded into a single
+    per-channel lookup table. When saturation or vibrance are active the
+    whole colour pipeline is baked into a 3D LUT instead, so either way
+    the colour work is one pass over the pixels. Vignette is spatial and
+    stays a separate pass.
+    """
+
+    def __init__(self, lut_size=33):
+        self.lut_size = lut_size
+        self.source = None
+        self.histogram = None
+        self.stats = {"passes": 0, "temporaries": 0}
+
+    def set_source(self, image):
+        """Use a new source image, dropping statistics of the previous one"""
+        if image is self.source:
+            return
+        # RGBX is how memory-mapped RGB images are stored, keep it mapped
+        if image is not None and image.mode not in ("RGB", "RGBX", "RGBA"):
+            image = image.convert("RGB")
+        self.source = image
+        self.histogram = None
+
+    def luma_mean(self, brightness):
+        """Mean luma after brightness, as used by the contrast stage"""
+        if self.histogram is None:
+            self.histogram = np.array(self.source.convert("L").histogram(), dtype=np.float64)
+        levels = np.clip(np.arange(256) * brightness, 0, 255)
+        total = self.histogram.sum()
+        if total == 0:
+            return 0
+        return int(np.dot(self.histogram, levels) / total + 0.5)
+
+    def render(self, params, image=None, cancelled=None):
+        """Apply the adjustments in params and return a new image
+
+        cancelled is an optional callable checked between passes; when it
+        returns True the render stops early and None is returned.
+        """
+        if image is not None:
+            self.set_source(image)
+        params = dict(DEFAULT_ADJUSTMENTS, **params)
+        self.stats = {"passes": 0, "temporaries": 0}
+
+        img = self.source
+        colour = self.colour_filter(params)
+        if colour is not None:
+            img = self._run(img, colour)
+        if cancelled is not None and cancelled():
+            return None
+        if params["vignette"] > 0:
+            # Cached mask, one multiply pass
+            img = apply_vignette(img, params["vignette"], params["vignette_shape"])
+            self.stats["passes"] += 1
+            self.stats["temporaries"] += 1
+        if img is self.source:
+            img = img.copy()
+            self.stats["temporaries"] += 1
+        return img
+
+    def colour_filter(self, params):
+        """Return a table or Color3DLUT for the colour stages, or None if neutral"""
+        neutral = all(params[key] == DEFAULT_ADJUSTMENTS[key]
+                      for key in ("brightness", "contrast", "saturation", "vibrance",
+                                  "red", "green", "blue"))
+        if neutral:
+            return None
+
+        mean = self.luma_mean(params["brightness"]) if params["contrast"] != 1.0 else 0
+        curve = brightness_contrast_curve(params["brightness"], params["contrast"], mean)
+        tint = np.array([params["red"], params["green"], params["blue"]], dtype=np.float32)
+
+        if params["saturation"] == 1.0 and params["vibrance"] == 1.0:
+            # Purely per-channel: one 256-entry table per band
+            table = np.clip(curve[None, :] * tint[:, None], 0, 255).astype(np.uint8)
+            table = table.ravel().tolist()
+            if self.source.mode in ("RGBA", "RGBX"):
+                table += list(range(256))
+            return table
+
+        # Cross-channel: bake the whole chain into a 3D LUT
+        size = self.lut_size
+        grid = np.linspace(0, 255, size, dtype=np.float32)
+        levels = np.interp(grid, np.arange(256), curve).astype(np.float32)
+        b, g, r = np.meshgrid(levels, levels, levels, indexing="ij")
+        rgb = np.stack((r, g, b), axis=-1)
+        if params["saturation"] != 1.0:
+            rgb = apply_saturation(rgb, params["saturation"])
+        if params["vibrance"] != 1.0:
+            rgb = apply_vibrance(rgb, params["vibrance"])
+        rgb = np.clip(rgb * tint, 0, 255) / 255
+        return ImageFilter.Color3DLUT(size, rgb)
+
+    def _run(self, img, colour):
+        """Run one colour pass over img"""
+        self.stats["passes"] += 1
+        self.stats["temporaries"] += 1
+        if isinstance(colour, ImageFilter.Color3DLUT):
+            return img.filter(colour)
+        return img.point(colour)
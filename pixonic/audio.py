@@ -0,0 +1,58 @@
+import numpy as np
+
+
+def full_scale(dtype):
+    """Sample value that corresponds to 0 dBFS for a sample type"""
+    dtype = np.dtype(dtype)
+    if dtype.kind == "f":
+        return 1.0
+    return float(2 ** (dtype.itemsize * 8 - 1))
+
+
+def as_float32(samples, scale=None):
+    """Samples as float32 in -1..1
+
+    scale is the value of full scale in samples; it defaults to the one
+    of the sample type. Unsigned 8-bit samples are centred on 128.
+    """
+    samples = np.asarray(samples)
+    scale = scale or full_scale(samples.dtype)
+    if samples.dtype.kind == "u":
+        return (samples.astype(np.float32) - scale) / scale
+    if samples.dtype == np.float32 and scale == 1.0:
+        return samples
+    return samples.astype(np.float32) / np.float32(scale)
+
+
+def quantize(samples, dtype=np.int16, dither=True, rng=None, block=1 << 20):
+    """Float samples in -1..1 as dtype, rounded and clipped
+
+    This is the only place buffers lose precision, at playback and when
+    saving. TPDF dither, the difference of two uniform values spanning
+    one step each, makes the rounding error independent of the signal,
+    so quiet passages and fades get a steady noise floor instead of
+    distortion. Float targets are copied unchanged. Works block by
+    block, so temporaries stay small however long the buffer is.
+    """
+    dtype = np.dtype(dtype)
+    out = np.empty(samples.shape, dtype=dtype)
+    if dtype.kind == "f":
+        out[...] = samples
+        return out
+    scale = full_scale(dtype)
+    offset = scale if dtype.kind == "u" else 0.0
+    info = np.iinfo(dtype)
+    # float32 only holds 24 bits, too few to round to 32-bit steps
+    work = np.float32 if dtype.itemsize <= 2 else np.float64
+    rng = rng or np.random.default_rng()
+    source, target = samples.reshape(-1), out.reshape(-1)
+    for start in range(0, len(source), block):
+        chunk = source[start:start + block].astype(work) * work(scale)
+        if dither:
+            chunk += rng.random(len(chunk), dtype=work)
+            chunk -= rng.random(len(chunk), dtype=work)
+        np.rint(chunk, out=chunk)
+        chunk += offset
+        np.clip(chunk, info.min, info.max, out=chunk)
+        target[start:start + len(chunk)] = chunk
+    return out
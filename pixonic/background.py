@@ -0,0 +1,35 @@
+import numpy as np
+from PIL import Image
+
+# Rows processed per block, bounds the temporaries to a few MB
+BLOCK_ROWS = 256
+
+
+def background_mask(rgb, key_color, tolerance, method="threshold"):
+    """Boolean mask of pixels in an (h, w, 3) block that match key_color
+
+    "threshold" keys pixels whose every channel is within tolerance of the
+    key colour, "distance" keys pixels within a Euclidean colour distance.
+    """
+    diff = rgb.astype(np.int16) - np.asarray(key_color, dtype=np.int16)
+    if method == "distance":
+        dist = np.einsum('ijk,ijk->ij', diff, diff, dtype=np.int32)
+        return dist < tolerance * tolerance
+    return np.abs(diff).max(axis=-1) < tolerance
+
+
+def remove_background(image, key_color=(255, 255, 255), tolerance=55, method="threshold"):
+    """Return an RGBA copy of image with pixels matching key_color transparent"""
+    rgba = image.convert('RGBA')
+    width, height = rgba.size
+    alpha = np.array(rgba.getchannel('A'))
+
+    # Work on horizontal blocks so temporaries stay small
+    for top in range(0, height, BLOCK_ROWS):
+        bottom = min(height, top + BLOCK_ROWS)
+        block = np.asarray(rgba.crop((0, top, width, bottom)))[..., :3]
+        mask = background_mask(block, key_color, tolerance, method)
+        alpha[top:bottom][mask] = 0
+
+    rgba.putalpha(Image.fromarray(alpha))
+    return rgba
@@ -0,0 +1,253 @@
+import ast
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .adjustments import AdjustmentEngine, DEFAULT_ADJUSTMENTS, is_neutral
+from .export import file_key
+from .graph import EditGraph
+from .loader import IMAGE_EXTENSIONS, open_full
+from .operations import OPERATIONS
+from .tiles import save_image
+
+# Pillow format names for the output extensions, one for every input extension
+FORMATS = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG", ".bmp": "BMP", ".gif": "GIF",
+           ".tif": "TIFF", ".tiff": "TIFF", ".webp": "WEBP"}
+
+
+def parse_value(text):
+    """Parse a command line value as a Python literal, else keep the string"""
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def parse_operation(text):
+    """Parse "name:key=value,key=value" into (name, params)"""
+    name, _, rest = text.partition(":")
+    if name not in OPERATIONS:
+        raise ValueError(f"unknown operation {name!r}")
+    params = {}
+    # Split on commas that start a new key=value, so tuple values survive
+    pieces = []
+    for piece in rest.split(","):
+        if "=" in piece or not pieces:
+            pieces.append(piece)
+        else:
+            pieces[-1] += "," + piece
+    for piece in pieces:
+        if piece:
+            key, _, value = piece.partition("=")
+            params[key.strip()] = parse_value(value.strip())
+    return name, params
+
+
+def load_recipe(path):
+    """Read a JSON recipe: {"operations": [[name, {params}], ...], "adjustments": {...}}"""
+    with open(path, "r") as f:
+        recipe = json.load(f)
+    operations = [(name, dict(params)) for name, params in recipe.get("operations", [])]
+    for name, _ in operations:
+        if name not in OPERATIONS:
+            raise ValueError(f"unknown operation {name!r}")
+    return operations, dict(recipe.get("adjustments", {}))
+
+
+def find_images(inputs, recursive=False):
+    """Expand files and directories into (path, relative output stem) pairs"""
+    found = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                if not recursive:
+                    dirs[:] = []
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        path = os.path.join(root, name)
+                        stem = os.path.splitext(os.path.relpath(path, item))[0]
+                        found.append((path, stem))
+        else:
+            stem = os.path.splitext(os.path.basename(item))[0]
+            found.append((item, stem))
+    return found
+
+
+def plan_jobs(images, directory, format=None, skip_existing=False):
+    """(path, output) jobs for find_images() pairs written into directory
+
+    format is an output extension; by default each file keeps its own.
+    Raises ValueError if an output would replace one of the inputs or two
+    inputs would be written to the same file, before anything is done.
+    """
+    inputs = {file_key(path): path for path, _ in images}
+    planned = {}
+    jobs = []
+    for path, stem in images:
+        extension = ("." + format.lstrip(".") if format else os.path.splitext(path)[1]).lower()
+        if extension not in FORMATS:
+            raise ValueError(f"unsupported output format {extension!r} "
+                             f"(use one of {', '.join(sorted(FORMATS))})")
+        output = os.path.join(directory, stem + extension)
+        key = file_key(output)
+        if key in inputs:
+            raise ValueError(f"{output} would overwrite the input {inputs[key]}; "
+                             "choose another output directory or format")
+        if key in planned:
+            raise ValueError(f"{planned[key]} and {path} would both be written to {output}")
+        planned[key] = path
+        if skip_existing and os.path.exists(output):
+            continue
+        jobs.append((path, output))
+    return jobs
+
+
+def process_image(path, output, operations, adjustments, quality=92):
+    """Run a recipe on one file and save the result; returns the seconds taken
+
+    This is the unit of work sent to the process pool, so it only takes
+    plain picklable arguments. The file is written under a temporary
+    name and moved into place, so a failure never leaves half a file, and
+    output may never be the input itself.
+    """
+    start = time.perf_counter()
+    extension = os.path.splitext(output)[1].lower()
+    fmt = FORMATS.get(extension)
+    if fmt is None:
+        raise ValueError(f"unsupported output extension {extension!r}")
+    if file_key(output) == file_key(path):
+        raise ValueError(f"{output} is the input file")
+    image = open_full(path)
+    # Nothing is reused between files, so the graph keeps no cache
+    graph = EditGraph(budget=0)
+    graph.restore([(name, tuple(params.items())) for name, params in operations])
+    image, _ = graph.evaluate(image, path)
+    if not is_neutral(adjustments):
+        image = AdjustmentEngine().render(adjustments, image)
+
+    options = {}
+    if fmt == "JPEG" and image.mode not in ("RGB", "RGBX", "L"):
+        image = image.convert("RGB")
+    if fmt in ("JPEG", "WEBP"):
+        options["quality"] = quality
+    directory = os.path.dirname(output) or "."
+    os.makedirs(directory, exist_ok=True)
+    handle, partial = tempfile.mkstemp(suffix=".part", prefix=os.path.basename(output) + ".",
+                                       dir=directory)
+    os.close(handle)
+    try:
+        save_image(image, partial, fmt, **options)
+        os.replace(partial, output)
+    except BaseException:
+        os.remove(partial)
+        raise
+    return time.perf_counter() - start
+
+
+def run_batch(jobs, operations, adjustments, workers=None, quality=92, progress=None):
+    """Process (path, output) jobs on a process pool
+
+    progress(done, total, path, output, error, seconds) is called as each
+    file finishes. Returns the list of failures as dicts with the input
+    path and the error message.
+    """
+    failures = []
+    total = len(jobs)
+    workers = workers or os.cpu_count() or 1
+
+    def finished(done, path, output, error, seconds):
+        if error is not None:
+            failures.append({"path": path, "error": f"{type(error).__name__}: {error}"})
+        if progress is not None:
+            progress(done, total, path, output, error, seconds)
+
+    if workers == 1:
+        # Run in this process, handy for debugging a recipe
+        for done, (path, output) in enumerate(jobs, 1):
+            try:
+                seconds, error = process_image(path, output, operations, adjustments, quality), None
+            except Exception as e:
+                seconds, error = 0.0, e
+            finished(done, path, output, error, seconds)
+        return failures
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_image, path, output, operations, adjustments, quality):
+                   (path, output) for path, output in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            path, output = futures[future]
+            error = future.exception()
+            seconds = future.result() if error is None else 0.0
+            finished(done, path, output, error, seconds)
+    return failures
+
+
+def print_progress(done, total, path, output, error, seconds):
+    """Default progress output, one line per file"""
+    if error is None:
+        print(f"[{done}/{total}] {path} -> {output} ({seconds:.1f}s)", flush=True)
+    else:
+        print(f"[{done}/{total}] {path} FAILED: {error}", file=sys.stderr, flush=True)
+
+
+def add_arguments(parser):
+    """Add the batch command's arguments to an argparse parser"""
+    parser.add_argument("inputs", nargs="+", help="image files or directories")
+    parser.add_argument("-o", "--output", required=True, help="output directory")
+    parser.add_argument("-r", "--recipe", help="JSON recipe with operations and adjustments")
+    parser.add_argument("--op", action="append", default=[], metavar="NAME:KEY=VALUE,...",
+                        help="operation to apply, may be repeated "
+                             f"({', '.join(sorted(OPERATIONS))})")
+    parser.add_argument("--adjust", action="append", default=[], metavar="KEY=VALUE",
+                        help=f"adjustment, may be repeated ({', '.join(DEFAULT_ADJUSTMENTS)})")
+    parser.add_argument("-f", "--format", default=None,
+                        help="output extension such as png or jpg (default: keep the input's)")
+    parser.add_argument("-q", "--quality", type=int, default=92, help="JPEG/WebP quality")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--recursive", action="store_true", help="descend into subdirectories")
+    parser.add_argument("--skip-existing", action="store_true",
+                        help="leave files whose output already exists")
+    parser.add_argument("--report", help="write failures to this JSON file")
+
+
+def main(args):
+    """Run the batch command from parsed arguments; returns the exit status"""
+    try:
+        operations, adjustments = load_recipe(args.recipe) if args.recipe else ([], {})
+        operations += [parse_operation(text) for text in args.op]
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Invalid recipe: {e}")
+    for text in args.adjust:
+        key, _, value = text.partition("=")
+        if key not in DEFAULT_ADJUSTMENTS:
+            raise SystemExit(f"unknown adjustment {key!r}")
+        adjustments[key] = parse_value(value)
+
+    try:
+        jobs = plan_jobs(find_images(args.inputs, args.recursive), args.output,
+                         args.format, args.skip_existing)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if not jobs:
+        print("No images to process")
+        return 0
+
+    start = time.perf_counter()
+    failures = run_batch(jobs, operations, adjustments, args.workers, args.quality, print_progress)
+    elapsed = time.perf_counter() - start
+    print(f"Processed {len(jobs) - len(failures)}/{len(jobs)} images in {elapsed:.1f}s")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"processed": len(jobs), "failures": failures}, f, indent=2)
+    if failures:
+        print(f"{len(failures)} failed:", file=sys.stderr)
+        for failure in failures:
+            print(f"  {failure['path']}: {failure['error']}", file=sys.stderr)
+        return 1
+    return 0
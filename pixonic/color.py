@@ -0,0 +1,225 @@
+import functools
+import os
+
+import numpy as np
+from PIL import ImageFilter
+
+from .adjustments import LUMA
+
+
+class ColorMatrix(tuple):
+    """3x4 colour matrix, row-major as Image.convert("RGB", matrix) expects
+
+    Each output channel is a weighted sum of R, G and B plus an offset in
+    0..255 units, so tints, channel mixes, sepia and linear contrast are
+    one convert() pass.
+    """
+
+    def __new__(cls, rows):
+        values = tuple(float(v) for row in rows for v in row)
+        if len(values) != 12:
+            raise ValueError("a colour matrix needs 3 rows of 4 values")
+        return super().__new__(cls, values)
+
+    @classmethod
+    def scale(cls, red=1.0, green=1.0, blue=1.0):
+        """Per-channel gains"""
+        return cls(((red, 0, 0, 0), (0, green, 0, 0), (0, 0, blue, 0)))
+
+    @property
+    def is_diagonal(self):
+        """True if every channel depends only on itself"""
+        return not any(self[i] for i in (1, 2, 4, 6, 8, 9))
+
+    def table(self, alpha=False):
+        """Per-channel point() table for a diagonal matrix"""
+        x = np.arange(256, dtype=np.float32)
+        rows = [np.clip(x * self[i * 5] + self[i * 4 + 3] + 0.5, 0, 255) for i in range(3)]
+        table = np.concatenate(rows).astype(np.uint8).tolist()
+        return table + list(range(256)) if alpha else table
+
+    def __call__(self, rgb):
+        """Apply the matrix to float RGB values in 0..1, shape (..., 3)"""
+        m = np.array(self, dtype=np.float32).reshape(3, 4)
+        return rgb @ m[:, :3].T + m[:, 3] / 255
+
+
+def grid_lut(func, size=33):
+    """Color3DLUT whose entries are func(rgb) for a size^3 grid of 0..1 colours
+
+    func takes and returns float arrays of shape (..., 3), so building the
+    table is a handful of NumPy operations rather than a callback per entry.
+    """
+    levels = np.linspace(0, 1, size, dtype=np.float32)
+    b, g, r = np.meshgrid(levels, levels, levels, indexing="ij")
+    rgb = func(np.stack((r, g, b), axis=-1))
+    return ImageFilter.Color3DLUT(size, np.clip(rgb, 0, 1).astype(np.float32))
+
+
+@functools.lru_cache(maxsize=32)
+def matrix_lut(matrix, size=33):
+    """A ColorMatrix baked into a Color3DLUT"""
+    return grid_lut(matrix, size)
+
+
+def apply_color(image, transform):
+    """Apply a ColorMatrix or Color3DLUT to an image in a single pass
+
+    Diagonal matrices become a point() table and other matrices use
+    convert(matrix); RGBA images, which convert() cannot take a matrix
+    for, go through the matrix baked into a 3D LUT. Alpha is carried
+    through untouched; other modes are converted to RGB.
+    """
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+    if isinstance(transform, ColorMatrix):
+        if transform.is_diagonal:
+            return image.point(transform.table(image.mode == "RGBA"))
+        if image.mode == "RGB":
+            return image.convert("RGB", transform)
+        transform = matrix_lut(transform)
+    return image.filter(transform)
+
+
+def _luma(rgb):
+    return (rgb @ LUMA)[..., None]
+
+
+def _saturate(rgb, amount):
+    luma = _luma(rgb)
+    return luma + (rgb - luma) * amount
+
+
+def _smooth(t):
+    t = np.clip(t, 0, 1)
+    return t * t * (3 - 2 * t)
+
+
+def _ukiyo_e(rgb):
+    """Muted inks in a few flat bands on warm paper"""
+    rgb = _saturate(rgb, 0.75)
+    bands = 6
+    # Soft posterize: step towards the band centre without hard edges
+    scaled = rgb * (bands - 1)
+    base = np.floor(scaled)
+    rgb = (base + _smooth((scaled - base - 0.35) / 0.3)) / (bands - 1)
+    paper = np.array([0.96, 0.91, 0.80], dtype=np.float32)
+    return rgb * paper + 0.03
+
+
+def _cross_process(rgb):
+    """Slide film in C-41 chemicals: contrasty red, lifted blue, yellow-green cast"""
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    r = _smooth(r * 1.1 - 0.05)
+    g = np.clip(g * 1.05 + 0.02, 0, 1) ** 0.9
+    b = 0.15 + b * 0.7
+    return _saturate(np.stack((r, g, b), axis=-1), 1.15)
+
+
+def _teal_orange(rgb):
+    """Push shadows towards teal and highlights towards orange"""
+    luma = _luma(rgb)
+    teal = np.array([-0.06, 0.03, 0.08], dtype=np.float32)
+    orange = np.array([0.08, 0.02, -0.08], dtype=np.float32)
+    weight = _smooth(luma * 1.6 - 0.3)
+    return _saturate(rgb, 1.1) + teal * (1 - weight) + orange * weight
+
+
+def _faded_film(rgb):
+    """Lifted blacks, soft whites, slightly warm and desaturated"""
+    rgb = _saturate(rgb, 0.8)
+    rgb = 0.08 + rgb * 0.84
+    return rgb * np.array([1.03, 1.0, 0.94], dtype=np.float32)
+
+
+# Colour-only looks, each applied as one matrix or LUT pass
+STYLE_PRESETS = {
+    "Van Gogh": lambda: ColorMatrix.scale(1.1, 0.9, 1.2),
+    "Ukiyo-e": lambda: grid_lut(_ukiyo_e),
+    "Sepia": lambda: ColorMatrix(((0.393, 0.769, 0.189, 0),
+                                  (0.349, 0.686, 0.168, 0),
+                                  (0.272, 0.534, 0.131, 0))),
+    "Noir": lambda: ColorMatrix([tuple(LUMA * 1.4) + (-0.2 * 255,)] * 3),
+    "Cross Process": lambda: grid_lut(_cross_process),
+    "Teal & Orange": lambda: grid_lut(_teal_orange),
+    "Faded Film": lambda: grid_lut(_faded_film),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def style_transform(name):
+    """The ColorMatrix or Color3DLUT of a preset, built once"""
+    return STYLE_PRESETS[name]()
+
+
+def _is_number(text):
+    """True if text parses as a float"""
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+def load_cube(path):
+    """Read a 3D LUT in the Adobe/Resolve .cube format as a Color3DLUT
+
+    Only lines starting with a number are table entries. The domain comes
+    from DOMAIN_MIN/DOMAIN_MAX or Resolve's LUT_3D_INPUT_RANGE; other
+    keywords, such as LUT_1D_INPUT_RANGE or vendor extensions, are skipped.
+    """
+    size = None
+    domain_min, domain_max = np.zeros(3, np.float32), np.ones(3, np.float32)
+    values = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            keyword = line.split(None, 1)[0].upper()
+            if _is_number(keyword):
+                values.append(line.split()[:3])
+            elif keyword == "LUT_3D_SIZE":
+                size = int(line.split()[1])
+            elif keyword == "LUT_1D_SIZE":
+                raise ValueError("1D .cube LUTs are not supported")
+            elif keyword == "DOMAIN_MIN":
+                domain_min = np.array(line.split()[1:4], dtype=np.float32)
+            elif keyword == "DOMAIN_MAX":
+                domain_max = np.array(line.split()[1:4], dtype=np.float32)
+            elif keyword == "LUT_3D_INPUT_RANGE":
+                low, high = (float(v) for v in line.split()[1:3])
+                domain_min, domain_max = np.full(3, low, np.float32), np.full(3, high, np.float32)
+    if size is None:
+        raise ValueError(f"{os.path.basename(path)} has no LUT_3D_SIZE")
+    table = np.array(values, dtype=np.float32)
+    if table.shape != (size ** 3, 3):
+        raise ValueError(f"expected {size ** 3} entries, found {len(table)}")
+    # .cube lists red fastest, the same order as Color3DLUT
+    table = (table - domain_min) / (domain_max - domain_min)
+    return ImageFilter.Color3DLUT(size, table.reshape(size, size, size, 3))
+
+
+@functools.lru_cache(maxsize=8)
+def _cached_cube(path, mtime):
+    return load_cube(path)
+
+
+def cached_cube(path):
+    """load_cube() cached until the file changes"""
+    return _cached_cube(path, os.path.getmtime(path))
+
+
+def save_cube(transform, path, title=None, size=33):
+    """Write a ColorMatrix or Color3DLUT as a .cube file"""
+    if isinstance(transform, ColorMatrix):
+        transform = matrix_lut(transform, size)
+    size = transform.size[0]
+    if transform.size != (size, size, size) or transform.channels != 3:
+        raise ValueError("only cubic 3-channel LUTs can be written as .cube")
+    table = np.asarray(transform.table, dtype=np.float32).reshape(-1, 3)
+    with open(path, "w") as f:
+        if title:
+            f.write(f'TITLE "{title}"\n')
+        f.write(f"LUT_3D_SIZE {size}\n")
+        f.writelines(f"{r:.6f} {g:.6f} {b:.6f}\n" for r, g, b in table)
@@ -0,0 +1,77 @@
+from PIL import Image, ImageFilter
+
+from .parallel import parallel_filter
+
+# Radius of the local contrast that clarity boosts, in full-resolution pixels
+CLARITY_RADIUS = 30.0
+
+# Neutral values of the detail controls
+DEFAULT_DETAIL = {"blur": 0.0, "sharpen": 0, "sharpen_radius": 1.5, "clarity": 0}
+
+
+def is_neutral_detail(params):
+    """True if params leave every pixel unchanged"""
+    return not params.get("blur") and not params.get("sharpen") and not params.get("clarity")
+
+
+def _midtone_table(amount):
+    """point() table weighting midtones by amount (0..1), fading to 0 at black and white"""
+    return [int(255 * amount * (1 - (2 * x / 255 - 1) ** 2) + 0.5) for x in range(256)]
+
+
+def _split_alpha(image):
+    """(colour image, alpha band or None), so sharpening leaves alpha alone"""
+    if image.mode == "RGBA":
+        return image.convert("RGB"), image.getchannel("A")
+    if image.mode not in ("RGB", "RGBX", "L"):
+        return image.convert("RGB"), None
+    return image, None
+
+
+def blur(image, radius):
+    """Gaussian blur of radius pixels
+
+    Pillow computes the Gaussian as three box-blur passes with running
+    sums, so the cost per pixel does not depend on the radius.
+    """
+    if radius < 0.1:
+        return image
+    return parallel_filter(image, ImageFilter.GaussianBlur(radius))
+
+
+def sharpen(image, amount, radius=1.5, threshold=2):
+    """Unsharp mask: add amount percent of the difference from a blur"""
+    if amount <= 0 or radius < 0.1:
+        return image
+    return parallel_filter(image, ImageFilter.UnsharpMask(radius, int(amount), threshold))
+
+
+def clarity(image, amount, radius=CLARITY_RADIUS):
+    """Midtone local contrast for amount in -100..100
+
+    Positive amounts apply a wide, low-strength unsharp mask; negative
+    amounts blend towards a wide blur. Either way the effect is masked to
+    the midtones by the pixel's luma, so shadows and highlights keep
+    their detail and do not clip.
+    """
+    if not amount or radius < 0.5:
+        return image
+    if amount > 0:
+        effect = parallel_filter(image, ImageFilter.UnsharpMask(radius, int(amount), 0))
+    else:
+        effect = parallel_filter(image, ImageFilter.GaussianBlur(radius))
+    mask = image.convert("L").point(_midtone_table(min(1.0, abs(amount) / 100)))
+    return Image.composite(effect, image, mask)
+
+
+def apply_detail(image, blur_radius=0.0, sharpen_amount=0, sharpen_radius=1.5,
+                 clarity_amount=0, clarity_radius=CLARITY_RADIUS):
+    """Clarity, then sharpen, then blur, with radii in pixels of image"""
+    colour, alpha = _split_alpha(image)
+    colour = clarity(colour, clarity_amount, clarity_radius)
+    colour = sharpen(colour, sharpen_amount, sharpen_radius)
+    if alpha is not None:
+        colour = colour.convert("RGBA")
+        colour.putalpha(alpha)
+    # Blur the alpha too, so soft edges stay soft
+    return blur(colour, blur_radius)
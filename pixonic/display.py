@@ -0,0 +1,81 @@
+import time
+from collections import deque
+
+from PIL import Image
+
+
+class DisplayCache:
+    """Scale images for the canvas and reuse one PhotoImage between frames
+
+    The image is kept as a mip pyramid built with Image.reduce(2), so a
+    large image is first box-reduced to the nearest level above the target
+    size and only that level goes through the high-quality filter. When the
+    target size has not changed the new pixels are pasted into the
+    existing PhotoImage, and when neither the image nor the size changed
+    nothing is done at all. Images changed in place are told apart by a
+    version passed along with them.
+    """
+
+    def __init__(self, resample=Image.LANCZOS, history=100):
+        self.resample = resample
+        self.image = None
+        self.version = None
+        self.levels = []
+        self.size = None
+        self.photo = None
+        self.photo_mode = None
+        self.timings = deque(maxlen=history)
+
+    def set_image(self, image, version=None):
+        """Use a new image, or new pixels, dropping the previous pyramid"""
+        if image is not self.image or version != self.version:
+            self.image = image
+            self.version = version
+            self.levels = [image]
+
+    def level_for(self, size):
+        """Smallest pyramid level that is still at least size"""
+        level = self.levels[-1]
+        while level.width // 2 >= size[0] and level.height // 2 >= size[1]:
+            level = level.reduce(2)
+            self.levels.append(level)
+        for level in self.levels:
+            if level.width // 2 < size[0] or level.height // 2 < size[1]:
+                return level
+        return self.levels[-1]
+
+    def scaled(self, image, size, version=None):
+        """image scaled to size through the pyramid"""
+        self.set_image(image, version)
+        level = self.level_for(size)
+        if level.size == tuple(size):
+            return level
+        return level.resize(size, self.resample)
+
+    def update(self, image, size, version=None):
+        """Bring self.photo up to date; True if the canvas needs redrawing"""
+        start = time.perf_counter()
+        size = (max(1, size[0]), max(1, size[1]))
+        if (image is self.image and version == self.version and size == self.size
+                and self.photo is not None):
+            return False
+
+        scaled = self.scaled(image, size, version)
+        if self.photo is not None and size == self.size and scaled.mode == self.photo_mode:
+            # Same size: update the existing Tk image in place
+            self.photo.paste(scaled)
+        else:
+            # Imported here so the package can be used without Tk (batch mode)
+            from PIL import ImageTk
+            self.photo = ImageTk.PhotoImage(scaled)
+            self.photo_mode = scaled.mode
+        self.size = size
+        self.timings.append((time.perf_counter() - start) * 1000)
+        return True
+
+    @property
+    def average_ms(self):
+        """Mean time of the recent redraws in milliseconds"""
+        if not self.timings:
+            return 0.0
+        return sum(self.timings) / len(self.timings)
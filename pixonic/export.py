@@ -0,0 +1,374 @@
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from .adjustments import AdjustmentEngine, is_neutral
+from .graph import EditGraph
+from .loader import open_image
+from .masks import LocalCompositor
+from .tiles import save_image
+
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "TIFF": ".tif"}
+
+# Formats whose Pillow encoders take exif= and icc_profile=
+METADATA_FORMATS = ("JPEG", "PNG", "WEBP", "TIFF")
+
+
+class ExportPreset:
+    """One deliverable: a format, a longest side and encoder options
+
+    max_size limits the longer side (images are only ever shrunk);
+    quality applies to JPEG and WebP. progressive and optimize map onto
+    each encoder's nearest options, and keep_metadata carries the
+    source's EXIF and ICC profile into the file. suffix is appended to
+    the image's name; it defaults to _<max_size>, or _full when the size
+    is kept, so no preset writes a file named like its source.
+    """
+
+    def __init__(self, name, format="JPEG", max_size=None, quality=90, progressive=False,
+                 optimize=False, keep_metadata=True, dpi=None, suffix=None):
+        format = format.upper()
+        if format not in EXTENSIONS:
+            raise ValueError(f"unsupported export format: {format}")
+        self.name = name
+        self.format = format
+        self.max_size = max_size
+        self.quality = quality
+        self.progressive = progressive
+        self.optimize = optimize
+        self.keep_metadata = keep_metadata
+        self.dpi = dpi
+        self.suffix = suffix
+
+    def __repr__(self):
+        return f"ExportPreset({self.name!r}, {self.format!r}, max_size={self.max_size})"
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**values)
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    def filename(self, stem):
+        """Output file name for an image called stem"""
+        suffix = self.suffix
+        if suffix is None:
+            suffix = f"_{self.max_size}" if self.max_size else "_full"
+        return f"{stem}{suffix}{EXTENSIONS[self.format]}"
+
+    def options(self, metadata=None):
+        """Keyword arguments for Image.save()"""
+        options = {}
+        if self.format == "JPEG":
+            options.update(quality=self.quality, progressive=self.progressive,
+                           optimize=self.optimize)
+        elif self.format == "WEBP":
+            options.update(quality=self.quality, method=6 if self.optimize else 4)
+        elif self.format == "PNG":
+            options.update(optimize=self.optimize)
+        elif self.format == "TIFF":
+            options.update(compression="tiff_lzw")
+        if self.dpi:
+            options["dpi"] = (self.dpi, self.dpi)
+        if self.keep_metadata and metadata and self.format in METADATA_FORMATS:
+            options.update({k: v for k, v in metadata.items() if v})
+        return options
+
+
+def preset_grid(name, sizes, formats, **options):
+    """One preset per size and format, e.g. the renditions of a web gallery"""
+    return [ExportPreset(f"{name} {size or 'full'} {format}", format, size, **options)
+            for size in sizes for format in formats]
+
+
+# One-click deliverables
+EXPORT_SETS = {
+    "Web": preset_grid("Web", (2560, 1920, 1280, 800, 400), ("JPEG", "WEBP", "PNG"),
+                       quality=82, progressive=True, keep_metadata=False),
+    "Print": [ExportPreset("Print TIFF", "TIFF", dpi=300, suffix="_print"),
+              ExportPreset("Print JPEG", "JPEG", quality=95, dpi=300, suffix="_print")],
+    "Social": preset_grid("Social", (2048, 1080), ("JPEG",), quality=85, keep_metadata=False),
+    "Full size": [ExportPreset("Full size JPEG", "JPEG", quality=92)],
+}
+
+
+def read_metadata(path, max_pixels=None):
+    """EXIF and ICC profile of an image file, for presets that keep metadata
+
+    The orientation tag is dropped because opened images are already
+    rotated upright. max_pixels is passed to open_image(), so files the
+    user could open can be exported with their metadata.
+    """
+    with open_image(path, max_pixels) as image:
+        exif = image.getexif()
+        exif.pop(0x0112, None)
+        return {"exif": exif.tobytes() if exif else None,
+                "icc_profile": image.info.get("icc_profile")}
+
+
+def render_state(source, state, store=None, local=None):
+    """Render a PreviewSession.snapshot() on a full-resolution source
+
+    Works on its own graph, so it can run on a worker thread while the
+    session carries on being edited. local is a LocalAdjustments.copy()
+    of the session's local layers.
+    """
+    nodes, adjustments = state[:2]
+    graph = EditGraph(budget=0, store=store)
+    graph.restore(nodes)
+    image, _ = graph.evaluate(source, "export")
+    adjustments = dict(adjustments)
+    if not is_neutral(adjustments):
+        image = AdjustmentEngine().render(adjustments, image)
+    if local:
+        matrix = graph.source_matrix(source.size, image.size)
+        image = LocalCompositor(local, cell=256).apply(image, matrix)
+    return image
+
+
+def _numbered(path, taken):
+    """path, or path with _2, _3... before the extension, avoiding taken"""
+    root, extension = os.path.splitext(path)
+    candidate, number = path, 1
+    while taken(candidate):
+        number += 1
+        candidate = f"{root}_{number}{extension}"
+    return candidate
+
+
+def file_key(path):
+    """Key that is the same for every path naming one file, links and case included"""
+    return os.path.normcase(os.path.realpath(path))
+
+
+def plan_outputs(presets, directory, stem, protect=(), overwrite=False):
+    """Output path of each preset, all distinct
+
+    Presets that would share a path within the job are numbered apart.
+    Paths in protect, such as the source image, are never used, and
+    existing files are only reused when overwrite is True.
+    """
+    protected = {file_key(path) for path in protect}
+    planned = set()
+
+    def taken(path):
+        key = file_key(path)
+        return (key in planned or key in protected
+                or (not overwrite and os.path.exists(path)))
+
+    paths = []
+    for preset in presets:
+        path = _numbered(os.path.join(directory, preset.filename(stem)), taken)
+        planned.add(file_key(path))
+        paths.append(path)
+    return paths
+
+
+def fit_presets(presets, size):
+    """presets for an image of size, with sizes it already fits exported once
+
+    fit_within() never enlarges, so every preset whose max_size is at
+    least the longer side would encode the same full-size pixels under a
+    different name. Those become full-size presets, and full-size presets
+    that would write identical files are dropped.
+    """
+    longest = max(size)
+    fitted, seen = [], set()
+    for preset in presets:
+        if preset.max_size and preset.max_size >= longest:
+            values = preset.to_dict()
+            values["max_size"] = None
+            preset = ExportPreset.from_dict(values)
+        if not preset.max_size:
+            key = tuple(sorted((name, value) for name, value in vars(preset).items() if name != "name"))
+            if key in seen:
+                continue
+            seen.add(key)
+        fitted.append(preset)
+    return fitted
+
+
+def fit_within(image, max_size):
+    """image shrunk so its longer side is at most max_size"""
+    if not max_size or max(image.size) <= max_size:
+        return image
+    ratio = max_size / max(image.size)
+    size = (max(1, round(image.width * ratio)), max(1, round(image.height * ratio)))
+    return image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+
+class ExportJob:
+    """Progress of one submitted export
+
+    done, total, outputs and failures may be read from any thread while
+    the job runs; cancel() stops anything not yet encoding and discards
+    files still being written. total may shrink once the source has been
+    rendered and presets it already fits are merged.
+    """
+
+    def __init__(self, presets, directory, stem, protect=(), overwrite=False):
+        self.presets = list(presets)
+        self.directory = directory
+        self.stem = stem
+        self.protect = protect
+        self.overwrite = overwrite
+        self.paths = plan_outputs(self.presets, directory, stem, protect, overwrite)
+        self.total = len(self.presets)
+        self.done = 0
+        self.outputs = []
+        self.failures = []
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+
+    @property
+    def progress(self):
+        """Fraction of presets finished"""
+        return self.done / self.total if self.total else 1.0
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def wait(self, timeout=None):
+        """Block until every preset has finished or been cancelled"""
+        return self.finished.wait(timeout)
+
+    def fit(self, size):
+        """Merge the presets a source of size already fits, see fit_presets()"""
+        presets = fit_presets(self.presets, size)
+        if len(presets) == len(self.presets):
+            return
+        paths = plan_outputs(presets, self.directory, self.stem, self.protect, self.overwrite)
+        with self.lock:
+            self.presets, self.paths, self.total = presets, paths, len(presets)
+
+    def _complete(self, count=1, output=None, error=None, preset=None):
+        with self.lock:
+            self.done += count
+            if output is not None:
+                self.outputs.append(output)
+            if error is not None:
+                name = preset.name if preset else "render"
+                self.failures.append((name, f"{type(error).__name__}: {error}"))
+            if self.done >= self.total:
+                self.finished.set()
+
+
+class ExportQueue:
+    """Encode export presets on a thread pool
+
+    The source is rendered once per job, each distinct size is resized
+    once from it, and every preset of that size is then encoded in
+    parallel; Pillow releases the GIL while resizing and encoding, so
+    threads share the pixels without copying them to other processes.
+    """
+
+    def __init__(self, workers=None):
+        workers = workers or min(8, os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pixonic-export")
+
+    def submit(self, source, presets, directory, stem, metadata=None, protect=(), overwrite=False):
+        """Start exporting source with presets into directory; returns an ExportJob
+
+        source is an image, or a callable returning one that is run on
+        the pool, such as a full-resolution render. Output paths come
+        from plan_outputs(); pass the source file in protect.
+        """
+        job = ExportJob(presets, directory, stem, protect, overwrite)
+        if not job.total:
+            job.finished.set()
+            return job
+        self.executor.submit(self._prepare, job, source, metadata)
+        return job
+
+    def close(self):
+        """Stop taking work and drop anything queued"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _prepare(self, job, source, metadata):
+        """Render the source, then fan out one resize per distinct size"""
+        if job.cancelled.is_set():
+            return job._complete(job.total)
+        try:
+            image = source() if callable(source) else source
+            image.load()
+            os.makedirs(job.directory, exist_ok=True)
+        except Exception as e:
+            return job._complete(job.total, error=e)
+        job.fit(image.size)
+        sizes = {}
+        for preset, output in zip(job.presets, job.paths):
+            sizes.setdefault(preset.max_size, []).append((preset, output))
+        for max_size, outputs in sizes.items():
+            self.executor.submit(self._resize, job, image, max_size, outputs, metadata)
+
+    def _resize(self, job, image, max_size, outputs, metadata):
+        if job.cancelled.is_set():
+            return job._complete(len(outputs))
+        try:
+            resized = fit_within(image, max_size)
+        except Exception as e:
+            for preset, _ in outputs:
+                job._complete(error=e, preset=preset)
+            return
+        shared = len(outputs) > 1
+        for preset, output in outputs:
+            self.executor.submit(self._encode, job, resized, preset, output, metadata, shared)
+
+    def _encode(self, job, image, preset, output, metadata, shared=False):
+        if job.cancelled.is_set():
+            return job._complete()
+        if shared:
+            # Image.save() keeps the encoder options on the image object,
+            # so presets encoding one image in parallel need their own
+            image = image.copy()
+        # Write under a temporary name of our own so a cancelled or failed
+        # encode leaves nothing behind and concurrent jobs never share it
+        handle, partial = tempfile.mkstemp(suffix=".part", prefix=os.path.basename(output) + ".",
+                                           dir=job.directory)
+        os.close(handle)
+        try:
+            if preset.format == "JPEG" and image.mode not in ("RGB", "RGBX", "L", "CMYK"):
+                image = image.convert("RGB")
+            save_image(image, partial, preset.format, **preset.options(metadata))
+            if job.cancelled.is_set():
+                os.remove(partial)
+                return job._complete()
+            output = self._publish(partial, output, job.overwrite)
+        except Exception as e:
+            if os.path.exists(partial):
+                os.remove(partial)
+            return job._complete(error=e, preset=preset)
+        job._complete(output=output)
+
+    @staticmethod
+    def _publish(partial, output, overwrite):
+        """Move a finished file to output; returns the path it ended up at
+
+        Without overwrite, a file that appeared at output since the job
+        was planned (another export, say) is kept and the new one is
+        numbered: the hard link fails rather than replacing anything.
+        """
+        if overwrite:
+            os.replace(partial, output)
+            return output
+        root, extension = os.path.splitext(output)
+        candidate, number = output, 1
+        while True:
+            try:
+                os.link(partial, candidate)
+            except FileExistsError:
+                number += 1
+                candidate = f"{root}_{number}{extension}"
+                continue
+            except OSError:
+                # No hard links on this file system: check, then rename
+                candidate = _numbered(candidate, os.path.exists)
+                os.replace(partial, candidate)
+                return candidate
+            os.remove(partial)
+            return candidate
@@ -0,0 +1,244 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .graph import image_bytes
+from .loader import IMAGE_EXTENSIONS, open_image, open_preview
+
+THUMBNAIL_DIR = os.path.join(os.path.expanduser("~"), ".pixonic", "thumbnails")
+# Disk space the thumbnail cache may use before the least recently used
+# thumbnails are deleted
+THUMBNAIL_BYTES = 256 * 1024 * 1024
+
+
+def file_key(path):
+    """(path, mtime, size) identifying one version of a file"""
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def list_images(folder):
+    """Image files in folder, sorted by name"""
+    names = sorted(os.listdir(folder), key=str.lower)
+    return [os.path.join(folder, name) for name in names if name.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+class ThumbnailCache:
+    """Thumbnails kept on disk, keyed by path, mtime and size
+
+    A thumbnail is decoded once per version of a file (with JPEG draft
+    scaling) and stored as a small JPEG, so reopening a folder reads only
+    the thumbnail files. Reading a thumbnail touches its mtime; once the
+    directory holds more than max_bytes the least recently used files are
+    deleted until it is back under three quarters of that.
+    """
+
+    def __init__(self, directory=THUMBNAIL_DIR, size=160, max_pixels=None, max_bytes=THUMBNAIL_BYTES):
+        self.directory = directory
+        self.size = size
+        self.max_pixels = max_pixels
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # Bytes on disk, counted on the first write
+        self.disk_bytes = None
+
+    def path_for(self, key):
+        """Cache file for a file_key()"""
+        digest = hashlib.sha1(f"{key}|{self.size}".encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + ".jpg")
+
+    def get(self, path):
+        """Thumbnail of path, from disk when possible"""
+        cached = self.path_for(file_key(path))
+        if os.path.exists(cached):
+            try:
+                with open_image(cached, self.max_pixels) as thumb:
+                    thumb.load()
+                os.utime(cached)
+                return thumb
+            except OSError:
+                pass
+        thumb, _ = open_preview(path, (self.size, self.size), self.max_pixels)
+        if thumb.mode != "RGB":
+            thumb = thumb.convert("RGB")
+        try:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            # Write under a temporary name so a reader never sees half a file
+            partial = cached + f".{threading.get_ident()}.tmp"
+            thumb.save(partial, "JPEG", quality=85)
+            written = os.path.getsize(partial)
+            os.replace(partial, cached)
+        except OSError:
+            # A read-only cache only costs speed
+            return thumb
+        with self.lock:
+            if self.disk_bytes is None:
+                self.disk_bytes = sum(size for _, _, size in self._files())
+            else:
+                self.disk_bytes += written
+            if self.disk_bytes > self.max_bytes:
+                self.prune(self.max_bytes * 3 // 4)
+        return thumb
+
+    def _files(self):
+        """(mtime, path, size) of every cached thumbnail"""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime_ns, path, stat.st_size))
+        return files
+
+    def prune(self, target):
+        """Delete the least recently used thumbnails until at most target bytes remain"""
+        files = sorted(self._files())
+        total = sum(size for _, _, size in files)
+        for _, path, size in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self.disk_bytes = total
+
+
+class Filmstrip:
+    """Step through the images of a folder with background prefetch
+
+    Previews are decoded at proxy resolution (bound) on a thread pool;
+    whenever the current image changes the next and previous prefetch
+    images on either side are queued, and decoded previews are kept in an
+    LRU cache limited to budget bytes, so stepping to a neighbour
+    normally finds its preview ready. max_pixels is passed to
+    open_preview() for the previews and default thumbnails.
+    """
+
+    def __init__(self, paths, bound=(800, 600), prefetch=2, workers=2,
+                 budget=256 * 1024 * 1024, thumbnails=None, max_pixels=None):
+        self.paths = list(paths)
+        self.bound = bound
+        self.prefetch = prefetch
+        self.budget = budget
+        self.max_pixels = max_pixels
+        self.thumbnails = thumbnails or ThumbnailCache(max_pixels=max_pixels)
+        self.index = 0
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pixonic-prefetch")
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "waits": 0, "decoded": 0, "evicted": 0}
+
+    @classmethod
+    def from_folder(cls, folder, **kwargs):
+        return cls(list_images(folder), **kwargs)
+
+    def __len__(self):
+        return len(self.paths)
+
+    @property
+    def path(self):
+        return self.paths[self.index]
+
+    def set_bound(self, bound):
+        """Decode future previews for a new canvas size"""
+        if bound != self.bound:
+            self.bound = bound
+            with self.lock:
+                self.cache.clear()
+                self.cache_bytes = 0
+
+    def go(self, index):
+        """Make index current; returns (path, preview, full_size)
+
+        Blocks only if the preview has not been prefetched yet.
+        """
+        self.index = max(0, min(index, len(self.paths) - 1))
+        path = self.path
+        preview, full_size = self._get(path)
+        self._prefetch()
+        return path, preview, full_size
+
+    def next(self):
+        return self.go(self.index + 1)
+
+    def previous(self):
+        return self.go(self.index - 1)
+
+    def thumbnail(self, index):
+        """Future for the thumbnail of the image at index"""
+        return self.executor.submit(self.thumbnails.get, self.paths[index])
+
+    def close(self):
+        """Stop prefetching"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _key(self, path):
+        return file_key(path) + (self.bound,)
+
+    def _get(self, path):
+        """Decoded (preview, full_size) for path, from cache, queue or decoding now"""
+        key = self._key(path)
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                self.cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+            future = self.pending.get(key)
+        if future is not None:
+            self.stats["waits"] += 1
+            return future.result()
+        return self._decode(path, key)
+
+    def _decode(self, path, key):
+        """Decode a preview and cache it"""
+        try:
+            entry = open_preview(path, key[-1], self.max_pixels)
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+        with self.lock:
+            self.stats["decoded"] += 1
+            if key not in self.cache:
+                self.cache[key] = entry
+                self.cache_bytes += image_bytes(entry[0])
+                while self.cache_bytes > self.budget and len(self.cache) > 1:
+                    _, (old, _) = self.cache.popitem(last=False)
+                    self.cache_bytes -= image_bytes(old)
+                    self.stats["evicted"] += 1
+        return entry
+
+    def _prefetch(self):
+        """Queue decodes of the neighbours, nearest first"""
+        wanted = []
+        for distance in range(1, self.prefetch + 1):
+            for index in (self.index + distance, self.index - distance):
+                if 0 <= index < len(self.paths):
+                    wanted.append(self.paths[index])
+        # Stat outside the lock; files deleted since listing are skipped
+        keys = []
+        for path in wanted:
+            try:
+                keys.append((path, self._key(path)))
+            except OSError:
+                continue
+        keep = {key for _, key in keys}
+        with self.lock:
+            # Drop queued work that is no longer near the current image
+            for key, future in list(self.pending.items()):
+                if key not in keep and future.cancel():
+                    del self.pending[key]
+        for path, key in keys:
+            with self.lock:
+                if key in self.cache or key in self.pending:
+                    continue
+                self.pending[key] = self.executor.submit(self._decode, path, key)
@@ -0,0 +1,149 @@
+import math
+
+import numpy as np
+from PIL import Image
+
+# The eight lossless orientations, as (transpose method, matrix from the
+# transposed image's coordinates back to those of an original of size w x h)
+ORIENTATIONS = (
+    (None, lambda w, h: ((1, 0, 0), (0, 1, 0))),
+    (Image.FLIP_LEFT_RIGHT, lambda w, h: ((-1, 0, w), (0, 1, 0))),
+    (Image.FLIP_TOP_BOTTOM, lambda w, h: ((1, 0, 0), (0, -1, h))),
+    (Image.ROTATE_180, lambda w, h: ((-1, 0, w), (0, -1, h))),
+    (Image.ROTATE_90, lambda w, h: ((0, -1, w), (1, 0, 0))),
+    (Image.ROTATE_270, lambda w, h: ((0, 1, 0), (-1, 0, h))),
+    (Image.TRANSPOSE, lambda w, h: ((0, 1, 0), (1, 0, 0))),
+    (Image.TRANSVERSE, lambda w, h: ((0, -1, w), (-1, 0, h))),
+)
+
+EPSILON = 1e-9
+
+
+def matrix(rows):
+    """3x3 affine matrix from its top two rows"""
+    return np.array(list(rows) + [(0, 0, 1)], dtype=np.float64)
+
+
+def rotation(size, degrees):
+    """Output-to-input matrix and output size of image.rotate(degrees, expand=True)
+
+    Mirrors Pillow's own construction so the bounding box matches.
+    """
+    w, h = size
+    angle = -math.radians(degrees)
+    cos, sin = round(math.cos(angle), 15), round(math.sin(angle), 15)
+    m = [cos, sin, 0.0, -sin, cos, 0.0]
+
+    def apply(x, y):
+        return m[0] * x + m[1] * y + m[2], m[3] * x + m[4] * y + m[5]
+
+    m[2], m[5] = apply(-w / 2, -h / 2)
+    m[2] += w / 2
+    m[5] += h / 2
+    corners = [apply(x, y) for x, y in ((0, 0), (w, 0), (w, h), (0, h))]
+    xs, ys = [c[0] for c in corners], [c[1] for c in corners]
+    nw = math.ceil(max(xs)) - math.floor(min(xs))
+    nh = math.ceil(max(ys)) - math.floor(min(ys))
+    m[2], m[5] = apply(-(nw - w) / 2, -(nh - h) / 2)
+    return matrix((m[0:3], m[3:6])), (nw, nh)
+
+
+def flip(size, direction):
+    """Output-to-input matrix and size of a horizontal or vertical flip"""
+    w, h = size
+    if direction == "horizontal":
+        return matrix(((-1, 0, w), (0, 1, 0))), size
+    return matrix(((1, 0, 0), (0, -1, h))), size
+
+
+def crop(size, box):
+    """Output-to-input matrix and size of a pixel crop box"""
+    x1, y1, x2, y2 = box
+    return matrix(((1, 0, x1), (0, 1, y1))), (x2 - x1, y2 - y1)
+
+
+def resize(size, target):
+    """Output-to-input matrix and size of a resize to target"""
+    return matrix(((size[0] / target[0], 0, 0), (0, size[1] / target[1], 0))), tuple(target)
+
+
+def compose(steps, size):
+    """Fold steps into one output-to-input matrix and the final size
+
+    Each step is a callable taking the current size and returning the
+    step's (matrix, output size), all in full-resolution pixels.
+    """
+    total = np.identity(3)
+    for step in steps:
+        m, size = step(size)
+        total = total @ m
+    return total, size
+
+
+def _axis_aligned(m, size):
+    """Split m into a lossless transpose plus a positive scale and offset
+
+    Returns (method, matrix) with matrix diagonal and positive, or None if
+    m rotates by something other than a multiple of 90 degrees.
+    """
+    for method, orientation in ORIENTATIONS:
+        rest = np.linalg.inv(matrix(orientation(*size))) @ m
+        if abs(rest[0, 1]) < EPSILON and abs(rest[1, 0]) < EPSILON \
+                and rest[0, 0] > EPSILON and rest[1, 1] > EPSILON:
+            return method, rest
+    return None
+
+
+def _is_integer(value):
+    return abs(value - round(value)) < EPSILON
+
+
+def transform(image, m, size, resample=Image.BICUBIC):
+    """Render image through the output-to-input matrix m at size in one pass
+
+    Rotations by multiples of 90 degrees and flips are done with lossless
+    transposes, after which a crop is a copy and a crop plus resize is a
+    single Lanczos resize of the crop box. Anything else is one affine
+    resample; when it shrinks the image by more than 2x the source is
+    box-reduced first so the bicubic kernel does not alias.
+    """
+    size = (max(1, int(size[0])), max(1, int(size[1])))
+    split = _axis_aligned(m, image.size)
+    if split is not None:
+        method, rest = split
+        source = image if method is None else image.transpose(method)
+        sx, sy = rest[0, 0], rest[1, 1]
+        box = (rest[0, 2], rest[1, 2], rest[0, 2] + sx * size[0], rest[1, 2] + sy * size[1])
+        if abs(sx - 1) < EPSILON and abs(sy - 1) < EPSILON and all(_is_integer(v) for v in box):
+            box = tuple(int(round(v)) for v in box)
+            if box == (0, 0) + source.size:
+                return source if method is not None else source.copy()
+            return source.crop(box)
+        inside = box[0] > -EPSILON and box[1] > -EPSILON \
+            and box[2] < source.width + EPSILON and box[3] < source.height + EPSILON
+        if inside:
+            box = (max(0.0, box[0]), max(0.0, box[1]),
+                   min(float(source.width), box[2]), min(float(source.height), box[3]))
+            return source.resize(size, Image.LANCZOS, box=box)
+
+    factor = int(math.sqrt(abs(np.linalg.det(m[:2, :2]))))
+    if factor >= 2:
+        image = image.reduce(factor)
+        m = matrix(((1 / factor, 0, 0), (0, 1 / factor, 0))) @ m
+    data = tuple(m[0]) + tuple(m[1])
+    return image.transform(size, Image.AFFINE, data, resample)
+
+
+def scaled(m, full_size, image_size, out_full_size):
+    """Adapt a full-resolution matrix to an image at a different scale
+
+    Returns the matrix for image pixels and the output size at the same
+    scale as image.
+    """
+    sx = image_size[0] / full_size[0]
+    sy = image_size[1] / full_size[1]
+    out = (max(1, int(round(out_full_size[0] * sx))), max(1, int(round(out_full_size[1] * sy))))
+    ox = out_full_size[0] / out[0]
+    oy = out_full_size[1] / out[1]
+    m = matrix(((sx, 0, 0), (0, sy, 0))) @ m @ matrix(((ox, 0, 0), (0, oy, 0)))
+    return m, out
@@ -0,0 +1,160 @@
+import hashlib
+import itertools
+from collections import OrderedDict
+
+from . import geometry
+from .operations import apply_geometry, apply_operation, chain_affine, is_geometric, output_size
+
+
+def image_bytes(image):
+    """Approximate memory held by an image"""
+    return image.width * image.height * len(image.getbands())
+
+
+class Node:
+    """One operation in the edit graph"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, op, params):
+        self.id = next(self._ids)
+        self.op = op
+        self.params = dict(params)
+
+    def key(self, input_key):
+        """Cache key for this node's output given its input's key"""
+        params = repr(sorted(self.params.items()))
+        return hashlib.sha1(f"{input_key}|{self.op}|{params}".encode()).hexdigest()
+
+
+class EditGraph:
+    """Non-destructive chain of operations with cached node outputs
+
+    Each node output is cached under a hash of its input's key, its
+    operation and its parameters. Changing a node's parameters changes
+    its key and the keys of everything after it, so re-evaluation reuses
+    every cached output upstream and recomputes only the nodes downstream.
+    Consecutive geometric nodes (rotate, flip, crop, resize) are evaluated
+    together as one resample, and only the output of the whole run is
+    cached. Cached outputs are evicted least recently used first once
+    they exceed budget bytes. With an ImageStore, large outputs are moved
+    into memory-mapped scratch files as they are produced.
+    """
+
+    def __init__(self, budget=512 * 1024 * 1024, store=None):
+        self.nodes = []
+        self.budget = budget
+        self.store = store
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.stats = {"hits": 0, "computed": 0, "evicted": 0}
+
+    def add(self, op, **params):
+        """Append an operation and return its node"""
+        node = Node(op, params)
+        self.nodes.append(node)
+        return node
+
+    def update(self, node, **params):
+        """Change some of a node's parameters"""
+        node.params.update(params)
+
+    def remove(self, node):
+        """Remove a node from the chain"""
+        self.nodes.remove(node)
+
+    def find(self, op):
+        """Last node running op, or None"""
+        for node in reversed(self.nodes):
+            if node.op == op:
+                return node
+        return None
+
+    def snapshot(self):
+        """Hashable description of the chain, without any pixels"""
+        return tuple((node.op, tuple(sorted(node.params.items()))) for node in self.nodes)
+
+    def restore(self, state):
+        """Rebuild the chain from snapshot(); cached outputs stay valid"""
+        self.nodes = [Node(op, dict(params)) for op, params in state]
+
+    def source_matrix(self, source_size, image_size=None):
+        """Matrix from pixels of the chain's output to fractions of the source
+
+        image_size is the size of the output image the pixels are in, which
+        may be a proxy; it defaults to the full-resolution output size.
+        """
+        m, out_size = chain_affine([(node.op, node.params) for node in self.nodes], source_size)
+        image_size = image_size or out_size
+        to_output = geometry.matrix(((out_size[0] / image_size[0], 0, 0),
+                                     (0, out_size[1] / image_size[1], 0)))
+        to_fractions = geometry.matrix(((1 / source_size[0], 0, 0), (0, 1 / source_size[1], 0)))
+        return to_fractions @ m @ to_output
+
+    def clear(self):
+        """Remove every node and drop the cache"""
+        self.nodes = []
+        self.cache.clear()
+        self.cache_bytes = 0
+
+    def evaluate(self, source, source_key, full_size=None):
+        """Run the chain on source and return (image, full_size)
+
+        source_key identifies the source pixels (proxies and the
+        full-resolution image need different keys). full_size is the
+        full-resolution size source stands for; it defaults to
+        source.size, and operations with pixel parameters are scaled by
+        the ratio between the two.
+        """
+        image, key = source, source_key
+        full_size = full_size or source.size
+        for run in self.runs():
+            for node in run:
+                key = node.key(key)
+            cached = self._lookup(key)
+            if cached is not None:
+                image, full_size = cached
+                continue
+            if is_geometric(run[0].op):
+                steps = [(node.op, node.params) for node in run]
+                image, full_size = apply_geometry(image, steps, full_size)
+            else:
+                node = run[0]
+                scale = image.width / full_size[0]
+                image = apply_operation(image, node.op, node.params, scale)
+                full_size = output_size(node.op, full_size, node.params)
+            if self.store is not None:
+                image = self.store.adopt(image)
+            self._store(key, image, full_size)
+        return image, full_size
+
+    def runs(self):
+        """Split the chain into runs of geometric nodes and single other nodes"""
+        runs = []
+        for node in self.nodes:
+            if runs and is_geometric(node.op) and is_geometric(runs[-1][-1].op):
+                runs[-1].append(node)
+            else:
+                runs.append([node])
+        return runs
+
+    def _lookup(self, key):
+        """Return a cached (image, full_size) and mark it recently used"""
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.cache.move_to_end(key)
+            self.stats["hits"] += 1
+        return entry
+
+    def _store(self, key, image, full_size):
+        """Cache a node output and evict old ones over budget"""
+        self.stats["computed"] += 1
+        size = image_bytes(image)
+        if size > self.budget:
+            return
+        self.cache[key] = (image, full_size)
+        self.cache_bytes += size
+        while self.cache_bytes > self.budget:
+            _, (old, _) = self.cache.popitem(last=False)
+            self.cache_bytes -= image_bytes(old)
+            self.stats["evicted"] += 1
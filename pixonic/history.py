@@ -0,0 +1,228 @@
+import abc
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+class Delta(abc.ABC):
+    """One undoable change
+
+    swap(target) exchanges the state stored in the delta with the state
+    of target and returns the (possibly new) target, so the same delta
+    undoes and then redoes a change. Deltas holding pixel or sample data
+    can spill it to disk and page it back in when swapped.
+    """
+
+    nbytes = 0
+    spilled = False
+
+    @abc.abstractmethod
+    def swap(self, target):
+        """Exchange the stored state with target's; returns the target"""
+
+    def spill(self, directory):
+        """Move the delta's data to a file in directory"""
+
+    def discard(self):
+        """Remove any spill file"""
+
+
+class ArrayDelta(Delta):
+    """Base for deltas that keep named NumPy arrays"""
+
+    def __init__(self):
+        self.arrays = {}
+        self.path = None
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.arrays.values())
+
+    @property
+    def spilled(self):
+        return self.path is not None
+
+    def spill(self, directory):
+        if self.path is None and self.arrays:
+            fd, self.path = tempfile.mkstemp(suffix=".npz", dir=directory)
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **self.arrays)
+            self.arrays = {}
+
+    def load(self):
+        """Page spilled arrays back into memory"""
+        if self.path is not None:
+            with np.load(self.path) as data:
+                self.arrays = {name: data[name] for name in data.files}
+            self.discard()
+        return self.arrays
+
+    def discard(self):
+        if self.path is not None:
+            os.remove(self.path)
+            self.path = None
+
+
+class StateDelta(Delta):
+    """Swap a small state object using target.snapshot()/restore()
+
+    Used for the image edit graph, whose whole state is a few operations
+    and parameters, so no pixels need to be stored.
+    """
+
+    def __init__(self, state):
+        self.state = state
+
+    def swap(self, target):
+        current = target.snapshot()
+        target.restore(self.state)
+        self.state = current
+        return target
+
+
+class BufferDelta(ArrayDelta):
+    """Keep a whole buffer that an edit replaced
+
+    Edits that build a new array leave the old one unreferenced, so it is
+    kept as is rather than copied.
+    """
+
+    def __init__(self, buffer):
+        super().__init__()
+        self.arrays["buffer"] = buffer
+
+    def swap(self, target):
+        previous = self.load()["buffer"]
+        self.arrays["buffer"] = target
+        return previous
+
+
+class SampleDelta(ArrayDelta):
+    """Keep only the samples in [start, end) that an in-place edit changes"""
+
+    def __init__(self, buffer, start, end):
+        super().__init__()
+        self.start = start
+        self.end = end
+        self.arrays["samples"] = buffer[start:end].copy()
+
+    def swap(self, target):
+        samples = self.load()["samples"]
+        end = self.start + len(samples)
+        current = target[self.start:end].copy()
+        target[self.start:end] = samples
+        self.arrays["samples"] = current
+        return target
+
+
+class MaskDelta(ArrayDelta):
+    """The tiles of a sparse TileMask from before an edit
+
+    Holds only the tiles recorded between mask.begin() and mask.end(),
+    so a brush stroke costs memory in proportion to the area it painted.
+    The mask is swapped in place; the history target is passed through.
+    """
+
+    def __init__(self, mask, tiles):
+        super().__init__()
+        self.mask = mask
+        for (col, row), block in tiles.items():
+            self.arrays[f"{row}_{col}"] = self._pack(block)
+
+    @staticmethod
+    def _pack(block):
+        # Uniform tiles are a single value; keep them as one-element arrays
+        return block if isinstance(block, np.ndarray) and block.ndim == 2 else np.full(1, block, np.uint8)
+
+    def swap(self, target):
+        tiles = self.load()
+        swapped = {}
+        for name, block in tiles.items():
+            row, col = (int(v) for v in name.split("_"))
+            key = (col, row)
+            swapped[name] = self._pack(self.mask.tiles.get(key, 0))
+            self.mask.put(key, block if block.ndim == 2 else int(block[0]))
+        self.arrays = swapped
+        return target
+
+
+class History:
+    """Undo/redo stacks with a memory cap
+
+    Once the deltas held in memory exceed max_bytes the oldest ones are
+    spilled to a scratch directory; entries beyond max_entries are
+    forgotten.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, max_entries=100):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.undo_stack = []
+        self.redo_stack = []
+        self.spill_dir = None
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def push(self, delta):
+        """Record a new change, dropping anything that could be redone"""
+        self.undo_stack.append(delta)
+        for old in self.redo_stack:
+            old.discard()
+        self.redo_stack = []
+        while len(self.undo_stack) > self.max_entries:
+            self.undo_stack.pop(0).discard()
+        self._enforce_cap()
+
+    def undo(self, target):
+        """Undo the last change to target and return the new target"""
+        delta = self.undo_stack.pop()
+        target = delta.swap(target)
+        self.redo_stack.append(delta)
+        self._enforce_cap()
+        return target
+
+    def redo(self, target):
+        """Redo the last undone change to target and return the new target"""
+        delta = self.redo_stack.pop()
+        target = delta.swap(target)
+        self.undo_stack.append(delta)
+        self._enforce_cap()
+        return target
+
+    def clear(self):
+        """Forget every change and remove spill files"""
+        for delta in self.undo_stack + self.redo_stack:
+            delta.discard()
+        self.undo_stack = []
+        self.redo_stack = []
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+
+    @property
+    def resident_bytes(self):
+        """Bytes held in memory by unspilled deltas"""
+        return sum(d.nbytes for d in self.undo_stack + self.redo_stack if not d.spilled)
+
+    def _enforce_cap(self):
+        """Spill the deltas furthest from the current state first"""
+        resident = self.resident_bytes
+        if resident <= self.max_bytes:
+            return
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="pixonic-history-")
+        candidates = self.undo_stack[:-1] + self.redo_stack[:-1]
+        for delta in candidates:
+            if resident <= self.max_bytes:
+                break
+            if not delta.spilled and delta.nbytes:
+                resident -= delta.nbytes
+                delta.spill(self.spill_dir)
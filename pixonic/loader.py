@@ -0,0 +1,126 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from .preview import fit_size
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+
+# EXIF orientations that swap width and height
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# Panoramas and scans legitimately pass Pillow's decompression bomb
+# limit (about 90 MP); files the user opens may be up to a gigapixel
+USER_MAX_PIXELS = 1024 * 1024 * 1024
+
+# Pillow only has a global limit, so every open here holds this lock
+# while it checks the header against the limit it asked for
+_limit_lock = threading.Lock()
+
+
+def open_image(path, max_pixels=None):
+    """Image.open() with the decompression bomb limit raised to max_pixels
+
+    Without max_pixels Pillow's own limit applies. The limit is only
+    raised for the header check of this file; nothing else in the
+    process sees it.
+    """
+    with _limit_lock:
+        saved = Image.MAX_IMAGE_PIXELS
+        if max_pixels is not None and saved is not None:
+            Image.MAX_IMAGE_PIXELS = max(saved, max_pixels)
+        try:
+            return Image.open(path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = saved
+
+
+def oriented_size(image):
+    """Size of an opened image after EXIF orientation, without decoding it"""
+    orientation = image.getexif().get(0x0112, 1)
+    if orientation in TRANSPOSED_ORIENTATIONS:
+        return image.height, image.width
+    return image.size
+
+
+def open_preview(path, bound, max_pixels=None):
+    """Decode a reduced preview of path for a canvas of size bound
+
+    JPEGs are decoded with draft(), which lets libjpeg scale by 1/2, 1/4
+    or 1/8 during decoding. Returns (preview, full_size) where full_size
+    is the size of the fully decoded image after EXIF orientation.
+    max_pixels is passed to open_image().
+    """
+    image = open_image(path, max_pixels)
+    full_size = oriented_size(image)
+    # Ask for the larger side in both directions, orientation may swap them
+    side = max(bound)
+    image.draft(image.mode, (side, side))
+    image = ImageOps.exif_transpose(image)
+    if image.width > bound[0] or image.height > bound[1]:
+        image = image.resize(fit_size(image.size, bound), Image.LANCZOS, reducing_gap=2.0)
+    return image, full_size
+
+
+def open_full(path, max_pixels=None):
+    """Decode path at full resolution with EXIF orientation applied"""
+    image = open_image(path, max_pixels)
+    image.load()
+    return ImageOps.exif_transpose(image)
+
+
+class ImageLoader:
+    """Decode full-resolution images on a background thread
+
+    load() returns at once; when the decode finishes on_loaded(image) is
+    called on the Tk thread. Starting a new load makes any earlier one
+    stale, and result() blocks until the current decode is done. opener
+    does the decoding, for example ImageStore.open.
+    """
+
+    def __init__(self, widget, on_loaded, on_error=None, poll_interval=50, opener=open_full):
+        self.widget = widget
+        self.on_loaded = on_loaded
+        self.on_error = on_error
+        self.poll_interval = poll_interval
+        self.opener = opener
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
+
+    @property
+    def pending(self):
+        """True while a decode has not been delivered yet"""
+        return self.future is not None
+
+    def load(self, path):
+        """Start decoding path at full resolution"""
+        if self.future is not None:
+            # Superseded; skip it if it has not started yet
+            self.future.cancel()
+        self.future = self.executor.submit(self.opener, path)
+        self.widget.after(self.poll_interval, self._poll, self.future)
+
+    def result(self):
+        """Wait for the current decode and deliver it now"""
+        if self.future is not None:
+            self._deliver(self.future)
+
+    def _poll(self, future):
+        """Deliver a finished decode on the Tk thread"""
+        if future is not self.future:
+            return
+        if future.done():
+            self._deliver(future)
+        else:
+            self.widget.after(self.poll_interval, self._poll, future)
+
+    def _deliver(self, future):
+        self.future = None
+        try:
+            image = future.result()
+        except Exception as e:
+            if self.on_error:
+                self.on_error(e)
+            return
+        self.on_loaded(image)
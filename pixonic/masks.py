@@ -0,0 +1,422 @@
+import itertools
+import math
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from . import geometry
+from .adjustments import AdjustmentEngine, DEFAULT_ADJUSTMENTS
+
+# Side of a mask tile, in mask pixels
+MASK_TILE = 128
+
+# Longest side of a mask; masks cover the source image and are resampled
+# through the edit's geometry to the image they are applied to
+MASK_SIZE = 2048
+
+# Adjustments a local layer can make, all of them colour stages
+LOCAL_ADJUSTMENTS = ("brightness", "contrast", "saturation", "vibrance", "red", "green", "blue")
+
+_versions = itertools.count(1)
+
+
+def mask_size(image_size, longest=MASK_SIZE):
+    """Size of a mask for an image of image_size"""
+    width, height = image_size
+    ratio = min(1.0, longest / max(width, height))
+    return (max(1, round(width * ratio)), max(1, round(height * ratio)))
+
+
+def _smooth(t):
+    t = np.clip(t, 0, 1)
+    return t * t * (3 - 2 * t)
+
+
+class TileMask:
+    """Sparse 8-bit coverage mask
+
+    The mask is split into tile x tile blocks and a block only exists
+    where something was painted: missing blocks are 0, and blocks a
+    gradient fills uniformly are stored as a single value. Every change
+    gives the block a new version number, so compositors can tell which
+    blocks changed since they last looked, and begin()/end() record the
+    previous contents of the blocks an edit touches, for undo.
+    """
+
+    def __init__(self, size, tile=MASK_TILE):
+        self.size = size
+        self.tile = tile
+        self.tiles = {}
+        self.versions = {}
+        self.recording = None
+
+    @property
+    def grid(self):
+        """(columns, rows) of tiles"""
+        return (math.ceil(self.size[0] / self.tile), math.ceil(self.size[1] / self.tile))
+
+    def tile_box(self, key):
+        """(left, top, right, bottom) of a tile in mask pixels"""
+        col, row = key
+        t = self.tile
+        return (col * t, row * t, min(self.size[0], (col + 1) * t), min(self.size[1], (row + 1) * t))
+
+    def keys_in(self, box):
+        """Keys of the tiles overlapping box (mask pixels)"""
+        cols, rows = self.grid
+        t = self.tile
+        c0, r0 = max(0, int(box[0] // t)), max(0, int(box[1] // t))
+        c1, r1 = min(cols, math.ceil(box[2] / t)), min(rows, math.ceil(box[3] / t))
+        return [(c, r) for r in range(r0, r1) for c in range(c0, c1)]
+
+    @property
+    def is_empty(self):
+        return not any(isinstance(block, np.ndarray) or block for block in self.tiles.values())
+
+    def begin(self):
+        """Start recording the blocks an edit changes"""
+        self.recording = {}
+
+    def end(self):
+        """Stop recording; returns {key: previous block} for the blocks changed"""
+        recorded, self.recording = self.recording or {}, None
+        return recorded
+
+    def put(self, key, block):
+        """Replace a block with an array or a constant value"""
+        old = self.tiles.get(key, 0)
+        if not isinstance(block, np.ndarray) and not isinstance(old, np.ndarray) and block == old:
+            return
+        self._record(key, old)
+        if isinstance(block, np.ndarray) or block:
+            self.tiles[key] = block
+        else:
+            self.tiles.pop(key, None)
+        self.versions[key] = next(_versions)
+
+    def _record(self, key, old):
+        if self.recording is not None and key not in self.recording:
+            self.recording[key] = old.copy() if isinstance(old, np.ndarray) else old
+
+    def _writable(self, key):
+        """The block at key as an array that may be modified in place"""
+        block = self.tiles.get(key, 0)
+        self._record(key, block)
+        if not isinstance(block, np.ndarray):
+            left, top, right, bottom = self.tile_box(key)
+            block = np.full((bottom - top, right - left), block, dtype=np.uint8)
+            self.tiles[key] = block
+        self.versions[key] = next(_versions)
+        return block
+
+    def dab(self, x, y, radius, hardness=0.5, opacity=1.0, erase=False):
+        """Paint (or erase) one round brush dab; returns the keys touched
+
+        The dab is opaque out to hardness * radius and fades to nothing at
+        radius. Only the tiles under the dab are visited.
+        """
+        radius = max(0.5, radius)
+        soft = max(1e-3, radius * (1 - hardness))
+        touched = self.keys_in((x - radius, y - radius, x + radius + 1, y + radius + 1))
+        for key in touched:
+            left, top, right, bottom = self.tile_box(key)
+            x0, y0 = max(left, int(x - radius)), max(top, int(y - radius))
+            x1, y1 = min(right, int(x + radius) + 1), min(bottom, int(y + radius) + 1)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            yy, xx = np.ogrid[y0:y1, x0:x1]
+            distance = np.sqrt((xx + 0.5 - x) ** 2 + (yy + 0.5 - y) ** 2)
+            value = (_smooth((radius - distance) / soft) * (255 * opacity)).astype(np.uint8)
+            block = self._writable(key)[y0 - top:y1 - top, x0 - left:x1 - left]
+            if erase:
+                np.minimum(block, 255 - value, out=block)
+            else:
+                np.maximum(block, value, out=block)
+        return touched
+
+    def stroke(self, points, radius, hardness=0.5, opacity=1.0, erase=False, spacing=0.25):
+        """Paint dabs every spacing * radius along a polyline; returns the keys touched"""
+        step = max(1.0, spacing * radius)
+        touched = set()
+        (x, y), rest = points[0], points[1:]
+        touched.update(self.dab(x, y, radius, hardness, opacity, erase))
+        for nx, ny in rest:
+            count = int(math.hypot(nx - x, ny - y) // step)
+            for i in range(1, count + 1):
+                t = i / count
+                touched.update(self.dab(x + (nx - x) * t, y + (ny - y) * t, radius,
+                                        hardness, opacity, erase))
+            x, y = nx, ny
+        return touched
+
+    def gradient(self, start, end):
+        """Fill with a linear gradient, full at start and fading out by end
+
+        Tiles entirely before start or past end become constants, so only
+        the band between the two points holds pixels.
+        """
+        (sx, sy), (ex, ey) = start, end
+        dx, dy = ex - sx, ey - sy
+        length = dx * dx + dy * dy or 1.0
+        cols, rows = self.grid
+        for row in range(rows):
+            for col in range(cols):
+                key = (col, row)
+                left, top, right, bottom = self.tile_box(key)
+                corners = [((cx - sx) * dx + (cy - sy) * dy) / length
+                           for cx in (left, right) for cy in (top, bottom)]
+                if max(corners) <= 0:
+                    self.put(key, 255)
+                elif min(corners) >= 1:
+                    self.put(key, 0)
+                else:
+                    yy, xx = np.ogrid[top:bottom, left:right]
+                    t = ((xx + 0.5 - sx) * dx + (yy + 0.5 - sy) * dy) / length
+                    self.put(key, ((1 - _smooth(t)) * 255).astype(np.uint8))
+
+    def clear(self):
+        for key in list(self.tiles):
+            self.put(key, 0)
+
+    def region(self, box, size):
+        """Mask over box (mask pixels) resampled to size, or None if it is empty there"""
+        keys = self.keys_in(box)
+        if not keys:
+            return None
+        blocks = [self.tiles.get(key, 0) for key in keys]
+        if not any(isinstance(block, np.ndarray) for block in blocks) and len(set(blocks)) == 1:
+            return Image.new("L", size, blocks[0]) if blocks[0] else None
+        t = self.tile
+        c0, r0 = keys[0]
+        c1, r1 = keys[-1]
+        array = np.zeros(((r1 - r0 + 1) * t, (c1 - c0 + 1) * t), dtype=np.uint8)
+        for (col, row), block in zip(keys, blocks):
+            left, top, right, bottom = self.tile_box((col, row))
+            y, x = (row - r0) * t, (col - c0) * t
+            array[y:y + bottom - top, x:x + right - left] = block
+        local = (box[0] - c0 * t, box[1] - r0 * t, box[2] - c0 * t, box[3] - r0 * t)
+        return Image.fromarray(array).resize(size, Image.BILINEAR, box=local)
+
+    def sample(self, m, size):
+        """Mask through the matrix m from output to mask pixels, at size
+
+        Returns None if the mask is empty there. Scales and offsets are
+        region(); rotations and flips read the bounding box of the output
+        in the mask and resample it through m, outside the mask being 0.
+        """
+        w, h = size
+        if abs(m[0, 1]) < geometry.EPSILON and abs(m[1, 0]) < geometry.EPSILON \
+                and m[0, 0] > 0 and m[1, 1] > 0:
+            return self.region((m[0, 2], m[1, 2], m[0, 2] + m[0, 0] * w, m[1, 2] + m[1, 1] * h), size)
+        corners = [m @ (x, y, 1) for x in (0, w) for y in (0, h)]
+        box = (max(0, math.floor(min(c[0] for c in corners)) - 1),
+               max(0, math.floor(min(c[1] for c in corners)) - 1),
+               min(self.size[0], math.ceil(max(c[0] for c in corners)) + 1),
+               min(self.size[1], math.ceil(max(c[1] for c in corners)) + 1))
+        if box[0] >= box[2] or box[1] >= box[3]:
+            return None
+        region = self.region(box, (box[2] - box[0], box[3] - box[1]))
+        if region is None:
+            return None
+        m = geometry.matrix(((1, 0, -box[0]), (0, 1, -box[1]))) @ m
+        return region.transform(size, Image.AFFINE, tuple(m[0]) + tuple(m[1]), Image.BILINEAR)
+
+    def copy(self):
+        """Independent copy, for rendering while the mask is still being painted"""
+        mask = TileMask(self.size, self.tile)
+        mask.tiles = {key: block.copy() if isinstance(block, np.ndarray) else block
+                      for key, block in self.tiles.items()}
+        mask.versions = dict(self.versions)
+        return mask
+
+
+class LocalLayer:
+    """Colour adjustments limited to a mask"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name, mask, params=None):
+        self.id = next(self._ids)
+        self.name = name
+        self.mask = mask
+        self.params = {key: DEFAULT_ADJUSTMENTS[key] for key in LOCAL_ADJUSTMENTS}
+        self.params.update(params or {})
+
+    @property
+    def is_neutral(self):
+        return all(self.params[key] == DEFAULT_ADJUSTMENTS[key] for key in LOCAL_ADJUSTMENTS)
+
+
+class LocalAdjustments:
+    """The stack of local layers of an edit session
+
+    snapshot()/restore() cover which layers exist and their parameters,
+    and are part of the session's snapshot, so a StateDelta undoes adding,
+    removing or adjusting a layer; mask pixels are undone separately with
+    a MaskDelta. Removed layers are remembered so redo can bring them back.
+    """
+
+    def __init__(self):
+        self.layers = []
+        self.known = {}
+
+    def __bool__(self):
+        return bool(self.layers)
+
+    def add(self, name, size, params=None):
+        """Add a layer with an empty mask for a source image of size"""
+        layer = LocalLayer(name, TileMask(mask_size(size)), params)
+        self.layers.append(layer)
+        self.known[layer.id] = layer
+        return layer
+
+    def remove(self, layer):
+        self.layers.remove(layer)
+
+    def find(self, layer_id):
+        return next((layer for layer in self.layers if layer.id == layer_id), None)
+
+    def snapshot(self):
+        return tuple((layer.id, tuple(sorted(layer.params.items()))) for layer in self.layers)
+
+    def restore(self, state):
+        self.layers = []
+        for layer_id, params in state:
+            layer = self.known[layer_id]
+            layer.params = dict(params)
+            self.layers.append(layer)
+
+    def clear(self):
+        self.layers = []
+
+    def copy(self):
+        """Frozen copy of the layers and masks, safe to render on another thread"""
+        local = LocalAdjustments()
+        for layer in self.layers:
+            clone = LocalLayer(layer.name, layer.mask.copy(), layer.params)
+            local.layers.append(clone)
+            local.known[clone.id] = clone
+        return local
+
+
+class LocalCompositor:
+    """Apply LocalAdjustments to images, recompositing only what changed
+
+    The output is built in cell x cell blocks. When the same base image
+    is passed again only the cells under mask tiles whose version changed,
+    or under layers whose parameters changed, are recomposited, so a
+    brush stroke costs time in proportion to the area it covers. The
+    dirty cells are pasted into a private copy of the base that is kept
+    between calls, so the output is the same image changed in place;
+    version goes up with every change, for display caches to compare.
+
+    Masks cover the source image, and apply() is given the matrix from
+    the pixels of the edited image to fractions of the source, so masks
+    stay on what was painted through rotations, crops and resizes.
+    """
+
+    def __init__(self, local, cell=64):
+        self.local = local
+        self.cell = cell
+        self.engine = AdjustmentEngine()
+        self.base = None
+        self.matrix = None
+        self.output = None
+        self.version = 0
+        self.seen = {}
+        self.filters = {}
+        self.stats = {"cells": 0}
+
+    def apply(self, image, matrix=None):
+        """image with the local layers applied
+
+        matrix maps pixels of image to fractions of the source; it
+        defaults to image being the source itself.
+        """
+        layers = self.local.layers
+        if not layers and not self.seen:
+            return image
+        if matrix is None:
+            matrix = geometry.matrix(((1 / image.width, 0, 0), (0, 1 / image.height, 0)))
+        if image is not self.base or not np.array_equal(matrix, self.matrix):
+            self.engine.set_source(image)
+            self.base = image
+            self.matrix = matrix
+            self.output = None
+            self.seen = {}
+            self.filters = {}
+        current = {layer.id: (layer, tuple(sorted(layer.params.items())), dict(layer.mask.versions))
+                   for layer in layers}
+        dirty = self._dirty_cells(current, image.size)
+        self.seen = current
+        if dirty:
+            if self.output is None:
+                # The base may be shared or memory-mapped, never paint into it
+                self.output = self.engine.source.copy()
+            for cell in dirty:
+                self._composite(self.output, cell, layers)
+            self.version += 1
+            self.stats["cells"] += len(dirty)
+        return image if self.output is None else self.output
+
+    def _dirty_cells(self, current, size):
+        """Output cells under mask tiles that changed"""
+        cells = set()
+        width, height = size
+        for layer_id in set(current) | set(self.seen):
+            old, new = self.seen.get(layer_id), current.get(layer_id)
+            layer = (new or old)[0]
+            if old is None or new is None or old[1] != new[1]:
+                keys = set(old[2] if old else ()) | set(new[2] if new else ())
+            else:
+                keys = {key for key, version in new[2].items() if old[2].get(key) != version}
+            mask = layer.mask
+            to_image = np.linalg.inv(self._mask_matrix(mask))
+            for key in keys:
+                left, top, right, bottom = mask.tile_box(key)
+                # Bilinear sampling reaches one mask pixel past the tile, and
+                # output pixels touching that area round out by one more
+                corners = [to_image @ (x, y, 1)
+                           for x in (left - 1, right + 1) for y in (top - 1, bottom + 1)]
+                xs, ys = [c[0] for c in corners], [c[1] for c in corners]
+                box = (min(xs) - 1, min(ys) - 1, max(xs) + 1, max(ys) + 1)
+                for row in range(max(0, int(box[1] // self.cell)),
+                                 min(math.ceil(height / self.cell), math.ceil(box[3] / self.cell))):
+                    for col in range(max(0, int(box[0] // self.cell)),
+                                     min(math.ceil(width / self.cell), math.ceil(box[2] / self.cell))):
+                        cells.add((col, row))
+        return cells
+
+    def _mask_matrix(self, mask):
+        """Matrix from pixels of the base to pixels of mask"""
+        return geometry.matrix(((mask.size[0], 0, 0), (0, mask.size[1], 0))) @ self.matrix
+
+    def _filter(self, layer):
+        params = tuple(sorted(layer.params.items()))
+        cached = self.filters.get(layer.id)
+        if cached is None or cached[0] != params:
+            cached = (params, self.engine.colour_filter(dict(DEFAULT_ADJUSTMENTS, **layer.params)))
+            self.filters[layer.id] = cached
+        return cached[1]
+
+    def _composite(self, output, cell, layers):
+        """Recompute one output cell from the base"""
+        width, height = output.size
+        col, row = cell
+        box = (col * self.cell, row * self.cell,
+               min(width, (col + 1) * self.cell), min(height, (row + 1) * self.cell))
+        region = self.engine.source.crop(box)
+        for layer in layers:
+            if layer.is_neutral:
+                continue
+            m = self._mask_matrix(layer.mask) @ geometry.matrix(((1, 0, box[0]), (0, 1, box[1])))
+            coverage = layer.mask.sample(m, region.size)
+            if coverage is None:
+                continue
+            colour = self._filter(layer)
+            if isinstance(colour, ImageFilter.Color3DLUT):
+                adjusted = region.filter(colour)
+            else:
+                adjusted = region.point(colour)
+            region = Image.composite(adjusted, region, coverage)
+        output.paste(region, box[:2])
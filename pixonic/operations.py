@@ -0,0 +1,231 @@
+from functools import partial
+
+from PIL import ImageEnhance, ImageFilter
+
+from . import background, geometry, tiles
+from .color import STYLE_PRESETS, apply_color, cached_cube, style_transform
+from .detail import CLARITY_RADIUS, apply_detail
+from .parallel import parallel_filter
+
+# Registry of replayable image operations, keyed by name
+OPERATIONS = {}
+
+FILTERS = {
+    "Blur": ImageFilter.BLUR,
+    "Sharpen": ImageFilter.SHARPEN,
+    "Emboss": ImageFilter.EMBOSS,
+    "Contour": ImageFilter.CONTOUR,
+}
+
+# How Pillow's fixed-size kernels change with the size of a pixel.
+# Smoothing kernels become a Gaussian of their spread in full-resolution
+# pixels; difference kernels keep their shape with the differences scaled
+# by scale ** order, as a proxy pixel spans 1 / scale source pixels.
+KERNEL_SCALING = {
+    ImageFilter.BLUR: ("smooth", 1.66),
+    ImageFilter.SMOOTH_MORE: ("smooth", 0.86),
+    ImageFilter.SHARPEN: ("difference", 2),
+    ImageFilter.EMBOSS: ("difference", 1),
+    ImageFilter.CONTOUR: ("difference", 2),
+}
+
+
+def scaled_filter(image_filter, scale):
+    """A built-in kernel filter adapted to an image at scale of full resolution
+
+    At full resolution this is the filter itself. On a proxy the effect
+    matches the full-resolution result scaled down, instead of a kernel
+    that covers 1 / scale times as much of the picture.
+    """
+    if scale >= 1 or image_filter not in KERNEL_SCALING:
+        return image_filter
+    kind, amount = KERNEL_SCALING[image_filter]
+    if kind == "smooth":
+        return ImageFilter.GaussianBlur(amount * scale)
+    size, divisor, offset, weights = image_filter.filterargs
+    # The weights are their sum at the centre plus differences summing to 0
+    factor = scale ** amount
+    centre, total = len(weights) // 2, sum(weights)
+    weights = [w * factor + (total * (1 - factor) if i == centre else 0)
+               for i, w in enumerate(weights)]
+    return ImageFilter.Kernel(size, weights, divisor, offset)
+
+
+class Operation:
+    """A named image operation that can be replayed at any resolution
+
+    func(image, scale, **params) does the work. scale is the size of the
+    image being processed relative to the full-resolution image, so
+    operations with pixel-sized parameters can adapt them on a proxy.
+    size(size, **params) maps a full-resolution size to the output size.
+    Geometric operations also give affine(size, **params), returning their
+    output-to-input matrix and output size, so runs of them can be folded
+    into a single resample.
+    """
+
+    def __init__(self, name, func, size=None, affine=None):
+        self.name = name
+        self.func = func
+        self.affine = affine
+        if size is None and affine is not None:
+            size = lambda size, **params: affine(size, **params)[1]
+        self.size = size or (lambda size, **params: size)
+
+    def __call__(self, image, scale=1.0, **params):
+        return self.func(image, scale, **params)
+
+
+def operation(name, size=None, affine=None):
+    """Register func as the operation called name"""
+    def register(func):
+        OPERATIONS[name] = Operation(name, func, size, affine)
+        return func
+    return register
+
+
+def apply_operation(image, name, params, scale=1.0):
+    """Run a registered operation on image"""
+    return OPERATIONS[name](image, scale, **params)
+
+
+def output_size(name, size, params):
+    """Full-resolution size produced by an operation"""
+    return OPERATIONS[name].size(size, **params)
+
+
+def is_geometric(name):
+    """True if the operation only moves pixels and can be folded"""
+    return OPERATIONS[name].affine is not None
+
+
+def apply_geometry(image, steps, full_size):
+    """Run consecutive geometric operations as one resample
+
+    steps is a list of (name, params). The operations are composed into a
+    single matrix in full-resolution pixels and applied to image, which
+    may be a proxy of full_size. Returns (image, output full_size).
+    """
+    affines = [partial(OPERATIONS[name].affine, **params) for name, params in steps]
+    m, out_full_size = geometry.compose(affines, full_size)
+    m, size = geometry.scaled(m, full_size, image.size, out_full_size)
+    return geometry.transform(image, m, size), out_full_size
+
+
+def chain_affine(steps, full_size):
+    """Output-to-input matrix and output size of a list of (name, params)
+
+    Operations that are not geometric leave pixels where they are, apart
+    from scaling them when they change the size, so this maps every point
+    of a chain's output back to the source.
+    """
+    def step(name, params):
+        if is_geometric(name):
+            return partial(OPERATIONS[name].affine, **params)
+        return lambda size: geometry.resize(size, output_size(name, size, params))
+    return geometry.compose([step(name, params) for name, params in steps], full_size)
+
+
+def _geometry(image, scale, name, **params):
+    """Run a single geometric operation"""
+    full_size = (image.width / scale, image.height / scale)
+    return apply_geometry(image, [(name, params)], full_size)[0]
+
+
+@operation("rotate", affine=geometry.rotation)
+def rotate(image, scale, degrees):
+    """Rotate image by specified degrees"""
+    return _geometry(image, scale, "rotate", degrees=degrees)
+
+
+@operation("flip", affine=geometry.flip)
+def flip(image, scale, direction):
+    """Flip image horizontally or vertically"""
+    return _geometry(image, scale, "flip", direction=direction)
+
+
+def crop_pixels(size, box):
+    """Convert a fractional crop box into pixel coordinates for size"""
+    w, h = size
+    left, top, right, bottom = box
+    x1, x2 = sorted((int(round(left * w)), int(round(right * w))))
+    y1, y2 = sorted((int(round(top * h)), int(round(bottom * h))))
+    x1, x2 = max(0, min(x1, w)), max(0, min(x2, w))
+    y1, y2 = max(0, min(y1, h)), max(0, min(y2, h))
+    return (x1, y1, max(x2, x1 + 1), max(y2, y1 + 1))
+
+
+@operation("crop", affine=lambda size, box: geometry.crop(size, crop_pixels(size, box)))
+def crop(image, scale, box):
+    """Crop image to a box given as fractions of its width and height"""
+    return _geometry(image, scale, "crop", box=box)
+
+
+@operation("resize", affine=lambda size, width, height: geometry.resize(size, (width, height)))
+def resize(image, scale, width, height):
+    """Resize image to width x height full-resolution pixels"""
+    return _geometry(image, scale, "resize", width=width, height=height)
+
+
+@operation("filter")
+def apply_filter(image, scale, name):
+    """Apply one of the named filters"""
+    if name == "Black & White":
+        return image.convert('L').convert('RGB')
+    if name in FILTERS:
+        return parallel_filter(image, scaled_filter(FILTERS[name], scale))
+    return image
+
+
+@operation("detail")
+def detail(image, scale, blur=0.0, sharpen=0, sharpen_radius=1.5, clarity=0):
+    """Blur, unsharp mask and clarity with radii in full-resolution pixels"""
+    return apply_detail(image, blur * scale, sharpen, sharpen_radius * scale,
+                        clarity, CLARITY_RADIUS * scale)
+
+
+@operation("enhance")
+def enhance(image, scale):
+    """Simulated AI enhancement: sharpen and boost colour"""
+    enhanced = parallel_filter(image, scaled_filter(ImageFilter.SHARPEN, scale))
+    return ImageEnhance.Color(enhanced).enhance(1.2)
+
+
+@operation("remove_background")
+def remove_background(image, scale, key_color=(255, 255, 255), tolerance=55, method="threshold"):
+    """Make pixels close to the key colour transparent"""
+    return background.remove_background(image, key_color, tolerance, method)
+
+
+@operation("style")
+def style(image, scale, name):
+    """Simulated AI style transfer"""
+    if name in STYLE_PRESETS:
+        # Colour looks are a single matrix or 3D LUT pass
+        return apply_color(image, style_transform(name))
+    if name == "Picasso":
+        # Apply cubist-like effect (simplified)
+        return parallel_filter(image, scaled_filter(ImageFilter.CONTOUR, scale))
+    # Default to watercolor
+    return parallel_filter(image, scaled_filter(ImageFilter.SMOOTH_MORE, scale))
+
+
+@operation("lut")
+def apply_lut(image, scale, path):
+    """Apply a 3D LUT from a .cube file"""
+    return apply_color(image, cached_cube(path))
+
+
+@operation("super_resolution",
+           size=lambda size, factor=2, **params: (size[0] * factor, size[1] * factor))
+def super_resolution(image, scale, factor=2, max_bytes=tiles.TILE_MEMORY):
+    """Simulated AI super resolution: LANCZOS upscale by 2, 3 or 4
+
+    max_bytes caps the memory the bands of a large upscale work in.
+    """
+    if factor not in (2, 3, 4):
+        raise ValueError("super resolution supports factors 2, 3 and 4")
+    if scale < 1:
+        # A proxy already has fewer pixels than the source, upscaling adds nothing
+        return image
+    # Large outputs go through memory-mapped bands
+    return tiles.upscale(image, factor, max_bytes)
@@ -0,0 +1,88 @@
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageFilter
+
+# Below this many pixels splitting costs more than it saves
+MIN_PARALLEL_PIXELS = 1024 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def thread_pool():
+    """Shared pool for strip work, one thread per CPU"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1,
+                                       thread_name_prefix="pixonic-strips")
+        return _pool
+
+
+def filter_halo(image_filter):
+    """Rows of context a filter needs above and below each output row"""
+    if isinstance(image_filter, type):
+        image_filter = image_filter()
+    if isinstance(image_filter, ImageFilter.BuiltinFilter):
+        # Kernel and the built-in filters: filterargs starts with (width, height)
+        return image_filter.filterargs[0][1] // 2
+    if isinstance(image_filter, ImageFilter.RankFilter):
+        return image_filter.size // 2
+    if isinstance(image_filter, (ImageFilter.GaussianBlur, ImageFilter.BoxBlur)):
+        # Gaussian blur is three box passes of about the same radius
+        radius = image_filter.radius
+        if not isinstance(radius, (int, float)):
+            radius = radius[1]
+        passes = 3 if isinstance(image_filter, ImageFilter.GaussianBlur) else 1
+        return int(math.ceil(radius * passes)) + 2
+    if isinstance(image_filter, ImageFilter.UnsharpMask):
+        return int(math.ceil(image_filter.radius * 3)) + 2
+    return None
+
+
+def strips(height, count, halo):
+    """(top, bottom, inner_top, inner_bottom) for count strips over height rows
+
+    top/bottom include the halo, inner_* are the rows a strip produces.
+    """
+    step = int(math.ceil(height / count))
+    result = []
+    for inner_top in range(0, height, step):
+        inner_bottom = min(height, inner_top + step)
+        result.append((max(0, inner_top - halo), min(height, inner_bottom + halo),
+                       inner_top, inner_bottom))
+    return result
+
+
+def parallel_filter(image, image_filter, workers=None, halo=None, min_pixels=MIN_PARALLEL_PIXELS):
+    """Apply an ImageFilter on horizontal strips in parallel
+
+    Each strip is extended by a halo of rows sized to the filter's radius,
+    filtered on the thread pool (Pillow releases the GIL inside its C
+    filters) and cropped back before stitching, so the result matches
+    image.filter(image_filter). Filters whose radius is unknown, and small
+    images, are filtered in one piece.
+    """
+    if halo is None:
+        halo = filter_halo(image_filter)
+    workers = workers or os.cpu_count() or 1
+    # Keep strips several halos tall so the overlap stays a small overhead
+    count = min(workers, image.height // max(1, 4 * (halo or 0)))
+    if halo is None or count < 2 or image.width * image.height < min_pixels:
+        return image.filter(image_filter)
+
+    image.load()
+
+    def run(strip):
+        top, bottom, inner_top, inner_bottom = strip
+        filtered = image.crop((0, top, image.width, bottom)).filter(image_filter)
+        return filtered.crop((0, inner_top - top, image.width, inner_bottom - top))
+
+    parts = strips(image.height, count, halo)
+    result = Image.new(image.mode, image.size)
+    for (_, _, inner_top, _), part in zip(parts, thread_pool().map(run, parts)):
+        result.paste(part, (0, inner_top))
+    return result
@@ -0,0 +1,422 @@
+import threading
+import time
+
+import numpy as np
+
+from .audio import as_float32, quantize
+
+# Playback speeds the time stretch accepts
+MIN_SPEED = 0.25
+MAX_SPEED = 4.0
+
+
+class RingBuffer:
+    """Single-producer, single-consumer ring of float32 audio frames
+
+    Only the producer calls write() and only the consumer calls read(),
+    and each side advances only its own counter, so no lock is needed:
+    a counter is published after the frames it covers are copied. Every
+    frame carries the source position it came from, for a sample-accurate
+    playback position, and a generation number; frames written before a
+    seek belong to an older generation and are dropped by the consumer.
+    """
+
+    def __init__(self, capacity, channels):
+        self.capacity = capacity
+        self.frames = np.zeros((capacity, channels), dtype=np.float32)
+        self.positions = np.zeros(capacity, dtype=np.float64)
+        self.generations = np.zeros(capacity, dtype=np.int64)
+        self.written = 0
+        self.consumed = 0
+
+    @property
+    def available(self):
+        return self.written - self.consumed
+
+    @property
+    def space(self):
+        return self.capacity - self.available
+
+    def write(self, frames, positions, generation):
+        """Append as many frames as fit; returns the number written"""
+        count = min(len(frames), self.space)
+        done = 0
+        while done < count:
+            start = (self.written + done) % self.capacity
+            run = min(count - done, self.capacity - start)
+            self.frames[start:start + run] = frames[done:done + run]
+            self.positions[start:start + run] = positions[done:done + run]
+            self.generations[start:start + run] = generation
+            done += run
+        self.written += count
+        return count
+
+    def read(self, out, generation):
+        """Fill out with frames of generation, dropping older ones
+
+        Returns (frames copied, source position after the last one, or
+        None if nothing was copied).
+        """
+        copied, position = 0, None
+        while copied < len(out) and self.consumed < self.written:
+            start = self.consumed % self.capacity
+            run = min(len(out) - copied, self.written - self.consumed, self.capacity - start)
+            current = self.generations[start:start + run] >= generation
+            if not current[0]:
+                # Frames from before a seek
+                stale = int(np.argmax(current)) if current.any() else run
+                self.consumed += stale
+                continue
+            out[copied:copied + run] = self.frames[start:start + run]
+            position = self.positions[start + run - 1] + 1
+            self.consumed += run
+            copied += run
+        return copied, position
+
+
+class TimeStretch:
+    """Streaming WSOLA time stretch of a sample buffer
+
+    Frames of about 20 ms are overlap-added at a fixed synthesis hop of
+    half a frame while the read position advances by speed times that
+    hop. Each frame is taken from within a quarter frame of its nominal
+    position, at the offset whose cross-correlation with the natural
+    continuation of the previous frame is highest, so waveforms line up
+    across the overlap and pitch is unchanged. Only the frames being
+    read are converted; the buffer itself is never copied.
+    """
+
+    def __init__(self, samples, rate, speed, start=0, scale=None):
+        self.samples = samples
+        self.scale = scale
+        self.speed = speed
+        self.frame = 2 ** int(round(np.log2(rate * 0.02)))
+        self.hop = self.frame // 2
+        self.tolerance = self.hop // 2
+        # Periodic Hann windows at half-frame hops sum to exactly 1
+        self.window = np.hanning(self.frame + 1)[:-1].astype(np.float32)[:, None]
+        size = self.frame + 2 * self.tolerance + self.frame
+        self.fft_size = 1 << (size - 1).bit_length()
+        self.position = float(start)
+        self.previous = None
+        self.tail = None
+        # Prime the overlap with the frame before start, so output begins at full level
+        self.position -= self.hop * speed
+        self.next()
+
+    @property
+    def finished(self):
+        return self.position >= len(self.samples)
+
+    def _segment(self, start, count):
+        """Samples start:start + count as float32 frames, zero outside the buffer"""
+        lo, hi = max(0, start), min(len(self.samples), start + count)
+        channels = 1 if self.samples.ndim == 1 else self.samples.shape[1]
+        out = np.zeros((count, channels), dtype=np.float32)
+        if lo < hi:
+            chunk = as_float32(self.samples[lo:hi], self.scale)
+            out[lo - start:hi - start] = chunk.reshape(hi - lo, channels)
+        return out
+
+    def _best_start(self, nominal):
+        """Frame start near nominal that best continues the previous frame"""
+        if self.previous is None:
+            return nominal
+        target = self._segment(self.previous + self.hop, self.frame).sum(axis=1)
+        region = self._segment(nominal - self.tolerance, self.frame + 2 * self.tolerance).sum(axis=1)
+        spectrum = np.fft.rfft(region, self.fft_size) * np.conj(np.fft.rfft(target, self.fft_size))
+        correlation = np.fft.irfft(spectrum, self.fft_size)[:2 * self.tolerance + 1]
+        return nominal - self.tolerance + int(np.argmax(correlation))
+
+    def next(self):
+        """Next hop of output frames and the source position of each"""
+        start = self._best_start(int(self.position))
+        frame = self._segment(start, self.frame) * self.window
+        out = frame[:self.hop] if self.tail is None else self.tail + frame[:self.hop]
+        self.tail = frame[self.hop:]
+        positions = self.position + np.arange(self.hop) * self.speed
+        self.previous = start
+        self.position += self.hop * self.speed
+        return out, positions
+
+
+class NullDevice:
+    """Audio output stand-in that consumes frames on a timer thread
+
+    Calls the engine's callback every block frames, paced in real time
+    unless realtime is False. Rendered frames are kept in output when
+    record is True, so playback can be checked without hardware.
+    """
+
+    def __init__(self, rate, channels, block=1024, realtime=True, record=False):
+        self.rate = rate
+        self.channels = channels
+        self.block = block
+        self.realtime = realtime
+        self.output = [] if record else None
+        self.latency = block / rate
+        self._thread = None
+        self._running = False
+
+    @property
+    def active(self):
+        return self._running
+
+    def start(self, callback):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(callback,), daemon=True)
+        self._thread.start()
+
+    def _run(self, callback):
+        period = self.block / self.rate
+        deadline = time.perf_counter()
+        while self._running:
+            out = np.zeros((self.block, self.channels), dtype=np.float32)
+            callback(out)
+            if self.output is not None:
+                self.output.append(out)
+            if self.realtime:
+                deadline += period
+                time.sleep(max(0.0, deadline - time.perf_counter()))
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def close(self):
+        self.stop()
+
+
+class PyAudioDevice:
+    """PortAudio output through PyAudio in callback mode
+
+    PortAudio calls back from its own thread whenever it needs frames,
+    so nothing on the Tk thread has to keep the device fed. Frames are
+    quantized to dtype, with TPDF dither unless dither is False, as the
+    last step before they reach the device.
+    """
+
+    def __init__(self, pa, rate, channels, block=1024, dtype=np.int16, dither=True):
+        import pyaudio
+        self.pyaudio = pyaudio
+        self.pa = pa
+        self.rate = rate
+        self.channels = channels
+        self.block = block
+        self.dtype = np.dtype(dtype)
+        self.dither = dither
+        self.format = {"float32": pyaudio.paFloat32, "int32": pyaudio.paInt32,
+                       "int16": pyaudio.paInt16, "uint8": pyaudio.paUInt8}[self.dtype.name]
+        self.rng = np.random.default_rng()
+        self.stream = None
+
+    @property
+    def latency(self):
+        return self.stream.get_output_latency() if self.stream else self.block / self.rate
+
+    @property
+    def active(self):
+        return self.stream is not None and self.stream.is_active()
+
+    def start(self, callback):
+        def feed(in_data, frame_count, time_info, status):
+            out = np.empty((frame_count, self.channels), dtype=np.float32)
+            callback(out)
+            data = quantize(out, self.dtype, self.dither, self.rng)
+            return data.tobytes(), self.pyaudio.paContinue
+
+        self.stream = self.pa.open(format=self.format, channels=self.channels,
+                                   rate=self.rate, output=True,
+                                   frames_per_buffer=self.block, stream_callback=feed)
+        self.stream.start_stream()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+
+    def close(self):
+        self.stop()
+
+
+class PlaybackEngine:
+    """Play a sample buffer through a callback device
+
+    A producer thread converts the buffer to float32 block by block and
+    keeps a ring buffer of about buffer_seconds filled ahead of the
+    device; the device callback only copies frames out of the ring, so
+    a busy Tk thread or a render in progress cannot starve it. position
+    is the source sample after the last frame handed to the device, and
+    seek() takes effect at the next callback.
+
+    Volume is applied in the callback, ramped across each block from the
+    previous gain so changes do not click, and is heard within a block.
+    Speeds other than 1 go through TimeStretch in the producer; changing
+    the speed drops the queued frames so it is heard as soon as volume.
+    """
+
+    def __init__(self, samples, rate, device=None, block=1024, buffer_seconds=0.5, scale=None):
+        self.samples = samples
+        self.rate = rate
+        self.scale = scale
+        self.channels = 1 if samples.ndim == 1 else samples.shape[1]
+        self.block = block
+        self.device = device or NullDevice(rate, self.channels, block)
+        capacity = max(2 * block, int(rate * buffer_seconds))
+        self.ring = RingBuffer(capacity, self.channels)
+        self.stats = {"underruns": 0, "blocks": 0}
+        self._generation = 0
+        self._source_pos = 0
+        self._position = 0
+        self._seek_to = None
+        self._eof_generation = None
+        self._finished = False
+        self._playing = False
+        self._closed = False
+        self._gain = self._target_gain = 1.0
+        self._speed = 1.0
+        self._stretch = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._producer = threading.Thread(target=self._produce, daemon=True)
+        self._producer.start()
+
+    @property
+    def duration(self):
+        return len(self.samples)
+
+    @property
+    def position(self):
+        """Source sample position of the audio being heard"""
+        return self._position
+
+    @property
+    def playing(self):
+        return self._playing
+
+    @property
+    def finished(self):
+        """True once every sample up to the end has been played"""
+        return self._finished
+
+    @property
+    def volume(self):
+        return self._target_gain
+
+    def set_volume(self, gain):
+        """Linear gain, reached over the next callback block"""
+        self._target_gain = max(0.0, float(gain))
+
+    @property
+    def speed(self):
+        return self._speed
+
+    def set_speed(self, speed):
+        """Playback rate without changing pitch; 1 plays the samples untouched"""
+        speed = min(MAX_SPEED, max(MIN_SPEED, float(speed)))
+        if speed != self._speed:
+            self._speed = speed
+            # Restart the producer where playback is, at the new speed
+            self.seek(self._position)
+
+    def play(self):
+        if self._playing:
+            return
+        if self._finished:
+            self.seek(0)
+        self._playing = True
+        self._wake.set()
+        self.device.start(self._fill)
+
+    def pause(self):
+        if self._playing:
+            self._playing = False
+            self.device.stop()
+
+    def stop(self):
+        """Pause and go back to the start"""
+        self.pause()
+        self.seek(0)
+
+    def seek(self, position):
+        """Continue from position; queued frames are dropped, not played"""
+        position = max(0, min(int(position), len(self.samples)))
+        with self._lock:
+            self._generation += 1
+            self._seek_to = position
+            self._position = position
+            self._finished = False
+        self._wake.set()
+
+    def close(self):
+        self.pause()
+        self._closed = True
+        self._wake.set()
+        self._producer.join()
+        self.device.close()
+
+    def _read_source(self):
+        """Next block of the source as float32 with the position of each frame"""
+        if self._stretch is not None:
+            frames, positions = self._stretch.next()
+            self._source_pos = int(self._stretch.position)
+            return frames, positions
+        start = self._source_pos
+        frames = as_float32(self.samples[start:start + self.block], self.scale)
+        if frames.ndim == 1:
+            frames = frames[:, None]
+        self._source_pos += len(frames)
+        return frames, np.arange(start, start + len(frames), dtype=np.float64)
+
+    def _produce(self):
+        """Producer thread: keep the ring filled ahead of the device"""
+        pending = None
+        while not self._closed:
+            with self._lock:
+                generation = self._generation
+                if self._seek_to is not None:
+                    self._source_pos, self._seek_to = self._seek_to, None
+                    self._stretch = None
+                    if self._speed != 1.0:
+                        self._stretch = TimeStretch(self.samples, self.rate, self._speed,
+                                                    self._source_pos, self.scale)
+                    pending = None
+            if pending is None and self._source_pos < len(self.samples):
+                pending = self._read_source()
+                self.stats["blocks"] += 1
+            if pending is not None:
+                frames, positions = pending
+                written = self.ring.write(frames, positions, generation)
+                pending = (frames[written:], positions[written:]) if written < len(frames) else None
+            elif self._source_pos >= len(self.samples):
+                self._eof_generation = generation
+            if pending is not None or self._eof_generation == generation:
+                # Full, or nothing left to read: wait for the device or a seek
+                self._wake.wait(self.block / self.rate)
+                self._wake.clear()
+
+    def _fill(self, out):
+        """Device callback: copy frames out of the ring"""
+        generation = self._generation
+        copied, position = self.ring.read(out, generation)
+        if position is not None:
+            # Stretched frames step by speed, the last hop can reach past the end
+            self._position = min(int(position), len(self.samples))
+        if copied < len(out):
+            out[copied:] = 0
+            if self._eof_generation == generation and self.ring.available == 0:
+                self._finished = True
+                self._position = len(self.samples)
+            elif self._playing:
+                self.stats["underruns"] += 1
+        gain, target = self._gain, self._target_gain
+        if gain != target:
+            # Per-block linear ramp to the new gain
+            out *= np.linspace(gain, target, len(out), endpoint=False, dtype=np.float32)[:, None]
+            self._gain = target
+        elif gain != 1.0:
+            out *= np.float32(gain)
+        self._wake.set()
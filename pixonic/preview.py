@@ -0,0 +1,251 @@
+from PIL import Image
+
+from .adjustments import AdjustmentEngine, DEFAULT_ADJUSTMENTS, is_neutral
+from .graph import EditGraph
+from .masks import LocalAdjustments, LocalCompositor
+
+
+def fit_size(size, bound):
+    """Largest size with the aspect ratio of size that fits inside bound"""
+    w, h = size
+    bw, bh = bound
+    ratio = min(bw / w, bh / h, 1.0)
+    return (max(1, int(w * ratio)), max(1, int(h * ratio)))
+
+
+class PreviewSession:
+    """Edit session that previews on a canvas-sized proxy
+
+    Every operation is recorded in an EditGraph and evaluated on a proxy
+    no larger than the canvas, so interactive cost depends on the window
+    size rather than the image size. render() evaluates the graph on the
+    full-resolution source for saving. The result of the operations and
+    global adjustments is kept as render_base until one of them changes,
+    so local edits, and undoing them, only recomposite their cells of it.
+    It can also be rendered on another thread and installed with
+    set_render_base().
+
+    source may be a reduced preview of an image that is still being
+    decoded; full_size is then the size of the real image, which is
+    installed later with set_source(). store is an optional ImageStore
+    that large full-resolution results are kept in.
+
+    local holds masked local adjustments, applied on top of the global
+    ones; after painting a mask or changing a layer, update_local()
+    recomposites only the parts of the preview that changed. That is done
+    in place, so displays compare version as well as the image.
+    """
+
+    def __init__(self, source, bound=(800, 600), full_size=None, store=None):
+        self.source = source
+        self.source_size = full_size or source.size
+        self.bound = bound
+        self.graph = EditGraph(store=store)
+        self.adjustments = dict(DEFAULT_ADJUSTMENTS)
+        self.preview_engine = AdjustmentEngine()
+        self.render_engine = AdjustmentEngine()
+        self.local = LocalAdjustments()
+        self.local_preview = LocalCompositor(self.local)
+        self.local_render = LocalCompositor(self.local, cell=256)
+        self.render_base = None
+        self.render_key = None
+        self._build_proxy()
+
+    @property
+    def size(self):
+        """Full-resolution size of the edited image"""
+        return self.full_size
+
+    def _build_proxy(self, scale=None):
+        """Rebuild the proxy from the source and replay operations on it"""
+        width, height = self.source_size
+        if scale is None:
+            scale = fit_size(self.source_size, self.bound)[0] / width
+        proxy = self.source
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        if size[0] < proxy.width:
+            proxy = proxy.resize(size, Image.LANCZOS, reducing_gap=3.0)
+        self.proxy = proxy
+        self.proxy_scale = proxy.width / width
+        self._evaluate()
+
+    def _evaluate(self):
+        """Evaluate the graph on the proxy, reusing cached node outputs"""
+        self.base, self.full_size = self.graph.evaluate(
+            self.proxy, f"proxy:{id(self.source)}:{self.proxy_scale}", self.source_size)
+        self._check_proxy_scale()
+        self.adjusted = self.preview_engine.render(self.adjustments, self.base)
+        self.preview = self._composite_preview(self.adjusted)
+
+    def _check_proxy_scale(self):
+        """Keep the proxy at canvas size after an operation"""
+        wanted = fit_size(self.full_size, self.bound)
+        if self.base.width > wanted[0] * 1.05:
+            # Upscaling operations can grow the proxy past the canvas
+            self.base = self.base.resize(wanted, Image.LANCZOS)
+            return
+        # Crops and resizes can leave fewer proxy pixels than the canvas shows
+        scale = min(1.0, self.proxy_scale * wanted[0] / self.base.width)
+        if scale > self.proxy_scale * 1.05 and self.proxy is not self.source:
+            self._build_proxy(scale)
+
+    def source_matrix(self, image_size=None):
+        """Matrix from pixels of the edited image to fractions of the source
+
+        image_size is the size of the image the pixels are in; it defaults
+        to the full-resolution size. Local masks cover the source, so
+        this is how they follow the operations.
+        """
+        return self.graph.source_matrix(self.source_size, image_size)
+
+    def _composite_preview(self, image):
+        """image, an adjusted proxy, with the local layers applied"""
+        return self.local_preview.apply(image, self.source_matrix(image.size))
+
+    @property
+    def version(self):
+        """Changes whenever the preview or the render is changed in place"""
+        return self.local_preview.version, self.local_render.version
+
+    @property
+    def is_preview_source(self):
+        """True while the source is a reduced stand-in for the real image"""
+        return self.source.size != self.source_size
+
+    def set_source(self, source):
+        """Install the fully decoded source in place of a preview
+
+        The current proxy is kept; it is rebuilt from the new source the
+        next time more proxy resolution is needed.
+        """
+        self.source = source
+        self.source_size = source.size
+
+    def set_bound(self, bound):
+        """Resize the proxy for a new canvas size"""
+        bound = (max(1, bound[0]), max(1, bound[1]))
+        if bound != self.bound:
+            self.bound = bound
+            self._build_proxy()
+        return self.preview
+
+    def apply(self, op, **params):
+        """Record an operation and return the updated preview"""
+        self.graph.add(op, **params)
+        self._evaluate()
+        return self.preview
+
+    def update(self, node, **params):
+        """Change a recorded operation; only it and later nodes are recomputed"""
+        self.graph.update(node, **params)
+        self._evaluate()
+        return self.preview
+
+    def set_operation(self, op, **params):
+        """Update the existing node for op, or record it if there is none"""
+        node = self.graph.find(op)
+        if node is None:
+            return self.apply(op, **params)
+        return self.update(node, **params)
+
+    def remove_operation(self, op):
+        """Drop the recorded node for op, if any, and return the updated preview"""
+        node = self.graph.find(op)
+        if node is not None:
+            self.graph.remove(node)
+            self._evaluate()
+        return self.preview
+
+    def set_adjustments(self, params):
+        """Change the colour adjustments and return the updated preview"""
+        self.adjustments = dict(DEFAULT_ADJUSTMENTS, **params)
+        self.adjusted = self.preview_engine.render(self.adjustments, self.base)
+        self.preview = self._composite_preview(self.adjusted)
+        return self.preview
+
+    def accept_preview(self, params, base, preview):
+        """Install a preview rendered elsewhere from base with params
+
+        Returns False if the proxy has changed since base was taken.
+        """
+        if base is not self.base:
+            return False
+        self.adjustments = dict(DEFAULT_ADJUSTMENTS, **params)
+        self.adjusted = preview
+        self.preview = self._composite_preview(preview)
+        return True
+
+    def update_local(self):
+        """Show changes to the local layers or their masks"""
+        self.preview = self._composite_preview(self.adjusted)
+        return self.preview
+
+    def snapshot(self):
+        """Hashable state of the operations, adjustments and local layers, for undo"""
+        return self.graph.snapshot(), tuple(sorted(self.adjustments.items())), self.local.snapshot()
+
+    def render_state(self):
+        """The part of snapshot() that render_base depends on"""
+        return self.graph.snapshot(), tuple(sorted(self.adjustments.items()))
+
+    def restore(self, state):
+        """Return to a state taken with snapshot()"""
+        nodes, adjustments, local = state
+        self.graph.restore(nodes)
+        self.adjustments = dict(adjustments)
+        self.local.restore(local)
+        self._evaluate()
+
+    def reset(self):
+        """Drop all operations and adjustments"""
+        self.graph.clear()
+        self.adjustments = dict(DEFAULT_ADJUSTMENTS)
+        self.local.clear()
+        self._build_proxy()
+        return self.preview
+
+    def render(self):
+        """Evaluate every operation at full resolution
+
+        The returned image is updated in place by later local edits; copy
+        it, or render a LocalAdjustments.copy() on render_base, to keep it.
+        """
+        if self.is_preview_source:
+            raise RuntimeError("the full-resolution image has not been decoded yet")
+        if self._current_base() is None:
+            img, _ = self.graph.evaluate(self.source, f"source:{id(self.source)}")
+            if is_neutral(self.adjustments):
+                # Nothing to adjust, don't copy a possibly memory-mapped result
+                self.render_base = img
+            else:
+                self.render_base = self.render_engine.render(self.adjustments, img)
+                self.render_engine.set_source(None)
+                if self.graph.store is not None:
+                    self.render_base = self.graph.store.adopt(self.render_base)
+            self.render_key = (self.source, self.render_state())
+        return self.local_render.apply(self.render_base, self.source_matrix(self.render_base.size))
+
+    def cached_render(self):
+        """render() if render_base is ready, else None; never evaluates the graph"""
+        if self.is_preview_source or self._current_base() is None:
+            return None
+        return self.local_render.apply(self.render_base, self.source_matrix(self.render_base.size))
+
+    def _current_base(self):
+        """render_base if it matches the source and edits, dropping it if not"""
+        if self.render_key is not None:
+            source, state = self.render_key
+            if source is not self.source or state != self.render_state():
+                self.render_base = self.render_key = None
+        return self.render_base
+
+    def set_render_base(self, source, state, image):
+        """Install a render_base made elsewhere from source in render_state() state
+
+        Returns False if the source or the edits have changed since.
+        """
+        if source is not self.source or state != self.render_state():
+            return False
+        self.render_base = image
+        self.render_key = (source, state)
+        return True
@@ -0,0 +1,125 @@
+import functools
+import os
+
+import numpy as np
+
+from .audio import as_float32
+
+# Samples per partition of the impulse response and per input block
+PARTITION = 16384
+
+# Synthetic spaces: decay is the RT60 in seconds, predelay the gap before
+# the first reflection, damping how much faster high frequencies die away
+IMPULSES = {
+    "Room": {"decay": 0.5, "predelay": 0.005, "damping": 0.5},
+    "Plate": {"decay": 1.8, "predelay": 0.0, "damping": 0.2},
+    "Hall": {"decay": 2.8, "predelay": 0.02, "damping": 0.6},
+    "Cathedral": {"decay": 6.0, "predelay": 0.04, "damping": 0.7},
+}
+
+
+def _unit_energy(impulse):
+    """Scale an impulse response so white noise keeps its RMS through it"""
+    energy = np.sqrt(np.sum(impulse.astype(np.float64) ** 2))
+    return (impulse / energy).astype(np.float32) if energy > 0 else impulse.astype(np.float32)
+
+
+@functools.lru_cache(maxsize=8)
+def impulse_response(name, rate):
+    """Impulse response of a synthetic space, built once per sample rate
+
+    Exponentially decaying noise, 60 dB down after the decay time. Its
+    low-passed part keeps that decay and the rest decays faster by the
+    damping factor, as air and soft surfaces absorb highs first.
+    """
+    from scipy.signal import lfilter
+
+    params = IMPULSES[name]
+    decay = params["decay"]
+    length = int(rate * decay)
+    noise = np.random.default_rng(len(name)).standard_normal(length)
+    # One-pole low-pass at about 2 kHz splits the noise into lows and highs
+    alpha = np.exp(-2 * np.pi * 2000 / rate)
+    low = lfilter([1 - alpha], [1, -alpha], noise)
+    t = np.arange(length) / rate
+    high_decay = decay * (1 - params["damping"]) or decay
+    impulse = low * 10 ** (-3 * t / decay) + (noise - low) * 10 ** (-3 * t / high_decay)
+    impulse = np.concatenate((np.zeros(int(rate * params["predelay"])), impulse))
+    impulse = _unit_energy(impulse)
+    impulse.setflags(write=False)
+    return impulse
+
+
+def load_impulse(path, rate):
+    """Read a WAV impulse response as mono float32 at rate
+
+    Channels are mixed down, the file is resampled if its rate differs
+    and trailing silence below -90 dB is trimmed.
+    """
+    from scipy.io import wavfile
+    from scipy.signal import resample_poly
+
+    file_rate, samples = wavfile.read(path)
+    impulse = as_float32(samples)
+    if impulse.ndim > 1:
+        impulse = impulse.mean(axis=1)
+    if not np.any(impulse):
+        raise ValueError(f"{os.path.basename(path)} is silent")
+    if file_rate != rate:
+        common = np.gcd(int(file_rate), int(rate))
+        impulse = resample_poly(impulse, rate // common, file_rate // common).astype(np.float32)
+    audible = np.nonzero(np.abs(impulse) > np.abs(impulse).max() * 10 ** (-90 / 20))[0]
+    return _unit_energy(impulse[:audible[-1] + 1])
+
+
+@functools.lru_cache(maxsize=4)
+def _cached_impulse(path, rate, mtime):
+    impulse = load_impulse(path, rate)
+    impulse.setflags(write=False)
+    return impulse
+
+
+def cached_impulse(path, rate):
+    """load_impulse() cached until the file changes"""
+    return _cached_impulse(path, rate, os.path.getmtime(path))
+
+
+def convolve_reverb(samples, impulse, wet=0.3, scale=None, out=None, block=PARTITION):
+    """Mix samples with their convolution by impulse, as float32 in -1..1
+
+    Uniformly partitioned overlap-add: the impulse is split into blocks
+    whose spectra are kept, each input block is transformed once and
+    pushed onto a frequency-domain delay line, and one inverse transform
+    per block yields the sum over all partitions. Cost grows with the
+    impulse length over the block size, not with their product, and the
+    working memory depends only on the impulse, so hour-long files need
+    nothing beyond the output. The reverb tail past the end of the
+    buffer is cut. out may be samples itself when they are float32.
+    """
+    frames = len(samples)
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    if out is None:
+        out = np.empty(samples.shape, dtype=np.float32)
+    size = 2 * block
+    partitions = -(-len(impulse) // block)
+    padded = np.zeros(partitions * block, dtype=np.float32)
+    padded[:len(impulse)] = impulse
+    spectra = np.fft.rfft(padded.reshape(partitions, block), size, axis=1).astype(np.complex64)
+    # Reversed and doubled, so the spectra lined up with the delay line are a slice
+    spectra = np.concatenate((spectra[::-1], spectra[::-1]))
+    delay_line = np.zeros((partitions, block + 1, channels), dtype=np.complex64)
+    overlap = np.zeros((block, channels), dtype=np.float32)
+    dry_gain, wet_gain = np.float32(1 - wet), np.float32(wet)
+    for index, start in enumerate(range(0, frames, block)):
+        dry = as_float32(samples[start:start + block], scale).reshape(-1, channels)
+        count = len(dry)
+        slot = index % partitions
+        delay_line[slot] = np.fft.rfft(dry, size, axis=0)
+        # Partition p meets the input block from p blocks ago
+        aligned = spectra[partitions - 1 - slot:2 * partitions - 1 - slot]
+        result = np.fft.irfft(np.einsum("pf,pfc->fc", aligned, delay_line), size, axis=0)
+        reverb = result[:block] + overlap
+        overlap = result[block:].astype(np.float32)
+        mixed = dry * dry_gain + reverb[:count] * wet_gain
+        out[start:start + count] = mixed.reshape(out[start:start + count].shape)
+    return out
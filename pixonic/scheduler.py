@@ -0,0 +1,124 @@
+import threading
+import time
+
+
+class RenderScheduler:
+    """Run renders on a worker thread, keeping only the latest request
+
+    submit() may be called for every slider event. Requests that arrive
+    while a render is running are merged into the newest one, and a render
+    that is overtaken by a newer request is cancelled, as long as a frame
+    was shown within max_frame_delay seconds so a continuous drag still
+    updates the canvas. Finished frames are handed back on the Tk thread
+    by polling with after().
+    """
+
+    def __init__(self, widget, render, on_frame, on_error=None, poll_interval=15,
+                 max_frame_delay=0.1):
+        self.widget = widget
+        self.render = render
+        self.on_frame = on_frame
+        self.on_error = on_error
+        self.poll_interval = poll_interval
+        self.max_frame_delay = max_frame_delay
+        self.stats = {"requested": 0, "coalesced": 0, "rendered": 0, "dropped": 0}
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._pending = None
+        self._busy = False
+        self._ready = None
+        self._error = None
+        self._polling = False
+        self._closed = False
+        self._thread = None
+        self._last_frame = 0.0
+
+    def submit(self, job):
+        """Queue job, replacing any request that has not started yet"""
+        with self._cond:
+            self.stats["requested"] += 1
+            if self._pending is not None:
+                self.stats["coalesced"] += 1
+            self._generation += 1
+            self._pending = (self._generation, job)
+            self._cond.notify()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        if not self._polling:
+            self._polling = True
+            self.widget.after(self.poll_interval, self._poll)
+
+    def is_stale(self, generation):
+        """True if a render of generation should be abandoned"""
+        if generation == self._generation:
+            return False
+        # Let overtaken renders finish if the canvas has not updated for a while
+        return time.monotonic() - self._last_frame < self.max_frame_delay
+
+    @property
+    def idle(self):
+        """True when nothing is pending, rendering or waiting to be shown"""
+        with self._cond:
+            return self._pending is None and not self._busy and self._ready is None
+
+    def summary(self):
+        """Short description of the frame counters"""
+        return f"{self.stats['rendered']} frames rendered, {self.stats['dropped']} dropped"
+
+    def close(self):
+        """Stop the worker thread"""
+        with self._cond:
+            self._closed = True
+            self._pending = None
+            self._cond.notify()
+
+    def _run(self):
+        """Worker loop: render the latest request until closed"""
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                generation, job = self._pending
+                self._pending = None
+                self._busy = True
+
+            try:
+                frame = self.render(job, lambda: self.is_stale(generation))
+                error = None
+            except Exception as e:
+                frame, error = None, e
+
+            with self._cond:
+                self._busy = False
+                if error is not None:
+                    self._error = error
+                elif frame is None:
+                    self.stats["dropped"] += 1
+                else:
+                    if self._ready is not None:
+                        # The previous frame was never shown
+                        self.stats["dropped"] += 1
+                    self._ready = (generation, frame)
+
+    def _poll(self):
+        """Hand finished frames to on_frame on the Tk thread"""
+        with self._cond:
+            ready, self._ready = self._ready, None
+            error, self._error = self._error, None
+            active = self._pending is not None or self._busy
+
+        if error is not None and self.on_error:
+            self.on_error(error)
+        if ready is not None:
+            generation, frame = ready
+            self.stats["rendered"] += 1
+            self._last_frame = time.monotonic()
+            self.on_frame(frame)
+
+        if active and not self._closed:
+            self.widget.after(self.poll_interval, self._poll)
+        else:
+            self._polling = False
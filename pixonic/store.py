@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from .loader import open_full
+from .tiles import MAPPED_MODES, MAPPED_OUTPUT_BYTES, TILE_MEMORY, process_tiles
+
+# Decoded files open() keeps for reuse; the most recent one always stays
+OPENED_BYTES = 256 * 1024 * 1024
+
+
+def image_nbytes(image):
+    """Bytes of an image's pixels"""
+    return image.width * image.height * len(image.getbands())
+
+
+class ImageStore:
+    """Uncompressed scratch files backing large images as memory maps
+
+    open() decodes a file once and keeps its pixels in a scratch file, so
+    resetting or re-rendering reads them back from the page cache instead
+    of decoding again, and the operating system pages them in and out as
+    needed rather than holding them in RAM. adopt() moves any other large
+    image, such as a full-resolution edit result, into the store the same
+    way. Images smaller than min_bytes stay in memory. Opened files are
+    kept least recently used first up to keep_bytes, since a mapped
+    image holds its scratch file's disk blocks for as long as it lives.
+    """
+
+    def __init__(self, directory=None, min_bytes=MAPPED_OUTPUT_BYTES, max_bytes=TILE_MEMORY,
+                 keep_bytes=OPENED_BYTES):
+        self.root = directory
+        self.directory = None
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.keep_bytes = keep_bytes
+        self.opened = OrderedDict()
+        self.lock = threading.Lock()
+        # Adopts writing into the scratch directory, which clear() waits for
+        self._writers = 0
+        self._remove = []
+
+    def _scratch(self):
+        with self.lock:
+            if self.directory is None:
+                self.directory = tempfile.mkdtemp(prefix="pixonic-store-", dir=self.root)
+            return self.directory
+
+    def open(self, path, max_pixels=None):
+        """Decode path once and return its pixels, memory-mapped if large"""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            image = self.opened.get(key)
+            if image is not None:
+                self.opened.move_to_end(key)
+        if image is None:
+            image = self.adopt(open_full(path, max_pixels))
+            with self.lock:
+                # Only the latest version of a file is worth keeping
+                for old in [k for k in self.opened if k[0] == key[0]]:
+                    del self.opened[old]
+                self.opened[key] = image
+                total = sum(image_nbytes(kept) for kept in self.opened.values())
+                while total > self.keep_bytes and len(self.opened) > 1:
+                    _, oldest = self.opened.popitem(last=False)
+                    total -= image_nbytes(oldest)
+        return image
+
+    def adopt(self, image):
+        """Return image with its pixels in a scratch file if it is large
+
+        The copy is made band by band, so it needs only max_bytes on top
+        of the image itself, which can be released afterwards.
+        """
+        if image_nbytes(image) < self.min_bytes or getattr(image, "readonly", False):
+            # Small, or already wrapping a buffer such as a memory map
+            return image
+        mode = image.mode if image.mode in MAPPED_MODES else (
+            "RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+        def band(box):
+            part = image.crop(box)
+            return part if part.mode == mode else part.convert(mode)
+
+        directory = self._scratch()
+        with self.lock:
+            self._writers += 1
+        try:
+            return process_tiles(image.size, mode, band, self.max_bytes, directory)
+        finally:
+            with self.lock:
+                self._writers -= 1
+                remove = []
+                if not self._writers:
+                    remove, self._remove = self._remove, []
+            for directory in remove:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def clear(self):
+        """Forget opened files and remove the scratch directory
+
+        Images already handed out stay valid until released; their files
+        were unlinked when they were created. If an adopt is still
+        writing, the directory is removed when it finishes.
+        """
+        with self.lock:
+            self.opened.clear()
+            directory, self.directory = self.directory, None
+            if directory is not None and self._writers:
+                self._remove.append(directory)
+                directory = None
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
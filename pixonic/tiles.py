@@ -0,0 +1,116 @@
+import math
+import os
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+# Peak memory a tiled operation may use for its working bands
+TILE_MEMORY = 256 * 1024 * 1024
+
+# Outputs larger than this are written to a memory-mapped file
+MAPPED_OUTPUT_BYTES = 64 * 1024 * 1024
+
+# Lanczos reads 3 source pixels either side of each output pixel
+LANCZOS_HALO = 4
+
+# Storage mode for each image mode; RGB is padded to RGBX because Pillow
+# can only wrap 1- and 4-byte pixels around an existing buffer
+MAPPED_MODES = {"L": ("L", 1), "RGB": ("RGBX", 4), "RGBX": ("RGBX", 4), "RGBA": ("RGBA", 4)}
+
+# Formats whose encoders accept RGBX directly
+RGBX_FORMATS = ("JPEG", "TIFF", "WEBP")
+
+
+def mapped_image(size, mode, directory=None):
+    """A blank image whose pixels live in a temporary memory-mapped file
+
+    Returns (image, array); writes to array show through image. The file
+    is unlinked at once and disappears when the last view is released.
+    """
+    storage, bands = MAPPED_MODES[mode]
+    width, height = size
+    shape = (height, width, bands) if bands > 1 else (height, width)
+    with tempfile.TemporaryFile(prefix="pixonic-tile-", dir=directory) as f:
+        f.truncate(width * height * bands)
+        array = np.memmap(f, dtype=np.uint8, mode="r+", shape=shape)
+    if bands == 4 and storage == "RGBX":
+        array[..., 3] = 255
+    image = Image.frombuffer(storage, size, array, "raw", storage, 0, 1)
+    return image, array
+
+
+def band_rows(width, bytes_per_pixel, max_bytes, minimum=16):
+    """Rows per band so that a band of width pixels stays within max_bytes"""
+    return max(minimum, int(max_bytes // max(1, width * bytes_per_pixel)))
+
+
+def process_tiles(size, mode, render_band, max_bytes=TILE_MEMORY, directory=None):
+    """Build a size x mode image band by band into a memory-mapped file
+
+    render_band(box) returns the pixels of the output box (left, top,
+    right, bottom) as an image; it is responsible for reading whatever
+    overlap its operation needs around the box. Bands are sized so that
+    the band being rendered and its temporaries stay within max_bytes,
+    and each band is flushed to the file before the next one starts, so
+    the process never holds the whole output.
+    """
+    image, array = mapped_image(size, mode, directory)
+    width, height = size
+    bands = array.shape[2] if array.ndim == 3 else 1
+    # Output band, the resampler's intermediate, the source rows and a copy
+    rows = band_rows(width, 4 * bands, max_bytes)
+    for top in range(0, height, rows):
+        bottom = min(height, top + rows)
+        band = np.asarray(render_band((0, top, width, bottom)))
+        if bands == 4 and band.shape[-1] == 3:
+            array[top:bottom, :, :3] = band
+        else:
+            array[top:bottom] = band
+        array.flush()
+    return image
+
+
+def tiled_upscale(image, factor, max_bytes=TILE_MEMORY, resample=Image.LANCZOS):
+    """Upscale image by an integer factor through memory-mapped bands
+
+    Each band reads only the source rows it covers plus a small halo, so
+    the result is the same as a single resize of the whole image.
+    """
+    if image.mode not in MAPPED_MODES:
+        image = image.convert("RGB")
+    mode = "RGB" if image.mode == "RGBX" else image.mode
+    width, height = image.size
+    size = (width * factor, height * factor)
+
+    def render_band(box):
+        left, top, right, bottom = box
+        src_top = max(0, int(math.floor(top / factor)) - LANCZOS_HALO)
+        src_bottom = min(height, int(math.ceil(bottom / factor)) + LANCZOS_HALO)
+        rows = image.crop((0, src_top, width, src_bottom))
+        source_box = (0, top / factor - src_top, width, bottom / factor - src_top)
+        return rows.resize((right - left, bottom - top), resample, box=source_box)
+
+    return process_tiles(size, mode, render_band, max_bytes)
+
+
+def upscale(image, factor, max_bytes=TILE_MEMORY):
+    """Upscale in memory, or through mapped bands when the output is large"""
+    width, height = image.size
+    output_bytes = width * factor * height * factor * len(image.getbands())
+    if output_bytes <= MAPPED_OUTPUT_BYTES:
+        return image.resize((width * factor, height * factor), Image.LANCZOS)
+    return tiled_upscale(image, factor, max_bytes)
+
+
+def save_image(image, path, format=None, **options):
+    """Save an image, keeping memory-mapped RGBX output mapped where possible
+
+    JPEG, TIFF and WebP encode RGBX straight from the map; other formats
+    need an RGB copy first.
+    """
+    if format is None:
+        format = Image.registered_extensions().get(os.path.splitext(path)[1].lower())
+    if image.mode == "RGBX" and format not in RGBX_FORMATS:
+        image = image.convert("RGB")
+    image.save(path, format, **options)
@@ -0,0 +1,201 @@
+import math
+from collections import OrderedDict
+
+from PIL import Image
+
+MIN_ZOOM = 0.01
+MAX_ZOOM = 32.0
+
+
+class Viewport:
+    """Zoom and pan of an image on a canvas, drawn from a tile pyramid
+
+    Positions are kept in full-resolution image pixels: scale is canvas
+    pixels per image pixel and center is the image point shown in the
+    middle of the canvas. When zoomed in, the image is drawn as a grid of
+    tile x tile canvas tiles rendered from the smallest Image.reduce(2)
+    pyramid level that still has enough pixels, and only tiles that
+    intersect the canvas are rendered. Tiles are cached per zoom level,
+    so panning moves existing tiles and renders only those entering the
+    view. An image changed in place is passed with a new version, which
+    drops its tiles; until another image is shown, tiles are then reduced
+    straight from the image, as rebuilding the pyramid would cost the
+    whole image on every edit.
+    """
+
+    def __init__(self, tile=256, max_tiles=512):
+        self.tile = tile
+        self.max_tiles = max_tiles
+        self.view_size = (1, 1)
+        self.image_size = (1, 1)
+        self.zoom = None
+        self.center = (0.5, 0.5)
+        self.image = None
+        self.version = None
+        self.direct = False
+        self.levels = []
+        self.tiles = OrderedDict()
+        self.stats = {"rendered": 0, "reused": 0}
+
+    @property
+    def fit_scale(self):
+        """Scale at which the whole image fits the canvas"""
+        return min(self.view_size[0] / self.image_size[0], self.view_size[1] / self.image_size[1])
+
+    @property
+    def scale(self):
+        """Canvas pixels per image pixel"""
+        return self.fit_scale if self.zoom is None else self.zoom
+
+    @property
+    def is_fit(self):
+        return self.zoom is None
+
+    def set_view(self, size):
+        """Use a new canvas size"""
+        self.view_size = (max(1, size[0]), max(1, size[1]))
+        self._clamp()
+
+    def set_image_size(self, size):
+        """Show an image of size; a different size starts again from fit"""
+        size = (max(1, size[0]), max(1, size[1]))
+        if size != self.image_size:
+            self.image_size = size
+            self.fit()
+
+    def fit(self):
+        """Show the whole image"""
+        self.zoom = None
+        self.center = (self.image_size[0] / 2, self.image_size[1] / 2)
+
+    def zoom_to(self, zoom, anchor=None):
+        """Zoom to scale zoom keeping the image point under anchor in place
+
+        anchor is a canvas position and defaults to the canvas centre.
+        Zooming out past fit returns to fit.
+        """
+        zoom = max(MIN_ZOOM, min(MAX_ZOOM, zoom))
+        if zoom <= self.fit_scale:
+            self.fit()
+            return
+        if anchor is None:
+            anchor = (self.view_size[0] / 2, self.view_size[1] / 2)
+        x, y = self.canvas_to_image(*anchor)
+        self.zoom = zoom
+        self.center = (x - (anchor[0] - self.view_size[0] / 2) / zoom,
+                       y - (anchor[1] - self.view_size[1] / 2) / zoom)
+        self._clamp()
+
+    def zoom_by(self, factor, anchor=None):
+        """Multiply the current scale by factor"""
+        self.zoom_to(self.scale * factor, anchor)
+
+    def actual_pixels(self, anchor=None):
+        """1:1 view, one image pixel per canvas pixel"""
+        if self.fit_scale >= 1:
+            self.fit()
+            return
+        self.zoom_to(1.0, anchor)
+
+    def pan(self, dx, dy):
+        """Move the image by dx, dy canvas pixels"""
+        if self.zoom is not None:
+            self.center = (self.center[0] - dx / self.zoom, self.center[1] - dy / self.zoom)
+            self._clamp()
+
+    def _clamp(self):
+        """Keep the image on screen; centre it along axes where it fits"""
+        scale = self.scale
+        center = []
+        for c, view, size in zip(self.center, self.view_size, self.image_size):
+            half = view / 2 / scale
+            if half * 2 >= size:
+                center.append(size / 2)
+            else:
+                center.append(min(max(c, half), size - half))
+        self.center = tuple(center)
+
+    @property
+    def origin(self):
+        """Canvas position of the image's top-left corner"""
+        scale = self.scale
+        return (self.view_size[0] / 2 - self.center[0] * scale,
+                self.view_size[1] / 2 - self.center[1] * scale)
+
+    def canvas_to_image(self, x, y):
+        """Image pixel coordinates of a canvas position"""
+        ox, oy = self.origin
+        return ((x - ox) / self.scale, (y - oy) / self.scale)
+
+    def image_to_canvas(self, x, y):
+        """Canvas position of image pixel coordinates"""
+        ox, oy = self.origin
+        return (ox + x * self.scale, oy + y * self.scale)
+
+    def image_box(self):
+        """Displayed image as (left, top, width, height) in canvas pixels"""
+        ox, oy = self.origin
+        width = max(1, int(round(self.image_size[0] * self.scale)))
+        height = max(1, int(round(self.image_size[1] * self.scale)))
+        return (int(round(ox)), int(round(oy)), width, height)
+
+    def set_image(self, image, version=None):
+        """Draw tiles from image, which may be a proxy of any resolution"""
+        if image is not self.image or version != self.version:
+            self.direct = image is self.image
+            self.image = image
+            self.version = version
+            self.levels = [image]
+            self.tiles.clear()
+
+    def _level(self, scale):
+        """Pyramid level with the fewest pixels at or above scale"""
+        steps = int(math.floor(math.log2(1 / scale))) if scale < 1 else 0
+        while len(self.levels) <= steps and min(self.levels[-1].size) >= 2:
+            self.levels.append(self.levels[-1].reduce(2))
+        return self.levels[min(steps, len(self.levels) - 1)]
+
+    def visible_tiles(self, image, version=None):
+        """Render or reuse the tiles on screen
+
+        Returns a list of (key, (x, y), tile) with the canvas position of
+        each tile's top-left corner. Keys stay the same while only the
+        pan changes, so the caller can keep its canvas items per key.
+        """
+        self.set_image(image, version)
+        scale = self.scale
+        # Scale relative to the pixels of the image being drawn
+        relative = scale * self.image_size[0] / image.width
+        level = image if self.direct else self._level(relative)
+        level_scale = relative * image.width / level.width
+        ox, oy = self.origin
+        zoomed = (image.width * relative, image.height * relative)
+        tile = self.tile
+        first_col = max(0, int(-ox // tile))
+        first_row = max(0, int(-oy // tile))
+        last_col = min(int(math.ceil(zoomed[0] / tile)), int((self.view_size[0] - ox) // tile) + 1)
+        last_row = min(int(math.ceil(zoomed[1] / tile)), int((self.view_size[1] - oy) // tile) + 1)
+        resample = Image.NEAREST if level_scale >= 1 else Image.BILINEAR
+
+        visible = []
+        for row in range(first_row, last_row):
+            for col in range(first_col, last_col):
+                key = (round(scale, 9), col, row)
+                cached = self.tiles.get(key)
+                if cached is not None:
+                    self.tiles.move_to_end(key)
+                    self.stats["reused"] += 1
+                else:
+                    x1, y1 = col * tile, row * tile
+                    x2, y2 = min(zoomed[0], x1 + tile), min(zoomed[1], y1 + tile)
+                    size = (max(1, int(round(x2 - x1))), max(1, int(round(y2 - y1))))
+                    box = (x1 / level_scale, y1 / level_scale,
+                           min(level.width, x2 / level_scale), min(level.height, y2 / level_scale))
+                    cached = level.resize(size, resample, box=box,
+                                          reducing_gap=2.0 if self.direct else None)
+                    self.tiles[key] = cached
+                    self.stats["rendered"] += 1
+                visible.append((key, (ox + col * tile, oy + row * tile), cached))
+        while len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return visible
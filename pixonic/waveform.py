@@ -0,0 +1,127 @@
+import numpy as np
+
+# Samples summarised by each entry of the finest level
+BLOCK = 64
+
+# Entries of one level merged into an entry of the next
+FACTOR = 4
+
+
+class PeakPyramid:
+    """Min/max peaks of a sample buffer at several resolutions
+
+    Level 0 holds the minimum and maximum of every BLOCK samples and each
+    further level merges FACTOR entries of the one below, so any view of
+    the buffer can be summarised from a level with at most a few entries
+    per pixel column. Unlike picking every n-th sample this never misses
+    a peak. After an in-place edit, update() recomputes only the entries
+    covering the changed samples.
+    """
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.mins = []
+        self.maxs = []
+        self._build()
+
+    def _frames(self, start, end):
+        """Samples start:end as a 1-D float array; channels are folded into the peaks"""
+        chunk = self.samples[start:end]
+        return chunk if chunk.ndim == 1 else chunk.reshape(-1)
+
+    def _block_peaks(self, start, end):
+        """(mins, maxs) of the level-0 blocks covering samples start:end"""
+        channels = 1 if self.samples.ndim == 1 else self.samples.shape[1]
+        frames = self._frames(start, end)
+        count = -(-(end - start) // BLOCK)
+        width = BLOCK * channels
+        full = len(frames) // width
+        mins = np.empty(count, dtype=np.float32)
+        maxs = np.empty(count, dtype=np.float32)
+        if full:
+            body = frames[:full * width].reshape(full, width)
+            mins[:full] = body.min(axis=1)
+            maxs[:full] = body.max(axis=1)
+        if full < count:
+            mins[full] = frames[full * width:].min()
+            maxs[full] = frames[full * width:].max()
+        return mins, maxs
+
+    def _build(self):
+        length = len(self.samples)
+        mins, maxs = self._block_peaks(0, length) if length else (np.zeros(1, np.float32),) * 2
+        self.mins, self.maxs = [mins], [maxs]
+        while len(mins) > 1:
+            mins, maxs = self._merge(mins), self._merge(maxs, np.maximum)
+            self.mins.append(mins)
+            self.maxs.append(maxs)
+
+    @staticmethod
+    def _merge(values, ufunc=np.minimum):
+        return ufunc.reduceat(values, np.arange(0, len(values), FACTOR))
+
+    def update(self, start, end):
+        """Refresh the peaks after samples start:end were changed in place"""
+        start, end = max(0, start), min(len(self.samples), end)
+        if start >= end:
+            return
+        first, last = start // BLOCK, -(-end // BLOCK)
+        mins, maxs = self._block_peaks(first * BLOCK, min(len(self.samples), last * BLOCK))
+        self.mins[0][first:last] = mins
+        self.maxs[0][first:last] = maxs
+        for level in range(1, len(self.mins)):
+            first, last = first // FACTOR, -(-last // FACTOR)
+            below = slice(first * FACTOR, last * FACTOR)
+            self.mins[level][first:last] = self._merge(self.mins[level - 1][below])
+            self.maxs[level][first:last] = self._merge(self.maxs[level - 1][below], np.maximum)
+
+    @property
+    def peak(self):
+        """Largest absolute sample value"""
+        return float(max(abs(self.mins[-1][0]), abs(self.maxs[-1][0])))
+
+    def columns(self, count, start=0, end=None):
+        """(mins, maxs) for count equal columns over samples start:end
+
+        An empty buffer or range gives silent columns.
+        """
+        end = len(self.samples) if end is None else min(end, len(self.samples))
+        if end <= start:
+            silent = np.zeros(count, dtype=np.float32)
+            return silent, silent
+        per_column = max(1.0, (end - start) / count)
+        # Coarsest level with at least 8 entries per column, so entries
+        # straddling a column edge blur the edge by at most 1/8 of a column
+        level, size = 0, BLOCK
+        while level + 1 < len(self.mins) and size * FACTOR * 8 <= per_column:
+            level, size = level + 1, size * FACTOR
+        if per_column < BLOCK:
+            # Zoomed in past level 0: read the samples themselves
+            mins = maxs = self._frames(start, end).astype(np.float32, copy=False)
+            size = 1 if self.samples.ndim == 1 else 1 / self.samples.shape[1]
+            first = 0
+        else:
+            mins, maxs = self.mins[level], self.maxs[level]
+            first = start / size
+        edges = (first + np.arange(count) * per_column / size).astype(np.int64)
+        edges = np.clip(edges, 0, len(mins) - 1)
+        return np.minimum.reduceat(mins, edges), np.maximum.reduceat(maxs, edges)
+
+
+def waveform_polygon(peaks, width, height, start=0, end=None, scale=None):
+    """Flat coordinate list of a filled waveform outline for a canvas
+
+    The outline runs left to right along the maxima and back along the
+    minima, so the whole waveform is one canvas item. scale is the sample
+    value drawn at the top edge; it defaults to the buffer's peak.
+    """
+    count = max(1, int(width))
+    mins, maxs = peaks.columns(count, start, end)
+    scale = scale or peaks.peak or 1.0
+    mid = height / 2
+    half = height / 2 - 10
+    x = np.arange(count, dtype=np.float32) * (width / count)
+    top = np.column_stack((x, mid - maxs / scale * half))
+    # At least a one-pixel line where the signal is silent
+    bottom = np.column_stack((x, np.maximum(mid - mins / scale * half, top[:, 1] + 1)))
+    return np.concatenate((top, bottom[::-1])).ravel().tolist()
@@ -0,0 +1,69 @@
+import time
+
+import numpy as np
+
+from pixonic.playback import NullDevice, PlaybackEngine
+
+RATE = 8000
+BLOCK = 256
+
+
+def play_through(samples, volume=1.0, speed=1.0, start=0, timeout=10.0):
+    """Play samples on a recording NullDevice until the end; returns the frames heard"""
+    device = NullDevice(RATE, 1, BLOCK, record=True)
+    engine = PlaybackEngine(samples, RATE, device, block=BLOCK)
+    engine.set_volume(volume)
+    engine.set_speed(speed)
+    engine.seek(start)
+    try:
+        engine.play()
+        deadline = time.monotonic() + timeout
+        while not engine.finished:
+            assert time.monotonic() < deadline, "playback did not finish"
+            time.sleep(0.01)
+        assert engine.position == len(samples)
+    finally:
+        engine.close()
+    return np.concatenate(device.output)[:, 0]
+
+
+def ramp(count):
+    """Distinct, non-zero samples, so every frame shows where it came from"""
+    return (np.arange(1, count + 1) / count).astype(np.float32)
+
+
+def test_samples_come_out_in_order():
+    samples = ramp(RATE)
+    heard = play_through(samples)
+    # Silence can only be padding before the first block or after the last
+    np.testing.assert_array_equal(heard[heard != 0], samples)
+
+
+def test_seek_resumes_at_position():
+    samples = ramp(RATE)
+    heard = play_through(samples, start=RATE // 2)
+    np.testing.assert_array_equal(heard[heard != 0], samples[RATE // 2:])
+
+
+def test_volume_scales_the_output():
+    samples = ramp(RATE)
+    heard = play_through(samples, volume=0.5)
+    heard = heard[heard != 0]
+    assert len(heard) == len(samples)
+    # The first callback ramps from full gain, after that it is exact
+    np.testing.assert_allclose(heard[BLOCK:], samples[BLOCK:] * 0.5, rtol=1e-6)
+    assert np.all(heard[:BLOCK] >= samples[:BLOCK] * 0.5 - 1e-6)
+    assert np.all(heard[:BLOCK] <= samples[:BLOCK] + 1e-6)
+
+
+def test_speed_changes_duration_not_pitch():
+    t = np.arange(2 * RATE) / RATE
+    samples = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+    heard = play_through(samples, speed=2.0)
+    sounding = np.nonzero(np.abs(heard) > 1e-4)[0]
+    heard = heard[sounding[0]:sounding[-1] + 1]
+    # Twice as fast: half as many frames, within a few WSOLA hops
+    assert abs(len(heard) - len(samples) / 2) < 0.02 * len(samples)
+    spectrum = np.abs(np.fft.rfft(heard * np.hanning(len(heard))))
+    peak = np.argmax(spectrum) * RATE / len(heard)
+    assert abs(peak - 440) < 5